@@ -0,0 +1,332 @@
+"""
+Throughput/latency benchmarks against the local stand-in server.
+
+Starts 'src.testing.mock_server' in a subprocess (so its CPU time is not
+counted), points the clients at it and reports requests/sec, latency
+percentiles, client CPU time and peak memory for each scenario.
+
+    uv run benchmarks/run_benchmarks.py --requests 200 --concurrency 20
+    uv run benchmarks/run_benchmarks.py --json current.json --baseline baseline.json
+
+With '--baseline', exits non-zero if any scenario's throughput drops or its
+p99 latency grows by more than '--max-regression' (CI gate).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@dataclass
+class BenchResult:
+    """Measurements for one scenario."""
+
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    rps: float
+    p50_ms: float | None
+    p95_ms: float | None
+    p99_ms: float | None
+    cpu_seconds: float
+    peak_rss_mb: float
+
+
+def percentile(samples: list[float], pct: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _result(name: str, latencies: list[float], errors: int, requests: int, wall: float, cpu: float) -> BenchResult:
+    def ms(value: float | None) -> float | None:
+        return round(value * 1000, 2) if value is not None else None
+
+    return BenchResult(
+        name=name,
+        requests=requests,
+        errors=errors,
+        seconds=round(wall, 3),
+        rps=round(requests / wall, 1) if wall else 0.0,
+        p50_ms=ms(percentile(latencies, 50)),
+        p95_ms=ms(percentile(latencies, 95)),
+        p99_ms=ms(percentile(latencies, 99)),
+        cpu_seconds=round(cpu, 3),
+        peak_rss_mb=round(_peak_rss_mb(), 1),
+    )
+
+
+def run_sync(name: str, call: Callable[[], bool], requests: int, concurrency: int) -> BenchResult:
+    """Run a blocking call 'requests' times on a thread pool. 'call' returns success (or raises)."""
+    latencies: list[float] = []
+    errors = 0
+
+    def timed() -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = call()
+        except Exception:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: timed(), range(requests)))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    return _result(name, latencies, errors, requests, wall, cpu)
+
+
+async def run_async(
+    name: str,
+    call: Callable[[], Awaitable[bool]],
+    requests: int,
+    concurrency: int,
+) -> BenchResult:
+    """Run a coroutine 'requests' times with at most 'concurrency' in flight."""
+    latencies: list[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def timed() -> None:
+        nonlocal errors
+        async with sem:
+            started = time.perf_counter()
+            try:
+                ok = await call()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(timed() for _ in range(requests)))
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    return _result(name, latencies, errors, requests, wall, cpu)
+
+
+def start_mock_server(args: argparse.Namespace) -> subprocess.Popen[str]:
+    """Launch the mock server and export its URLs into this process's environment."""
+    command = [
+        sys.executable,
+        "-m",
+        "src.testing.mock_server",
+        "--port",
+        "0",
+        "--latency",
+        str(args.latency),
+        "--latency-spread",
+        str(args.latency_spread),
+        "--distribution",
+        args.distribution,
+        "--error-rate",
+        str(args.error_rate),
+        "--throttle-rate",
+        str(args.throttle_rate),
+    ]
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, stdout=subprocess.PIPE, text=True)
+    assert process.stdout is not None
+    while line := process.stdout.readline().strip():
+        name, value = line.split("=", 1)
+        os.environ[name] = value
+
+    # Dummy credentials: the mock server does not check them
+    os.environ.setdefault("YC_FOLDER_ID", "mock-folder")
+    os.environ.setdefault("YC_API_KEY", "mock-key")
+    return process
+
+
+def run_all(args: argparse.Namespace) -> list[BenchResult]:
+    # Imported here so the environment already points at the mock server
+    # when 'src.config' is first used.
+    import logging
+
+    import examples.async_batch as async_batch
+    from src.clients.native import AsyncYandexNativeClient, StreamStats, YandexNativeClient
+    from src.clients.wrapper import get_async_openai_client, get_openai_client
+    from src.config import config
+    from src.retry import RetryPolicy
+    from src.scheduler import RequestScheduler
+    from src.search.embeddings import BatchEmbedder
+
+    # Per-request INFO logs would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    n, c = args.requests, args.concurrency
+    prompt = "Benchmark prompt: explain keep-alive connections."
+    messages = [{"role": "user", "content": prompt}]
+    results: list[BenchResult] = []
+
+    # 1. Native client, blocking (thread pool; requests.Session is shared)
+    native = YandexNativeClient(retry_policy=RetryPolicy(max_attempts=1))
+    results.append(run_sync("native_sync", lambda: bool(native.generate_text(prompt)), n, c))
+
+    # 2. Native streaming: latency here is time-to-first-token
+    def stream_ttft() -> bool:
+        stats = StreamStats()
+        for _ in native.stream_text(prompt, stats=stats):
+            pass
+        return stats.time_to_first_token is not None
+
+    results.append(run_sync("native_stream", stream_ttft, n, c))
+
+    # 3. OpenAI SDK, blocking
+    sdk = get_openai_client().with_options(max_retries=0)
+
+    def sdk_call() -> bool:
+        response = sdk.chat.completions.create(
+            model=config.model_uri,
+            messages=messages,  # pyright: ignore[reportArgumentType]
+        )
+        return bool(response.choices)
+
+    results.append(run_sync("openai_sync", sdk_call, n, c))
+
+    async def async_scenarios() -> None:
+        # 4. Native client, async pooled
+        async with AsyncYandexNativeClient(max_connections=c) as client:
+
+            async def native_call() -> bool:
+                return bool(await client.generate_text(prompt))
+
+            results.append(await run_async("native_async", native_call, n, c))
+
+        # 5. OpenAI SDK, async
+        async with get_async_openai_client() as base_client:
+            client = base_client.with_options(max_retries=0)
+
+            async def sdk_async_call() -> bool:
+                response = await client.chat.completions.create(
+                    model=config.model_uri,
+                    messages=messages,  # pyright: ignore[reportArgumentType]
+                )
+                return bool(response.choices)
+
+            results.append(await run_async("openai_async", sdk_async_call, n, c))
+
+            # 6. Batched embeddings (each "request" here is one text)
+            embedder = BatchEmbedder(client, config.embedding_doc_uri, max_concurrency=c)
+            texts = [f"document {i}" for i in range(n)]
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            try:
+                embedded = len(await embedder.embed(texts))
+            except Exception:
+                embedded = 0
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            results.append(_result("embeddings_batched", [], n - embedded, n, wall, cpu))
+
+        # 7. The async_batch example pipeline end to end (quota limits lifted)
+        async_batch.REQUESTS_PER_SECOND = 1e9
+        async_batch.TOKENS_PER_MINUTE = 1e12
+        prompts = [f"{prompt} #{i}" for i in range(n)]
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        outputs = await async_batch.process_batch(prompts)
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        results.append(_result("async_batch_pipeline", [], sum(not o for o in outputs), n, wall, cpu))
+
+        # 8. Interactive requests while a bulk batch saturates the same scheduler
+        scheduler = RequestScheduler(c, headroom=max(1, c // 10))
+        async with AsyncYandexNativeClient(max_connections=c, scheduler=scheduler, priority="interactive") as client:
+
+            async def interactive_call() -> bool:
+                return bool(await client.generate_text(prompt))
+
+            bulk = asyncio.create_task(async_batch.process_batch_native(prompts, scheduler))
+            # Let the batch fill its lane first
+            await asyncio.sleep(0.05)
+            results.append(await run_async("interactive_under_bulk", interactive_call, max(1, n // 4), 2))
+            await bulk
+
+    asyncio.run(async_scenarios())
+    return results
+
+
+def compare(results: list[BenchResult], baseline_path: Path, max_regression: float) -> list[str]:
+    """Return human-readable regressions relative to a saved baseline."""
+    baseline = {item["name"]: item for item in json.loads(baseline_path.read_text())}
+    problems = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        if base["rps"] and result.rps < base["rps"] * (1 - max_regression):
+            problems.append(f"{result.name}: rps {result.rps} < baseline {base['rps']}")
+        if base.get("p99_ms") and result.p99_ms and result.p99_ms > base["p99_ms"] * (1 + max_regression):
+            problems.append(f"{result.name}: p99 {result.p99_ms}ms > baseline {base['p99_ms']}ms")
+    return problems
+
+
+def print_table(results: list[BenchResult]) -> None:
+    header = (
+        f"{'scenario':<22}{'reqs':>6}{'err':>5}{'rps':>9}"
+        f"{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'cpu s':>8}{'rss MB':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+
+        def fmt(value: float | None) -> str:
+            return f"{value:.1f}" if value is not None else "-"
+
+        print(
+            f"{r.name:<22}{r.requests:>6}{r.errors:>5}{r.rps:>9.1f}"
+            f"{fmt(r.p50_ms):>9}{fmt(r.p95_ms):>9}{fmt(r.p99_ms):>9}{r.cpu_seconds:>8.2f}{r.peak_rss_mb:>8.1f}",
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the clients against the local mock server.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="Mock server latency (seconds).")
+    parser.add_argument("--latency-spread", type=float, default=0.0)
+    parser.add_argument("--distribution", choices=["constant", "uniform", "lognormal"], default="constant")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--json", type=Path, help="Write results to this JSON file.")
+    parser.add_argument("--baseline", type=Path, help="Compare against a previous --json output.")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    server = start_mock_server(args)
+    try:
+        results = run_all(args)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps([asdict(r) for r in results], indent=2))
+
+    if args.baseline:
+        problems = compare(results, args.baseline, args.max_regression)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import functools
 import sys
 from pathlib import Path
 
@@ -6,78 +8,189 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-from openai import AsyncOpenAI, OpenAIError
+from openai import APIStatusError, AsyncOpenAI, OpenAIError
+from openai.types.chat import ChatCompletion
 
+from src.batch import BatchRunner, BatchStats
+from src.clients.coalesce import SingleFlight
+from src.clients.native import AsyncYandexNativeClient
+from src.clients.pool import CredentialRouter
 from src.clients.wrapper import get_async_openai_client
 from src.config import config, logger
+from src.limiter import AdaptiveLimiter
+from src.ratelimit import RateLimiter, estimate_tokens
+from src.retry import ResilientCaller
+from src.scheduler import PRIORITIES, DeadlineExceededError, Priority, RequestScheduler
+from src.tokens import ContextBudget, ContextOverflowError
 
 # Constants
+# Starting point only: the adaptive limiter grows or shrinks it at runtime
 MAX_CONCURRENT_REQUESTS = 5
+# Upper bound for the answer; the actual 'max_tokens' is what the prompt leaves of the window
+MAX_TOKENS = 1000
+CONTEXT_WINDOW = 32_000
+
+# Folder quotas (set to your actual limits). The bucket is shared by all
+# batch workers on this host that use the same folder.
+REQUESTS_PER_SECOND = 10.0
+TOKENS_PER_MINUTE = 100_000
+
+# Send a duplicate request when one is slower than this percentile of recent calls
+HEDGE_PERCENTILE = 95
+
+
+def create_rate_limiter(folders: int = 1) -> RateLimiter:
+    """
+    Host-wide request/token bucket for the configured folder.
+
+    With a credential pool the quotas of its 'folders' add up (the router
+    spreads requests over them by weight), so the bucket is scaled to match.
+    """
+    return RateLimiter(
+        requests_per_second=REQUESTS_PER_SECOND * folders,
+        tokens_per_minute=TOKENS_PER_MINUTE * folders,
+        shared=True,
+        key=config.folder_id if folders == 1 else f"{config.folder_id}-pool{folders}",
+    )
+
+
+def create_scheduler(folders: int = 1) -> RequestScheduler:
+    """
+    Scheduler over an adaptive concurrency limit and the folder quota.
+
+    A service should create one and pass it to every caller, so interactive
+    requests and batch jobs queue in their own lanes of the same scheduler.
+    """
+    return RequestScheduler(
+        AdaptiveLimiter(initial=MAX_CONCURRENT_REQUESTS),
+        rate_limiter=create_rate_limiter(folders),
+    )
 
 
 async def fetch_completion_safe(
     client: AsyncOpenAI,
     prompt: str,
-    sem: asyncio.Semaphore,
+    scheduler: RequestScheduler,
+    resilience: ResilientCaller | None = None,
+    priority: Priority = "bulk",
+    deadline: float | None = None,
 ) -> str:
     """
-    Fetch completion with semaphore protection and error handling.
+    Fetch completion through the shared scheduler with error handling.
 
     Args:
         client: The active AsyncOpenAI client instance.
         prompt: The user prompt to send.
-        sem: Semaphore to control concurrency.
+        scheduler: Shared scheduler that controls concurrency and quota.
+        resilience: Retry/hedging wrapper; a default one is used if omitted.
+        priority: Scheduler lane for the request.
+        deadline: Absolute 'time.monotonic()' after which the request is dropped unsent.
 
     Returns:
-        Generated text or empty string on failure.
+        Generated text or empty string once retries are exhausted (or the deadline passed).
 
     """
-    async with sem:  # Acquire lock to limit concurrency
-        try:
-            logger.debug("Processing prompt: %.30s...", prompt)
-
-            response = await client.chat.completions.create(
-                model=config.model_uri,
-                messages=[
-                    {"role": "system", "content": "You are a concise technical expert."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=config.temperature,
-                max_tokens=1000,
-            )
+    messages = [
+        {"role": "system", "content": "You are a concise technical expert."},
+        {"role": "user", "content": prompt},
+    ]
+    # Reject oversized prompts locally instead of after a full round trip
+    try:
+        fitted = ContextBudget(context_window=CONTEXT_WINDOW, max_completion_tokens=MAX_TOKENS).fit(messages)
+    except ContextOverflowError as e:
+        logger.error("Skipping prompt '%.20s': %s", prompt, e)
+        return ""
+    estimated = estimate_tokens(fitted.messages, fitted.max_tokens)
+    resilience = resilience or ResilientCaller()
+    rate_limiter = scheduler.rate_limiter
 
-            # Check for content existence safely
-            if not response.choices:
-                logger.warning("No choices returned for prompt: %.20s", prompt)
-                return ""
+    try:
+        # Wait for a slot and quota in this request's lane
+        async with scheduler.slot(priority, deadline=deadline, tokens=estimated) as ticket:
+            try:
+                logger.debug("Processing prompt: %.30s...", prompt)
+
+                # Transient errors (429/5xx/timeouts) are retried with backoff;
+                # slow calls may be hedged with a duplicate request
+                attempts = 0
+
+                async def attempt() -> ChatCompletion:
+                    nonlocal attempts
+                    attempts += 1
+                    # Quota for the first attempt came with the slot; retries and
+                    # hedged duplicates are extra upstream calls against it
+                    if attempts > 1 and rate_limiter is not None:
+                        await rate_limiter.acquire_async(estimated)
+                    # Retries stop once the deadline has passed
+                    ticket.time_left()
+                    return await client.chat.completions.create(
+                        model=config.model_uri,
+                        messages=fitted.messages,  # pyright: ignore[reportArgumentType]
+                        temperature=config.temperature,
+                        max_tokens=fitted.max_tokens,
+                    )
 
-            return response.choices[0].message.content or ""
+                response = await resilience.call(attempt)
+
+                # Refund (or charge) the difference between estimate and actual usage
+                if rate_limiter is not None and response.usage:
+                    rate_limiter.record_usage(estimated, response.usage.total_tokens)
+
+                # Check for content existence safely
+                if not response.choices:
+                    logger.warning("No choices returned for prompt: %.20s", prompt)
+                    return ""
+
+                return response.choices[0].message.content or ""
+
+            except OpenAIError as e:
+                # Tell the limiter (429/5xx/timeouts make it back off),
+                # log the error but don't crash the whole batch
+                ticket.report_error(e.status_code if isinstance(e, APIStatusError) else None)
+                logger.error("Async request failed for prompt '%.20s': %s", prompt, e)
+                return ""
+            except DeadlineExceededError:
+                raise
+            except Exception:
+                # Catch unexpected errors (e.g., parsing)
+                logger.exception("Unexpected error processing prompt '%.20s'", prompt)
+                return ""
 
-        except OpenAIError as e:
-            # Log the error but don't crash the whole batch
-            logger.error("Async request failed for prompt '%.20s': %s", prompt, e)
-            return ""
-        except Exception:
-            # Catch unexpected errors (e.g., parsing)
-            logger.exception("Unexpected error processing prompt '%.20s'", prompt)
-            return ""
+    except DeadlineExceededError as e:
+        # Too late to be useful: dropped without (re)sending
+        logger.warning("Dropped prompt '%.20s': %s", prompt, e)
+        return ""
 
 
-async def process_batch(prompts: list[str]) -> list[str]:
+async def process_batch(
+    prompts: list[str],
+    scheduler: RequestScheduler | None = None,
+    priority: Priority = "bulk",
+) -> list[str]:
     """
     Orchestrate the batch processing of prompts using a connection pool.
 
     Uses 'async with' to ensure the client is properly closed even if
-    interruptions occur.
+    interruptions occur. Pass the service's shared scheduler to run the batch
+    next to live traffic: its requests only get the capacity that
+    higher-priority lanes leave over.
     """
-    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    scheduler = scheduler or create_scheduler()
+    resilience = ResilientCaller(hedge_percentile=HEDGE_PERCENTILE)
+    # Duplicate prompts in flight at the same time share one request
+    flight = SingleFlight()
 
     # Initialize client within a context manager for safety
-    async with get_async_openai_client() as client:
-        logger.info("Starting batch processing of %d items...", len(prompts))
+    async with get_async_openai_client() as base_client:
+        # Retries are handled by 'resilience'; disable the SDK's own retry loop
+        client = base_client.with_options(max_retries=0)
+        logger.info("Starting batch processing of %d items (%s lane)...", len(prompts), priority)
 
         # Create tasks
-        tasks = [fetch_completion_safe(client, p, sem) for p in prompts]
+        tasks = [
+            flight.do(p, lambda p=p: fetch_completion_safe(client, p, scheduler, resilience, priority))
+            for p in prompts
+        ]
 
         # Execute tasks concurrently
         results = await asyncio.gather(*tasks)
@@ -85,8 +198,102 @@ async def process_batch(prompts: list[str]) -> list[str]:
     return results
 
 
+def create_native_client(scheduler: RequestScheduler, priority: Priority) -> AsyncYandexNativeClient:
+    """Native client that takes its concurrency and quota from 'scheduler'."""
+    folders = len(config.credential_pool)
+    return AsyncYandexNativeClient(
+        max_connections=scheduler.max_concurrency,
+        resilience=ResilientCaller(hedge_percentile=HEDGE_PERCENTILE),
+        router=CredentialRouter() if folders > 1 else None,
+        budget=ContextBudget(context_window=CONTEXT_WINDOW, max_completion_tokens=MAX_TOKENS),
+        scheduler=scheduler,
+        priority=priority,
+        coalesce=True,
+    )
+
+
+async def process_batch_native(
+    prompts: list[str],
+    scheduler: RequestScheduler | None = None,
+    priority: Priority = "bulk",
+) -> list[str]:
+    """
+    Same as 'process_batch', but talks to the native endpoint directly,
+    skipping the OpenAI-compatibility layer.
+    """
+    # Spread load over all configured folders (YC_CREDENTIALS), if more than one
+    scheduler = scheduler or create_scheduler(len(config.credential_pool))
+
+    # One pooled client for the whole batch (keep-alive connections are reused)
+    async with create_native_client(scheduler, priority) as client:
+        logger.info("Starting native batch processing of %d items (%s lane)...", len(prompts), priority)
+        tasks = [client.generate_text(p, system_prompt="You are a concise technical expert.") for p in prompts]
+        results = await asyncio.gather(*tasks)
+
+    return results
+
+
+async def process_file(
+    input_path: Path,
+    output_path: Path,
+    ordered: bool = False,
+    scheduler: RequestScheduler | None = None,
+    priority: Priority = "bulk",
+    native: bool = False,
+) -> BatchStats:
+    """
+    Stream prompts from a JSONL/CSV file into a JSONL output file.
+
+    Results are written as they complete; rerunning the same command after
+    an interruption continues where the previous run stopped. With 'native'
+    the prompts go to the native endpoint, as in 'process_batch_native'.
+    """
+    # Only the native client spreads load over several folders
+    scheduler = scheduler or create_scheduler(len(config.credential_pool) if native else 1)
+    # Workers only wait on the scheduler, so allow as many as it may ever grant
+    workers = scheduler.max_concurrency
+
+    if native:
+        async with create_native_client(scheduler, priority) as native_client:
+            system_prompt = "You are a concise technical expert."
+            generate = functools.partial(native_client.generate_text, system_prompt=system_prompt)
+            return await BatchRunner(generate, workers=workers, ordered=ordered).run(input_path, output_path)
+
+    resilience = ResilientCaller(hedge_percentile=HEDGE_PERCENTILE)
+    flight = SingleFlight()
+    async with get_async_openai_client() as base_client:
+        client = base_client.with_options(max_retries=0)
+
+        async def handle(prompt: str) -> str:
+            return await flight.do(
+                prompt,
+                lambda: fetch_completion_safe(client, prompt, scheduler, resilience, priority),
+            )
+
+        runner = BatchRunner(handle, workers=workers, ordered=ordered)
+        return await runner.run(input_path, output_path)
+
+
 def main():
     """Main entry point for the async demo."""
+    parser = argparse.ArgumentParser(description="Async batch processing demo.")
+    parser.add_argument("--native", action="store_true", help="Use the native REST API instead of the OpenAI SDK.")
+    parser.add_argument("--input", type=Path, help="JSONL/CSV file with a 'prompt' column to process.")
+    parser.add_argument("--output", type=Path, help="JSONL file for results (also the resume checkpoint).")
+    parser.add_argument("--ordered", action="store_true", help="Write file results in input order.")
+    parser.add_argument("--priority", choices=PRIORITIES, default="bulk", help="Scheduler lane for the batch.")
+    args = parser.parse_args()
+
+    if args.input:
+        output = args.output or args.input.with_suffix(".results.jsonl")
+        try:
+            asyncio.run(
+                process_file(args.input, output, ordered=args.ordered, priority=args.priority, native=args.native),
+            )
+        except KeyboardInterrupt:
+            logger.info("Interrupted. Rerun the same command to resume.")
+        return
+
     # Simulating a dataset related to high-performance computing
     test_prompts = [
         "Explain NVIDIA A100 Tensor Cores.",
@@ -97,8 +304,10 @@ def main():
         "Optimize a matrix multiplication in Python.",
     ]
 
+    runner = process_batch_native if args.native else process_batch
+
     try:
-        results = asyncio.run(process_batch(test_prompts))
+        results = asyncio.run(runner(test_prompts, priority=args.priority))
     except KeyboardInterrupt:
         logger.info("Batch processing interrupted by user.")
         sys.exit(0)
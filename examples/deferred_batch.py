@@ -0,0 +1,63 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# --- CONFIGURATION & PATH SETUP ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.clients.deferred import DeferredCompletionClient, OperationStore, PollingScheduler
+from src.config import logger
+
+# Operation IDs are persisted here, so rerunning the script after an
+# interruption keeps polling the same jobs instead of resubmitting them.
+STORE_PATH = PROJECT_ROOT / ".cache" / "deferred_operations.db"
+
+
+async def run_deferred_batch(prompts: list[str]) -> dict[str, str]:
+    """
+    Submit all prompts as deferred operations, then collect results as they finish.
+    """
+    store = OperationStore(STORE_PATH)
+    results: dict[str, str] = {}
+
+    try:
+        async with DeferredCompletionClient() as client:
+            # 1. Bulk submit (returns immediately with operation IDs)
+            await client.submit_many(enumerate_prompts(prompts), store)
+
+            # 2. Poll in batches with backoff and stream results back
+            scheduler = PollingScheduler(client, store)
+            async for result in scheduler.results():
+                if result.ok:
+                    results[result.key] = result.text
+                else:
+                    logger.error("Operation for '%s' failed: %s", result.key, result.error)
+    finally:
+        store.close()
+    return results
+
+
+def enumerate_prompts(prompts: list[str]) -> list[tuple[str, str]]:
+    """Use the position as a stable key for each prompt."""
+    return [(str(i), prompt) for i, prompt in enumerate(prompts)]
+
+
+def main():
+    """Entry point."""
+    prompts = [
+        "Write a short essay about the history of GPUs.",
+        "Summarize the main ideas of distributed training.",
+        "Explain how transformers process long documents.",
+    ]
+
+    results = asyncio.run(run_deferred_batch(prompts))
+
+    print("\n--- Deferred Results ---")
+    for key, text in sorted(results.items(), key=lambda item: int(item[0])):
+        print(f"\nQ: {prompts[int(key)]}")
+        print(f"A: {text[:100]}... (truncated)")
+
+
+if __name__ == "__main__":
+    main()
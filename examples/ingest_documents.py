@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+# Fix path to import src
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.config import config
+from src.search.embeddings import embed_texts
+from src.search.ingest import IngestionPipeline, iter_documents
+
+# Manifest and vectors persist here; re-runs only embed what changed
+STATE_DIR = PROJECT_ROOT / ".cache" / "ingest"
+
+
+def run_ingest_demo(source: Path) -> None:
+    print(f"--- Incremental Ingestion Demo (Source: {source}) ---")
+
+    with IngestionPipeline(STATE_DIR) as pipeline:
+        # 1. Sync the index with the source: new and changed files are chunked,
+        # only unseen chunks are embedded, removed files are deleted from the index
+        stats = pipeline.ingest(iter_documents(source), delete_missing=True)
+        print(f"Documents: {pipeline.document_count()}, chunks: {len(pipeline)}")
+        print(f"Embedded {stats.chunks_embedded} chunks, reused {stats.chunks_reused}.")
+
+        # 2. Search the chunks (Note: Use 'text-search-query' for the search term)
+        query = "How do I run the benchmarks?"
+        print(f"\nQuery: '{query}'")
+        for hit in pipeline.search(embed_texts([query], config.embedding_query_uri)[0], k=3):
+            print(f"[{hit.score:.4f}] {hit.chunk.doc_id}#{hit.chunk.position}: {hit.chunk.text[:60]}...")
+
+
+if __name__ == "__main__":
+    run_ingest_demo(Path(sys.argv[1]) if len(sys.argv) > 1 else PROJECT_ROOT / "README.md")
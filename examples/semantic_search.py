@@ -11,6 +11,14 @@ from openai import OpenAI
 
 from src.clients.wrapper import get_openai_client
 from src.config import config, logger
+from src.search.cache import EmbeddingCache
+from src.search.embeddings import decode_embeddings, embed_texts
+from src.search.hybrid import HybridRetriever
+from src.search.index import VectorIndex
+from src.search.lexical import BM25Index
+
+# Embeddings persist here between runs; unchanged documents are not re-embedded
+CACHE_DIR = PROJECT_ROOT / ".cache" / "embeddings"
 
 
 def get_embedding(client: OpenAI, text: str, model_uri: str) -> np.ndarray:
@@ -20,27 +28,13 @@ def get_embedding(client: OpenAI, text: str, model_uri: str) -> np.ndarray:
     # Replace newlines with spaces for better embedding quality (recommended practice)
     text = text.replace("\n", " ")
 
+    # Base64 is decoded straight into a float32 vector (no list of Python floats)
     response = client.embeddings.create(
         input=[text],
         model=model_uri,
-        encoding_format="float",
+        encoding_format="base64",
     )
-    return np.array(response.data[0].embedding)
-
-
-def compute_cosine_similarity(vec_a: np.ndarray, vec_b: np.ndarray) -> float:
-    """
-    Compute Cosine Similarity manually using NumPy.
-    Formula: (A . B) / (||A|| * ||B||)
-    """
-    dot_product = np.dot(vec_a, vec_b)
-    norm_a = np.linalg.norm(vec_a)
-    norm_b = np.linalg.norm(vec_b)
-
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-
-    return dot_product / (norm_a * norm_b)
+    return decode_embeddings([response.data[0].embedding])[0]
 
 
 def run_search_demo():
@@ -57,42 +51,49 @@ def run_search_demo():
     print(f"--- Semantic Search Demo (Docs: {len(documents)}) ---")
 
     # 2. Vectorize Documents (This usually happens once and is stored in a Vector DB)
+    # Texts are packed into batched requests that run concurrently;
+    # the result is one (n_docs, dim) matrix in input order.
+    # Note: Use 'text-search-doc' for documents
     logger.info("Generating embeddings for documents...")
-    doc_embeddings = []
-
-    for doc in documents:
-        # Note: Use 'text-search-doc' for documents
-        emb = get_embedding(client, doc, config.embedding_doc_uri)
-        doc_embeddings.append(emb)
+    with EmbeddingCache(CACHE_DIR) as cache:
+        doc_embeddings = embed_texts(documents, config.embedding_doc_uri, cache=cache)
 
     # 3. User Query
     query = "Tell me about graphics cards for Deep Learning"
     print(f"\nQuery: '{query}'")
 
-    # 4. Vectorize Query
-    # Note: Use 'text-search-query' for the search term
-    query_embedding = get_embedding(client, query, config.embedding_query_uri)
+    # 4. Build the retriever: a BM25 inverted index next to the vector index.
+    # Document vectors are normalized once; scoring is a single matrix product.
+    # For large corpora pass ann=True to scan only the closest IVF clusters,
+    # or 'prefilter=N' to search() to score only the top N lexical candidates.
+    # Note: Use 'text-search-query' for the search term (embedded only when needed)
+    retriever = HybridRetriever(
+        BM25Index(documents),
+        VectorIndex(doc_embeddings),
+        embed_query=lambda text: get_embedding(client, text, config.embedding_query_uri),
+    )
 
-    # 5. Find the best match
-    scores = []
-    for doc_emb in doc_embeddings:
-        score = compute_cosine_similarity(query_embedding, doc_emb)
-        scores.append(score)
+    # 5. Find the best matches (lexical and dense rankings fused with RRF)
+    top_ids, top_scores = retriever.search(query, k=len(documents))
 
-    # Get index of the highest score
-    best_idx = np.argmax(scores)
-    best_score = scores[best_idx]
+    best_idx = top_ids[0]
+    best_score = top_scores[0]
     best_doc = documents[best_idx]
 
     print("\n>>> Best Match:")
     print(f"Score: {best_score:.4f}")
     print(f"Text:  {best_doc}")
 
-    # Debug: Show all scores
+    # Debug: Show all scores (best first)
     print("\n(All scores:)")
-    for i, score in enumerate(scores):
+    for i, score in zip(top_ids, top_scores, strict=True):
         print(f"[{score:.4f}] {documents[i][:40]}...")
 
+    # 6. Identifier lookups are answered by the inverted index alone (no embedding call)
+    code_query = "A100"
+    code_ids, _ = retriever.search(code_query, k=1)
+    print(f"\nLexical lookup '{code_query}': {documents[code_ids[0]]}")
+
 
 if __name__ == "__main__":
     run_search_demo()
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+# Fix path
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.clients.native import YandexNativeClient
+from src.config import logger
+from src.structured import StructuredOutputError
+
+# Each record is handed over as soon as its closing brace arrives
+CONTACTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "contacts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "minLength": 1},
+                    "company": {"type": "string"},
+                    "email": {"type": ["string", "null"]},
+                },
+                "required": ["name", "company"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["contacts"],
+}
+
+TEXT = """
+Met Anna Petrova (Yandex, anna.petrova@example.com) at the conference.
+Ivan Sidorov from Sber promised to send the slides; no email yet.
+Also talked to Maria Ivanova, Tinkoff, maria@example.com.
+"""
+
+
+def run_structured_extraction():
+    client = YandexNativeClient()
+    prompt = f"Extract every person mentioned in the text as a contact.\n\nText:\n{TEXT}"
+
+    try:
+        # strict=False: records that violate the schema are logged and skipped
+        for path, contact in client.stream_json(
+            prompt,
+            CONTACTS_SCHEMA,
+            system_prompt="You extract structured data. Reply with JSON only.",
+            select=("contacts", None),
+            strict=False,
+        ):
+            print(f"#{path[1]}: {contact['name']} ({contact['company']}) <{contact.get('email') or 'no email'}>")
+    except StructuredOutputError as e:
+        logger.error("Model output is not usable: %s", e)
+
+
+if __name__ == "__main__":
+    run_structured_extraction()
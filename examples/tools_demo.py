@@ -1,7 +1,7 @@
 import json
 import sys
 from pathlib import Path
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, Literal, cast
 
 # Fix path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -12,13 +12,23 @@ if TYPE_CHECKING:
 
 from src.clients.wrapper import get_openai_client
 from src.config import config, logger
+from src.tools import ToolRegistry
 
-# --- 1. Define Real Python Functions ---
+tools = ToolRegistry(default_timeout=10.0)
 
+# --- 1. Define Real Python Functions (schemas are generated from the signatures) ---
 
-def get_current_weather(location: str, unit: str = "celsius"):
-    """Mock function to get weather."""
-    logger.info(f"--> Tool called: get_current_weather({location}, {unit})")
+
+@tools.tool(cache_ttl=300)
+def get_current_weather(location: str, unit: Literal["celsius", "fahrenheit"] = "celsius"):
+    """
+    Get the current weather in a given location.
+
+    Args:
+        location: The city and state, e.g. San Francisco, CA
+        unit: Temperature unit.
+
+    """
     if "moscow" in location.lower():
         return json.dumps({"location": "Moscow", "temperature": "-5", "unit": unit})
     if "dubai" in location.lower():
@@ -26,35 +36,11 @@ def get_current_weather(location: str, unit: str = "celsius"):
     return json.dumps({"location": location, "temperature": "unknown"})
 
 
-# --- 2. Describe Tools for the AI ---
-
-TOOLS_SCHEMA = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_current_weather",
-            "description": "Get the current weather in a given location.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "location": {
-                        "type": "string",
-                        "description": "The city and state, e.g. San Francisco, CA",
-                    },
-                    "unit": {"type": "string", "enum": ["celsius", "fahrenheit"]},
-                },
-                "required": ["location"],
-            },
-        },
-    },
-]
-
-
 def run_tools_demo():
     client = get_openai_client()
 
-    # User asks a question that requires an external tool
-    user_prompt = "What is the weather like in Moscow today?"
+    # User asks a question that may require several independent tool calls
+    user_prompt = "What is the weather like in Moscow and in Dubai today?"
     print(f"User: {user_prompt}")
 
     messages = [
@@ -67,7 +53,7 @@ def run_tools_demo():
     response = client.chat.completions.create(
         model=config.model_uri,
         messages=cast("list[ChatCompletionMessageParam]", messages),
-        tools=cast("list[ChatCompletionToolUnionParam]", TOOLS_SCHEMA),
+        tools=cast("list[ChatCompletionToolUnionParam]", tools.schemas),
         tool_choice="auto",  # Let the model decide
     )
 
@@ -75,39 +61,22 @@ def run_tools_demo():
     tool_calls = response_message.tool_calls
 
     if tool_calls:
-        # The model wants to call a function!
-        print(f"AI: I need to call a function: {tool_calls[0].function.name}")  # pyright: ignore[reportAttributeAccessIssue]
+        # The model wants to call functions!
+        names = ", ".join(call.function.name for call in tool_calls)  # pyright: ignore[reportAttributeAccessIssue]
+        print(f"AI: I need to call: {names}")
 
         # Append the model's request to history
         messages.append(response_message)  # pyright: ignore[reportArgumentType]
 
-        # 2. Execute the function locally
-        for tool_call in tool_calls:
-            function_name = tool_call.function.name  # pyright: ignore[reportAttributeAccessIssue]
-            function_args = json.loads(tool_call.function.arguments)  # pyright: ignore[reportAttributeAccessIssue]
-
-            if function_name == "get_current_weather":
-                function_response = get_current_weather(
-                    location=function_args.get("location"),
-                    unit=function_args.get("unit", "celsius"),
-                )
-
-                # 3. Feed the result back to the model
-                messages.append(
-                    {
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": function_response,
-                    },
-                )
+        # 2. Execute all calls of this turn concurrently and 3. feed the results back
+        messages.extend(tools.call_tools(tool_calls))
 
         # 4. Second Call: Model generates the final answer
         logger.info("Sending results back to model...")
         final_response = client.chat.completions.create(
             model=config.model_uri,
             messages=cast("list[ChatCompletionMessageParam]", messages),
-            tools=cast("list[ChatCompletionToolUnionParam]", TOOLS_SCHEMA),
+            tools=cast("list[ChatCompletionToolUnionParam]", tools.schemas),
         )
 
         print(f"AI Final Answer: {final_response.choices[0].message.content}")
@@ -1,7 +1,8 @@
 from openai import OpenAIError
 
-from src.clients.native import YandexNativeClient
-from src.clients.wrapper import get_openai_client
+from src.clients.native import StreamStats, YandexNativeClient
+from src.clients.registry import registry
+from src.clients.routing import RoutedClient
 from src.config import config, logger
 
 
@@ -24,6 +25,28 @@ def run_native_demo(prompt: str):
         logger.error("Native demo failed: %s", e)
 
 
+def run_native_stream_demo(prompt: str):
+    """
+    Demonstrates streaming output from the Native Client.
+    """
+    print("\n>>> [3] Running Native Streaming Request...")
+
+    try:
+        client = YandexNativeClient()
+        stats = StreamStats()
+
+        print("Result:")
+        for delta in client.stream_text(prompt, stats=stats):
+            print(delta, end="", flush=True)
+        print()
+
+        if stats.time_to_first_token is not None:
+            print(f"(TTFT: {stats.time_to_first_token:.3f}s, total: {stats.total_time:.3f}s, usage: {stats.usage})")
+
+    except Exception as e:
+        logger.error("Native streaming demo failed: %s", e)
+
+
 def run_sdk_demo(prompt: str):
     """
     Demonstrates usage of the Standard OpenAI SDK.
@@ -31,8 +54,8 @@ def run_sdk_demo(prompt: str):
     print("\n>>> [2] Running OpenAI SDK Request...")
 
     try:
-        # Get configured client
-        client = get_openai_client()
+        # Get the shared, configured client
+        client = registry.openai()
 
         # Make request
         response = client.chat.completions.create(
@@ -53,6 +76,22 @@ def run_sdk_demo(prompt: str):
         logger.exception("Unexpected error in SDK demo")
 
 
+def run_routed_demo(prompt: str):
+    """
+    Demonstrates routing: both APIs used as interchangeable transports.
+    """
+    print("\n>>> [4] Running Routed Requests (fastest healthy endpoint)...")
+
+    client = RoutedClient()
+    for _ in range(3):
+        response = client.generate_text(prompt)
+        print(f"Result: {response[:60]}..." if response else "No response received.")
+
+    # Moving latency / error profile and circuit state per endpoint
+    for endpoint in client.router.snapshot():
+        print(endpoint)
+
+
 def main():
     """
     Main entry point.
@@ -71,6 +110,12 @@ def main():
     # 2. Run SDK implementation
     run_sdk_demo(test_prompt)
 
+    # 3. Run Native implementation with streaming
+    run_native_stream_demo(test_prompt)
+
+    # 4. Route requests over both APIs
+    run_routed_demo(test_prompt)
+
     print("\n--- Demo Finished ---")
 
 
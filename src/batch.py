@@ -0,0 +1,205 @@
+import asyncio
+import csv
+import json
+import os
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from src.config import logger
+
+# Handler used by the runner: prompt in, generated text out ("" means failure)
+PromptHandler = Callable[[str], Awaitable[str]]
+
+
+@dataclass
+class BatchStats:
+    """Counters for one 'BatchRunner.run' call."""
+
+    read: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+
+
+def read_prompts(path: str | Path) -> Iterator[tuple[str, str]]:
+    """
+    Lazily yield (id, prompt) pairs from a JSONL or CSV file.
+
+    Each row needs a 'prompt' field; an optional 'id' field is used as the
+    record key, otherwise the zero-based row number is.
+    """
+    path = Path(path)
+    with path.open(encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows: Iterator[dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row_num, row in enumerate(rows):
+            yield str(row.get("id", row_num)), row["prompt"]
+
+
+def _read_records(f: BinaryIO) -> Iterator[tuple[bytes, dict[str, Any] | None]]:
+    """Raw lines of an output file with their parsed records (None if a line is unreadable)."""
+    for raw in f:
+        try:
+            yield raw, json.loads(raw)
+        except ValueError:
+            yield raw, None
+
+
+def load_completed(output_path: str | Path, retry_failed: bool = True) -> set[str]:
+    """
+    Collect IDs already present in an output file (the output is the checkpoint).
+
+    A torn final line left by a crash is dropped from the file. With
+    'retry_failed', failed records are dropped too, so that rows which are
+    run again do not end up in the output twice.
+    """
+    path = Path(output_path)
+    if not path.exists():
+        return set()
+
+    completed: set[str] = set()
+    failed = 0
+    rewrite = False
+    with path.open("rb") as f:
+        for line_num, (raw, record) in enumerate(_read_records(f), 1):
+            # Every record is written with its newline, so only a crash mid-write leaves a line without one
+            torn = not raw.endswith(b"\n")
+            if record is None:
+                if torn:
+                    logger.warning("Dropping incomplete trailing record from %s.", path)
+                else:
+                    logger.warning("Skipping unreadable record on line %d of %s.", line_num, path)
+            elif record.get("ok") or not retry_failed:
+                completed.add(str(record["id"]))
+            else:
+                failed += 1
+            rewrite = rewrite or torn
+
+    if failed or rewrite:
+        if failed:
+            logger.info("Removing %d failed records from %s to retry them.", failed, path)
+        # Write-then-rename so a crash never loses finished records
+        tmp_path = path.with_name(path.name + ".tmp")
+        with path.open("rb") as src, tmp_path.open("wb") as dst:
+            for raw, record in _read_records(src):
+                if record is None:
+                    # Unreadable lines inside the file are kept for inspection
+                    if raw.endswith(b"\n"):
+                        dst.write(raw)
+                elif record.get("ok") or not retry_failed:
+                    dst.write(raw if raw.endswith(b"\n") else raw + b"\n")
+        os.replace(tmp_path, path)
+    return completed
+
+
+class BatchRunner:
+    """
+    Streams prompts from a file through a bounded work queue and appends
+    results to a JSONL output file as they complete.
+
+    Memory stays flat regardless of dataset size: at most 'max_pending'
+    prompts are in flight or waiting to be written. Every result is flushed
+    immediately, so an interrupted run resumes by skipping IDs already in the
+    output. With 'ordered=True' results are written in input order (a slow
+    row holds back later ones, within the 'max_pending' window).
+    """
+
+    def __init__(
+        self,
+        handler: PromptHandler,
+        workers: int = 16,
+        ordered: bool = False,
+        max_pending: int | None = None,
+        retry_failed: bool = True,
+    ) -> None:
+        """
+        Args:
+            handler: Coroutine function producing the result for one prompt.
+            workers: Number of concurrent worker tasks.
+            ordered: Write results in input order.
+            max_pending: Read-ahead window (defaults to 4 x workers).
+            retry_failed: On resume, re-run rows that previously failed.
+
+        """
+        self.handler = handler
+        self.workers = workers
+        self.ordered = ordered
+        self.max_pending = max_pending or workers * 4
+        self.retry_failed = retry_failed
+
+    async def run(self, input_path: str | Path, output_path: str | Path) -> BatchStats:
+        """Process every not-yet-completed prompt of 'input_path'."""
+        stats = BatchStats()
+        completed = load_completed(output_path, self.retry_failed)
+        if completed:
+            logger.info("Resuming: %d rows already done.", len(completed))
+
+        queue: asyncio.Queue[tuple[int, str, str] | None] = asyncio.Queue(maxsize=self.workers)
+        window = asyncio.Semaphore(self.max_pending)
+        buffer: dict[int, dict[str, Any]] = {}
+        next_seq = 0
+
+        with Path(output_path).open("a", encoding="utf-8") as out:
+
+            def write(record: dict[str, Any]) -> None:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                window.release()
+
+            def emit(seq: int, record: dict[str, Any]) -> None:
+                nonlocal next_seq
+                if not self.ordered:
+                    write(record)
+                    return
+                buffer[seq] = record
+                while next_seq in buffer:
+                    write(buffer.pop(next_seq))
+                    next_seq += 1
+
+            async def worker() -> None:
+                while (item := await queue.get()) is not None:
+                    seq, row_id, prompt = item
+                    try:
+                        result = await self.handler(prompt)
+                    except Exception:
+                        # A failing row must not stop the worker (and stall the queue)
+                        logger.exception("Handler failed for row %s", row_id)
+                        result = ""
+                    if result:
+                        stats.succeeded += 1
+                    else:
+                        stats.failed += 1
+                    emit(seq, {"id": row_id, "prompt": prompt, "result": result, "ok": bool(result)})
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            try:
+                seq = 0
+                for row_id, prompt in read_prompts(input_path):
+                    stats.read += 1
+                    if row_id in completed:
+                        stats.skipped += 1
+                        continue
+                    await window.acquire()
+                    await queue.put((seq, row_id, prompt))
+                    seq += 1
+
+                for _ in tasks:
+                    await queue.put(None)
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        logger.info(
+            "Batch finished: %d read, %d skipped, %d succeeded, %d failed.",
+            stats.read,
+            stats.skipped,
+            stats.succeeded,
+            stats.failed,
+        )
+        return stats
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Protocol
+
+from src.config import logger
+
+
+class CacheTier(Protocol):
+    """Storage backend for 'CompletionCache'. Values are serialized strings."""
+
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+
+class MemoryTier:
+    """
+    In-process LRU tier with a time-to-live.
+
+    Operations never await, and a lock guards the dict, so one instance can be
+    shared by concurrent asyncio tasks and threads.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DiskTier:
+    """
+    Persistent tier backed by SQLite (survives process restarts).
+    """
+
+    def __init__(self, path: str | Path, ttl: float = 7 * 24 * 3600.0) -> None:
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM completions WHERE key = ? AND expires > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl),
+            )
+
+    def purge_expired(self) -> int:
+        """Delete expired rows. Returns the number of removed entries."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM completions WHERE expires <= ?", (time.time(),)).rowcount
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _to_jsonable(obj: Any) -> Any:
+    # SDK message objects (pydantic models) can appear in chat history
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+class CompletionCache:
+    """
+    Exact-match completion cache with pluggable tiers (checked in order).
+
+    Opt-in: pass an instance to a client. Set 'max_temperature' to cache only
+    requests at or below that temperature, where repeated answers are expected
+    to be (nearly) identical; 'None' caches every request.
+    """
+
+    def __init__(
+        self,
+        tiers: list[CacheTier] | None = None,
+        max_temperature: float | None = None,
+    ) -> None:
+        self.tiers: list[CacheTier] = tiers if tiers is not None else [MemoryTier()]
+        self.max_temperature = max_temperature
+
+    @staticmethod
+    def make_key(
+        model_uri: str,
+        messages: list[Any],
+        temperature: float | None,
+        max_tokens: int | None,
+        **options: Any,
+    ) -> str:
+        """
+        Hash of everything that determines the response.
+
+        'options' are any other request arguments (tools, response format,
+        top_p, stop, seed...); requests that differ in them get different keys.
+        """
+        request = {
+            "model": model_uri,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if options:
+            # Only added when present, so keys of plain requests stay unchanged
+            request["options"] = options
+        canonical = json.dumps(
+            request,
+            sort_keys=True,
+            ensure_ascii=False,
+            default=_to_jsonable,
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def allows(self, temperature: float | None) -> bool:
+        """Whether a request with this temperature may be served from cache."""
+        if self.max_temperature is None:
+            return True
+        return temperature is not None and temperature <= self.max_temperature
+
+    def get(self, key: str) -> str | None:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                # Promote to the faster tiers in front of this one
+                for upper in self.tiers[:i]:
+                    upper.set(key, value)
+                logger.debug("Completion cache hit (tier %d).", i)
+                return value
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+from src.config import logger
+
+T = TypeVar("T")
+
+
+def request_key(**params: Any) -> str:
+    """Stable key for a request from its parameters (model URI, messages, options...)."""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class _Call(Generic[T]):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Future[T]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one in-flight upstream call.
+
+    The first caller for a key starts the call; callers arriving while it is
+    running await the same task and get its result or exception. Once it
+    finishes, the next call with that key starts a fresh request (pair with
+    a cache to reuse finished results).
+
+    The shared call runs as its own task, so cancelling one caller does not
+    fail the others; it is only cancelled when every caller has gone away.
+    Results are shared objects, not copies. One instance serves one event loop.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call[Any]] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: Hashable, call: _Call[Any]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs 'fn' unless a call with the same key is already in flight, then awaits it.
+
+        Args:
+            key: Identity of the request (see 'request_key').
+            fn: Starts the upstream call; only invoked by the first caller.
+
+        Returns:
+            The shared result.
+
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, call=call: self._forget(key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.debug("Joined in-flight request (%d waiting).", call.waiters + 1)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
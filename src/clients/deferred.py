@@ -0,0 +1,292 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from src.clients.native import AsyncYandexNativeClient
+from src.config import config, logger
+from src.retry import classify_error
+from src.tokens import ContextOverflowError
+
+
+@dataclass(frozen=True)
+class DeferredResult:
+    """Outcome of one deferred completion."""
+
+    key: str
+    text: str
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class OperationStore:
+    """
+    SQLite-backed record of submitted operations and their results.
+
+    Persisting operation IDs means a crashed or restarted process can keep
+    polling jobs it already paid for instead of resubmitting them.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS operations (
+                key TEXT PRIMARY KEY,
+                operation_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result TEXT,
+                error TEXT,
+                polls INTEGER NOT NULL DEFAULT 0,
+                next_poll REAL NOT NULL DEFAULT 0
+            )
+            """,
+        )
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple[Any, ...] = ()) -> list[tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def has(self, key: str) -> bool:
+        return bool(self._execute("SELECT 1 FROM operations WHERE key = ?", (key,)))
+
+    def add(self, key: str, operation_id: str, first_poll: float) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO operations (key, operation_id, next_poll) VALUES (?, ?, ?)",
+            (key, operation_id, first_poll),
+        )
+
+    def add_failed(self, key: str, error: str) -> None:
+        """Records a request that could not be submitted at all."""
+        self._execute(
+            "INSERT OR REPLACE INTO operations (key, operation_id, status, error) VALUES (?, '', 'failed', ?)",
+            (key, error),
+        )
+
+    def pending_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM operations WHERE status = 'pending'")[0][0]
+
+    def due(self, now: float, limit: int) -> list[tuple[str, str, int]]:
+        """Pending (key, operation_id, polls) rows whose next poll time has come."""
+        return self._execute(
+            "SELECT key, operation_id, polls FROM operations "
+            "WHERE status = 'pending' AND next_poll <= ? ORDER BY next_poll LIMIT ?",
+            (now, limit),
+        )
+
+    def next_due_time(self) -> float | None:
+        rows = self._execute("SELECT MIN(next_poll) FROM operations WHERE status = 'pending'")
+        return rows[0][0]
+
+    def reschedule(self, key: str, next_poll: float) -> None:
+        self._execute("UPDATE operations SET polls = polls + 1, next_poll = ? WHERE key = ?", (next_poll, key))
+
+    def finish(self, key: str, text: str, error: str | None) -> None:
+        self._execute(
+            "UPDATE operations SET status = ?, result = ?, error = ? WHERE key = ?",
+            ("failed" if error else "done", text, error, key),
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class DeferredCompletionClient(AsyncYandexNativeClient):
+    """
+    Native client for the deferred 'completionAsync' API.
+
+    Jobs are submitted in bulk and return operation IDs immediately; results
+    are collected later by polling the operations endpoint, so long
+    generations never hold a connection open. Operations are always submitted
+    and polled with the primary credential, since an operation can only be
+    read by the folder that created it.
+    """
+
+    async def submit(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> str:
+        """
+        Submits one deferred completion.
+
+        Returns:
+            Operation ID.
+
+        """
+        payload = self._build_payload(prompt, system_prompt)
+        operation = await self.resilience.call(lambda: self._post_to(config.native_async_api_url, payload))
+        return operation["id"]
+
+    async def get_operation(self, operation_id: str) -> dict[str, Any]:
+        """Fetches the current state of an operation."""
+
+        async def _get() -> dict[str, Any]:
+            response = await self.client.get(f"{config.operations_api_url}/{operation_id}")
+            response.raise_for_status()
+            return self._decode(response)
+
+        return await self.resilience.call(_get)
+
+    async def _post_to(self, url: str, payload: dict[str, Any]) -> dict[str, Any]:
+        response = await self.client.post(url, json=payload)
+        response.raise_for_status()
+        return self._decode(response)
+
+    async def submit_many(
+        self,
+        items: Iterable[tuple[str, str]],
+        store: OperationStore,
+        system_prompt: str = "You are a helpful assistant.",
+        max_concurrency: int = 10,
+        first_poll_delay: float = 5.0,
+    ) -> int:
+        """
+        Submits (key, prompt) pairs and records their operation IDs in 'store'.
+
+        'items' is consumed lazily by 'max_concurrency' workers, so it can be a
+        generator over a dataset of any size.
+
+        Keys already present in the store are skipped, so a rerun only submits
+        what is missing. Prompts that cannot fit the context window are stored
+        as failed; transport errors are only logged, so a rerun tries them again.
+
+        Returns:
+            Number of newly submitted operations.
+
+        """
+        # Bounded hand-off to a fixed set of workers, so 'items' is consumed lazily
+        queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(maxsize=max_concurrency)
+        submitted = 0
+
+        async def worker() -> None:
+            nonlocal submitted
+            while (item := await queue.get()) is not None:
+                key, prompt = item
+                try:
+                    operation_id = await self.submit(prompt, system_prompt)
+                except ContextOverflowError as e:
+                    logger.error("Deferred request '%s' does not fit the context window: %s", key, e)
+                    store.add_failed(key, str(e))
+                    continue
+                except httpx.HTTPError as e:
+                    logger.error("Failed to submit deferred request '%s': %s", key, e)
+                    continue
+                except Exception:
+                    # A failing item must not stop the worker (and stall the queue)
+                    logger.exception("Failed to submit deferred request '%s'", key)
+                    continue
+                store.add(key, operation_id, time.time() + first_poll_delay)
+                submitted += 1
+
+        tasks = [asyncio.create_task(worker()) for _ in range(max_concurrency)]
+        try:
+            for key, prompt in items:
+                if not store.has(key):
+                    await queue.put((key, prompt))
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        logger.info("Submitted %d deferred operations.", submitted)
+        return submitted
+
+
+class PollingScheduler:
+    """
+    Polls pending operations in rounds and streams finished results back.
+
+    Each round checks at most 'batch_size' due operations concurrently.
+    Unfinished operations are re-polled with exponential backoff, from
+    'min_interval' up to 'max_interval' seconds.
+    """
+
+    def __init__(
+        self,
+        client: DeferredCompletionClient,
+        store: OperationStore,
+        batch_size: int = 50,
+        max_concurrency: int = 10,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.store = store
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def _backoff(self, polls: int) -> float:
+        return min(self.max_interval, self.min_interval * 2**polls)
+
+    async def _check(self, key: str, operation_id: str, polls: int, sem: asyncio.Semaphore) -> DeferredResult | None:
+        try:
+            return await self._check_operation(key, operation_id, polls, sem)
+        except Exception as e:
+            # E.g. a malformed operation: fail this key instead of ending 'results' for all of them
+            logger.exception("Checking operation %s failed", operation_id)
+            self.store.finish(key, "", str(e))
+            return DeferredResult(key, "", str(e))
+
+    async def _check_operation(
+        self,
+        key: str,
+        operation_id: str,
+        polls: int,
+        sem: asyncio.Semaphore,
+    ) -> DeferredResult | None:
+        async with sem:
+            try:
+                operation = await self.client.get_operation(operation_id)
+            except httpx.HTTPError as e:
+                if not classify_error(e, self.client.resilience.policy).retryable:
+                    # E.g. 404 for an unknown/expired operation: polling again would never succeed
+                    logger.error("Polling operation %s failed permanently: %s", operation_id, e)
+                    self.store.finish(key, "", str(e))
+                    return DeferredResult(key, "", str(e))
+                logger.warning("Polling operation %s failed: %s", operation_id, e)
+                self.store.reschedule(key, time.time() + self._backoff(polls))
+                return None
+
+        if not operation.get("done"):
+            self.store.reschedule(key, time.time() + self._backoff(polls))
+            return None
+
+        if "error" in operation:
+            error = json.dumps(operation["error"], ensure_ascii=False)
+            self.store.finish(key, "", error)
+            return DeferredResult(key, "", error)
+
+        alternatives = operation.get("response", {}).get("alternatives", [])
+        text = alternatives[0].get("message", {}).get("text", "") if alternatives else ""
+        self.store.finish(key, text, None)
+        return DeferredResult(key, text)
+
+    async def results(self) -> AsyncIterator[DeferredResult]:
+        """Yield results as operations finish, until nothing is pending."""
+        sem = asyncio.Semaphore(self.max_concurrency)
+
+        while self.store.pending_count():
+            due = self.store.due(time.time(), self.batch_size)
+            if not due:
+                next_poll = self.store.next_due_time()
+                await asyncio.sleep(max(0.0, (next_poll or time.time()) - time.time()))
+                continue
+
+            logger.debug("Polling %d operations...", len(due))
+            for finished in asyncio.as_completed([self._check(key, op_id, polls, sem) for key, op_id, polls in due]):
+                result = await finished
+                if result is not None:
+                    yield result
@@ -0,0 +1,22 @@
+import json
+from typing import Any
+
+try:
+    import orjson  # pyright: ignore[reportMissingImports]
+
+    ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on installed extras
+    ORJSON_AVAILABLE = False
+
+
+def loads(data: bytes | str) -> Any:
+    """
+    Decode a JSON document, using 'orjson' when it is installed.
+
+    Pass the raw response body ('response.content'): both decoders read
+    UTF-8 bytes directly, which skips the text decoding (and, for 'requests',
+    the charset detection) that 'response.json()' does first.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
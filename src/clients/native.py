@@ -1,50 +1,300 @@
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
 from typing import Any
 
+import httpx
 import requests
 
-from src.config import config, logger
+from src.clients.cache import CompletionCache
+from src.clients.coalesce import SingleFlight, request_key
+from src.clients.fastjson import loads
+from src.clients.pool import CredentialRouter
+from src.config import Credential, config, logger, with_folder
+from src.metrics import RequestTiming, TraceRecorder
+from src.ratelimit import RateLimiter, estimate_tokens
+from src.retry import ResilientCaller, RetryPolicy, call_with_retry, classify_error
+from src.scheduler import DeadlineExceededError, Priority, RequestScheduler, Ticket
+from src.structured import Path, PathPattern, StructuredStream
+from src.tokens import ContextBudget, ContextOverflowError
 
+try:
+    import h2  # noqa: F401  # pyright: ignore[reportMissingImports]
 
-class YandexNativeClient:
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on installed extras
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class StreamStats:
     """
-    Client for interacting with YandexGPT via the native REST API.
+    Timing and usage collected while a streamed completion is consumed.
+
+    Pass an instance to 'stream_text' and read it once the iterator is exhausted.
     """
 
-    def __init__(self) -> None:
-        self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "Authorization": f"Api-Key {config.api_key}",
-                "x-folder-id": config.folder_id,
-                "Content-Type": "application/json",
-            },
-        )
+    time_to_first_token: float | None = None
+    total_time: float | None = None
+    usage: dict[str, Any] | None = None
+
+
+class _NativeClientBase:
+    """
+    Shared request/response handling for the sync and async native clients.
+    """
+
+    cache: CompletionCache | None = None
+    rate_limiter: RateLimiter | None = None
+    router: CredentialRouter | None = None
+    budget: ContextBudget | None = None
+
+    @staticmethod
+    def _build_headers(credential: Credential | None = None) -> dict[str, str]:
+        """Constructs the authentication headers (for the primary credential by default)."""
+        api_key = credential.api_key if credential else config.api_key
+        folder_id = credential.folder_id if credential else config.folder_id
+        return {
+            "Authorization": f"Api-Key {api_key}",
+            "x-folder-id": folder_id,
+            "Content-Type": "application/json",
+        }
+
+    def _route(
+        self,
+        payload: dict[str, Any],
+    ) -> tuple[Credential | None, dict[str, Any], dict[str, str] | None]:
+        """
+        Picks a credential from the pool (if routing is enabled).
+
+        Returns:
+            Tuple of (credential, payload with that folder's model URI, per-request headers).
+
+        """
+        if self.router is None:
+            return None, payload, None
+        credential = self.router.choose()
+        routed = {**payload, "modelUri": with_folder(payload["modelUri"], credential.folder_id)}
+        return credential, routed, self._build_headers(credential)
+
+    def _report(self, credential: Credential | None, error: BaseException | None = None) -> None:
+        """Feeds the request outcome back to the credential router."""
+        if self.router is None or credential is None:
+            return
+        if error is None:
+            self.router.report_success(credential)
+            return
+        decision = classify_error(error, RetryPolicy())
+        self.router.report_failure(credential, decision.status_code, decision.retry_after)
 
     def _build_payload(
         self,
         prompt: str,
         system_prompt: str | None = None,
+        stream: bool = False,
+        json_schema: dict[str, Any] | None = None,
     ) -> dict[str, Any]:
-        """Constructs the request payload."""
+        """
+        Constructs the request payload.
+
+        With a context budget, 'maxTokens' is sized to what the prompt leaves
+        of the context window ('ContextOverflowError' if nothing fits).
+        With 'json_schema' the model is asked for JSON that follows it.
+        """
         messages = []
         if system_prompt:
             messages.append({"role": "system", "text": system_prompt})
         messages.append({"role": "user", "text": prompt})
 
-        return {
+        max_tokens = config.max_tokens
+        if self.budget is not None:
+            fitted = self.budget.fit(messages)
+            messages, max_tokens = fitted.messages, fitted.max_tokens
+
+        payload: dict[str, Any] = {
             "modelUri": config.model_uri,
             "completionOptions": {
-                "stream": False,
+                "stream": stream,
                 "temperature": config.temperature,
-                "maxTokens": str(config.max_tokens),
+                "maxTokens": str(max_tokens),
             },
             "messages": messages,
         }
+        if json_schema is not None:
+            payload["jsonSchema"] = {"schema": json_schema}
+        return payload
+
+    def _cache_key(self, payload: dict[str, Any]) -> str | None:
+        """Returns the completion cache key, or None if caching does not apply."""
+        options = payload["completionOptions"]
+        if self.cache is None or not self.cache.allows(options["temperature"]):
+            return None
+        return self.cache.make_key(
+            payload["modelUri"],
+            payload["messages"],
+            options["temperature"],
+            int(options["maxTokens"]),
+            # E.g. 'jsonSchema' for structured output
+            **{k: v for k, v in payload.items() if k not in ("modelUri", "messages", "completionOptions")},
+        )
+
+    def _cached_text(self, cache_key: str | None) -> str | None:
+        if cache_key is None or self.cache is None:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("Served from completion cache. %d chars.", len(cached))
+        return cached
+
+    def _store_text(self, cache_key: str | None, text: str) -> None:
+        # Empty strings mean failure and are never cached
+        if cache_key is not None and self.cache is not None and text:
+            self.cache.set(cache_key, text)
+
+    @staticmethod
+    def _estimate_tokens(payload: dict[str, Any]) -> int:
+        return estimate_tokens(payload["messages"], int(payload["completionOptions"]["maxTokens"]))
+
+    def _record_usage(self, estimated: int, usage: dict[str, Any] | None, timing: RequestTiming) -> None:
+        # The native API reports token counts as strings
+        if self.rate_limiter is not None and usage and "totalTokens" in usage:
+            self.rate_limiter.record_usage(estimated, int(usage["totalTokens"]))
+        if usage:
+            timing.prompt_tokens = int(usage.get("inputTextTokens", 0))
+            timing.completion_tokens = int(usage.get("completionTokens", 0))
+
+    @staticmethod
+    def _extract_text(result: dict[str, Any]) -> str:
+        """Pulls the first alternative's text out of a completion response."""
+        # Navigate safety through dictionary
+        alternatives = result.get("result", {}).get("alternatives", [])
+
+        if not alternatives:
+            logger.warning("API returned no alternatives.")
+            return ""
+
+        text_content = alternatives[0].get("message", {}).get("text", "")
+        logger.info("Request successful. Received %d chars.", len(text_content))
+        return text_content
+
+    @staticmethod
+    def _parse_stream_line(line: str, emitted: int) -> tuple[str, dict[str, Any] | None]:
+        """
+        Parses one line of a streamed response.
+
+        The native API sends the accumulated text in every chunk, so only the
+        part after the first 'emitted' characters is returned as the delta.
+        Lines that are not a JSON object (e.g. keep-alives) are logged and skipped.
+
+        Returns:
+            Tuple of (new text, usage dict if present in the chunk).
+
+        """
+        if not line.strip():
+            return "", None
+
+        try:
+            chunk = loads(line)
+        except ValueError:
+            # Keep-alive or otherwise non-JSON line; the next chunk carries the full text anyway
+            logger.warning("Skipping unparsable stream line: %.200r", line)
+            return "", None
+        if not isinstance(chunk, dict):
+            logger.warning("Skipping unexpected stream chunk: %.200r", line)
+            return "", None
+
+        result = chunk.get("result", {})
+        alternatives = result.get("alternatives", [])
+        text = alternatives[0].get("message", {}).get("text", "") if alternatives else ""
+        return text[emitted:], result.get("usage")
+
+
+class YandexNativeClient(_NativeClientBase):
+    """
+    Client for interacting with YandexGPT via the native REST API.
+    """
+
+    def __init__(
+        self,
+        cache: CompletionCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        router: CredentialRouter | None = None,
+        budget: ContextBudget | None = None,
+    ) -> None:
+        """
+        Args:
+            cache: Optional completion cache for repeated prompts.
+            rate_limiter: Optional request/token quota limiter.
+            retry_policy: Retry settings for transient errors
+                (use 'RetryPolicy(max_attempts=1)' to disable retries).
+            router: Optional credential pool to spread requests over several folders.
+            budget: Optional context budget that sizes 'maxTokens' to the prompt.
+
+        """
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.router = router
+        self.budget = budget
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.session = requests.Session()
+        self.session.headers.update(self._build_headers())
+
+    def _post(self, payload: dict[str, Any], timing: RequestTiming, timeout: float = 30.0) -> dict[str, Any]:
+        # Each attempt (including retries) may go to a different credential
+        credential, payload, headers = self._route(payload)
+        timing.begin_attempt()
+        try:
+            response = self.session.post(
+                config.native_api_url,
+                json=payload,
+                headers=headers,
+                timeout=timeout,
+            )
+            # 'requests' only exposes the time until the response headers were parsed
+            timing.ttfb = response.elapsed.total_seconds()
+            timing.status = str(response.status_code)
+            response.raise_for_status()
+            result = self._decode(response)
+        except requests.exceptions.RequestException as e:
+            self._report(credential, e)
+            timing.fail(e)
+            raise
+        self._report(credential)
+        return result
+
+    @staticmethod
+    def _decode(response: requests.Response) -> dict[str, Any]:
+        """JSON body of a response; a non-JSON body (e.g. a proxy's error page) fails like a transport error."""
+        try:
+            return loads(response.content)
+        except ValueError as e:
+            msg = f"Response body is not JSON: {response.content[:200]!r}"
+            raise requests.exceptions.InvalidJSONError(msg, response=response) from e
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Exact token count of 'text' from the tokenize endpoint (e.g. to calibrate 'TokenCounter').
+
+        Raises:
+            requests.exceptions.RequestException: The request failed.
+
+        """
+        response = self.session.post(
+            config.tokenize_api_url,
+            json={"modelUri": config.model_uri, "text": text},
+            timeout=30,
+        )
+        response.raise_for_status()
+        return len(response.json().get("tokens", []))
 
     def generate_text(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> str:
         """
         Sends a synchronous request to YandexGPT.
 
+        Transient errors (429, 5xx, timeouts) are retried with backoff first.
+
         Args:
             prompt: User input text.
             system_prompt: Context for the AI.
@@ -53,31 +303,505 @@ class YandexNativeClient:
             Generated text string or empty string on failure.
 
         """
-        payload = self._build_payload(prompt, system_prompt)
+        try:
+            payload = self._build_payload(prompt, system_prompt)
+        except ContextOverflowError as e:
+            logger.error("Prompt does not fit the context window: %s", e)
+            return ""
+        timing = RequestTiming(api="native", model_uri=payload["modelUri"])
+        cache_key = self._cache_key(payload)
+        cached = self._cached_text(cache_key)
+        if cached is not None:
+            timing.status = "cached"
+            timing.finish()
+            return cached
+
+        estimated = self._estimate_tokens(payload)
+
+        def attempt() -> dict[str, Any]:
+            # Every attempt, retries included, is an upstream call against the quota
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(estimated)
+            return self._post(payload, timing)
+
         logger.info("Sending native request. Model: %s", config.model_name)
 
         try:
-            response = self.session.post(
+            result = call_with_retry(attempt, self.retry_policy)
+            self._record_usage(estimated, result.get("result", {}).get("usage"), timing)
+            text = self._extract_text(result)
+            self._store_text(cache_key, text)
+            return text
+
+        except requests.exceptions.RequestException as e:
+            logger.error("Native API Request failed: %s", e)
+            if e.response is not None:
+                logger.error("Error details: %s", e.response.text)
+            return ""
+        finally:
+            timing.finish()
+
+    def stream_text(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a helpful assistant.",
+        stats: StreamStats | None = None,
+        json_schema: dict[str, Any] | None = None,
+    ) -> Iterator[str]:
+        """
+        Streams the completion, yielding text deltas as they arrive.
+
+        Args:
+            prompt: User input text.
+            system_prompt: Context for the AI.
+            stats: Optional holder for time-to-first-token, total time and usage.
+            json_schema: Request JSON output that follows this schema (see 'stream_json').
+
+        Yields:
+            New pieces of generated text. Stops early (after logging) on failure.
+
+        """
+        try:
+            payload = self._build_payload(prompt, system_prompt, stream=True, json_schema=json_schema)
+        except ContextOverflowError as e:
+            logger.error("Prompt does not fit the context window: %s", e)
+            return
+        timing = RequestTiming(api="native_stream", model_uri=payload["modelUri"])
+        estimated = self._estimate_tokens(payload)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimated)
+
+        logger.info("Sending native streaming request. Model: %s", config.model_name)
+        stats = stats if stats is not None else StreamStats()
+        started = time.perf_counter()
+        emitted = 0
+
+        credential, payload, headers = self._route(payload)
+        timing.begin_attempt()
+
+        try:
+            with self.session.post(
                 config.native_api_url,
                 json=payload,
+                headers=headers,
                 timeout=30,
+                stream=True,
+            ) as response:
+                timing.status = str(response.status_code)
+                response.raise_for_status()
+
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    delta, usage = self._parse_stream_line(line, emitted)
+                    if usage:
+                        stats.usage = usage
+                    if delta:
+                        if stats.time_to_first_token is None:
+                            stats.time_to_first_token = time.perf_counter() - started
+                        emitted += len(delta)
+                        yield delta
+            # Only a fully read body counts as a success for the credential
+            self._report(credential)
+
+        except requests.exceptions.RequestException as e:
+            self._report(credential, e)
+            timing.fail(e)
+            logger.error("Native API streaming request failed: %s", e)
+            if e.response is not None:
+                logger.error("Error details: %s", e.response.text)
+        finally:
+            stats.total_time = time.perf_counter() - started
+            self._record_usage(estimated, stats.usage, timing)
+            # For streams the interesting "first byte" is the first token
+            timing.ttfb = stats.time_to_first_token
+            timing.finish()
+
+        logger.info(
+            "Stream finished. Received %d chars, TTFT: %s s.",
+            emitted,
+            f"{stats.time_to_first_token:.3f}" if stats.time_to_first_token is not None else "n/a",
+        )
+
+    def stream_json(
+        self,
+        prompt: str,
+        schema: dict[str, Any],
+        system_prompt: str = "You are a helpful assistant.",
+        select: PathPattern = (None,),
+        strict: bool = True,
+        stats: StreamStats | None = None,
+    ) -> Iterator[tuple[Path, Any]]:
+        """
+        Streams a JSON completion, yielding selected values as soon as they are complete.
+
+        Args:
+            prompt: User input text.
+            schema: JSON Schema the output must follow; values are validated as they close.
+            system_prompt: Context for the AI.
+            select: Path pattern of the values to yield, e.g. ("records", None)
+                for each element of the 'records' array (see 'StructuredStream').
+            strict: Raise on schema violations instead of skipping invalid values.
+            stats: Optional holder for time-to-first-token, total time and usage.
+
+        Yields:
+            Tuple of (path, value) for every selected value.
+
+        Raises:
+            StructuredOutputError: The output is not valid JSON, violates the schema, or was cut off.
+
+        """
+        stream = StructuredStream(schema, select, strict)
+        yield from stream.iter(self.stream_text(prompt, system_prompt, stats, json_schema=schema))
+
+
+class AsyncYandexNativeClient(_NativeClientBase):
+    """
+    Asynchronous client for the native REST API.
+
+    All requests share one pooled keep-alive connection pool (HTTP/2 when the
+    'h2' package is installed, e.g. via 'httpx[http2]'), so a single instance
+    should be reused for the whole batch and closed with 'aclose()' or
+    'async with'.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        http2: bool = True,
+        cache: CompletionCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        resilience: ResilientCaller | None = None,
+        router: CredentialRouter | None = None,
+        budget: ContextBudget | None = None,
+        coalesce: bool = False,
+        scheduler: RequestScheduler | None = None,
+        priority: Priority = "standard",
+    ) -> None:
+        """
+        Args:
+            max_connections: Upper bound on open connections in the pool.
+            max_keepalive_connections: Idle connections kept warm for reuse.
+            keepalive_expiry: Seconds an idle connection is kept alive.
+            timeout: Read/write/pool timeout in seconds.
+            connect_timeout: Timeout for establishing a connection in seconds.
+            http2: Use HTTP/2 if available (falls back to HTTP/1.1 otherwise).
+            cache: Optional completion cache for repeated prompts.
+            rate_limiter: Optional request/token quota limiter.
+            resilience: Retry/hedging wrapper for requests
+                (e.g. 'ResilientCaller(hedge_percentile=95)' to enable hedging).
+            router: Optional credential pool to spread requests over several folders.
+            budget: Optional context budget that sizes 'maxTokens' to the prompt.
+            coalesce: Share one upstream call among concurrent identical requests.
+            scheduler: Shared request scheduler (priority lanes, deadlines, fair
+                queueing). It takes the quota from its own rate limiter, which
+                replaces 'rate_limiter'.
+            priority: Default lane for this client's requests in the scheduler.
+
+        """
+        self.cache = cache
+        self.scheduler = scheduler
+        self.priority = priority
+        self.rate_limiter = scheduler.rate_limiter if scheduler is not None else rate_limiter
+        self.router = router
+        self.budget = budget
+        self.flight = SingleFlight() if coalesce else None
+        self.resilience = resilience or ResilientCaller()
+        if http2 and not HTTP2_AVAILABLE:
+            logger.debug("HTTP/2 requested but 'h2' is not installed; using HTTP/1.1.")
+
+        self.client = httpx.AsyncClient(
+            headers=self._build_headers(),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            http2=http2 and HTTP2_AVAILABLE,
+        )
+
+    async def __aenter__(self) -> "AsyncYandexNativeClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Closes the connection pool."""
+        await self.client.aclose()
+
+    async def _post(
+        self,
+        payload: dict[str, Any],
+        timing: RequestTiming,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        # Each attempt (including retries and hedges) may go to a different credential
+        credential, payload, headers = self._route(payload)
+        timing.begin_attempt()
+        recorder = TraceRecorder()
+        try:
+            response = await self.client.post(
+                config.native_api_url,
+                json=payload,
+                headers=headers,
+                # None keeps the client's configured timeouts
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                extensions={"trace": recorder.async_trace},
             )
+            timing.status = str(response.status_code)
             response.raise_for_status()
+            result = self._decode(response)
+        except httpx.HTTPError as e:
+            self._report(credential, e)
+            timing.fail(e)
+            raise
+        finally:
+            # Only attempts that opened a new connection have a connect phase
+            if recorder.connect is not None:
+                timing.connect = recorder.connect
+            timing.ttfb = recorder.ttfb
+        self._report(credential)
+        return result
 
-            result = response.json()
-            # Navigate safety through dictionary
-            alternatives = result.get("result", {}).get("alternatives", [])
+    @staticmethod
+    def _decode(response: httpx.Response) -> dict[str, Any]:
+        """JSON body of a response; a non-JSON body (e.g. a proxy's error page) fails like a transport error."""
+        try:
+            return loads(response.content)
+        except ValueError as e:
+            msg = f"Response body is not JSON: {response.content[:200]!r}"
+            raise httpx.DecodingError(msg, request=response.request) from e
 
-            if not alternatives:
-                logger.warning("API returned no alternatives.")
-                return ""
+    @asynccontextmanager
+    async def _admitted(
+        self,
+        estimated: int,
+        priority: Priority | None,
+        deadline: float | None,
+    ) -> AsyncIterator[Ticket | None]:
+        """Waits for the request's turn in the scheduler (or just for quota without one)."""
+        if self.scheduler is None:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(estimated)
+            yield None
+            return
 
-            text_content = alternatives[0].get("message", {}).get("text", "")
-            logger.info("Request successful. Received %d chars.", len(text_content))
-            return text_content
+        async with self.scheduler.slot(priority or self.priority, deadline=deadline, tokens=estimated) as ticket:
+            try:
+                yield ticket
+            except httpx.HTTPStatusError as e:
+                ticket.report_error(e.response.status_code)
+                raise
 
-        except requests.exceptions.RequestException as e:
+    async def generate_text(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a helpful assistant.",
+        priority: Priority | None = None,
+        deadline: float | None = None,
+    ) -> str:
+        """
+        Sends an asynchronous request to YandexGPT.
+
+        Transient errors are retried with backoff (and optionally hedged)
+        before giving up.
+
+        Args:
+            prompt: User input text.
+            system_prompt: Context for the AI.
+            priority: Scheduler lane for this request (defaults to the client's).
+            deadline: Absolute 'time.monotonic()' after which the answer is no
+                longer needed; with a scheduler the request is dropped unsent
+                once it passes, and each attempt's timeout is capped by it.
+
+        Returns:
+            Generated text string or empty string on failure.
+
+        """
+        try:
+            payload = self._build_payload(prompt, system_prompt)
+        except ContextOverflowError as e:
+            logger.error("Prompt does not fit the context window: %s", e)
+            return ""
+        timing = RequestTiming(api="native", model_uri=payload["modelUri"])
+        cache_key = self._cache_key(payload)
+        cached = self._cached_text(cache_key)
+        if cached is not None:
+            timing.status = "cached"
+            timing.finish()
+            return cached
+
+        estimated = self._estimate_tokens(payload)
+
+        async def send() -> dict[str, Any]:
+            attempts = 0
+            async with self._admitted(estimated, priority, deadline) as ticket:
+
+                async def attempt() -> dict[str, Any]:
+                    nonlocal attempts
+                    attempts += 1
+                    # Quota for the first attempt came with admission; retries and
+                    # hedged duplicates are extra upstream calls against it
+                    if attempts > 1 and self.rate_limiter is not None:
+                        await self.rate_limiter.acquire_async(estimated)
+                    return await self._post(payload, timing, ticket.time_left() if ticket is not None else None)
+
+                logger.debug("Sending async native request. Model: %s", config.model_name)
+                result = await self.resilience.call(attempt)
+            self._record_usage(estimated, result.get("result", {}).get("usage"), timing)
+            return result
+
+        try:
+            if self.flight is not None:
+                # Identical concurrent requests share one upstream call (and its quota)
+                result = await self.flight.do(request_key(**payload), send)
+            else:
+                result = await send()
+            text = self._extract_text(result)
+            self._store_text(cache_key, text)
+            return text
+
+        except httpx.HTTPStatusError as e:
             logger.error("Native API Request failed: %s", e)
-            if e.response is not None:
-                logger.error("Error details: %s", e.response.text)
+            logger.error("Error details: %s", e.response.text)
+            return ""
+        except httpx.HTTPError as e:
+            logger.error("Native API Request failed: %s", e)
+            return ""
+        except DeadlineExceededError as e:
+            logger.warning("Native API Request dropped: %s", e)
+            timing.status = "deadline_exceeded"
             return ""
+        finally:
+            if timing.attempts == 0 and timing.status != "deadline_exceeded":
+                # Served by another caller's in-flight request
+                timing.status = "coalesced"
+            timing.finish()
+
+    async def stream_text(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a helpful assistant.",
+        stats: StreamStats | None = None,
+        json_schema: dict[str, Any] | None = None,
+        priority: Priority | None = None,
+        deadline: float | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streams the completion, yielding text deltas as they arrive.
+
+        Args:
+            prompt: User input text.
+            system_prompt: Context for the AI.
+            stats: Optional holder for time-to-first-token, total time and usage.
+            json_schema: Request JSON output that follows this schema (see 'stream_json').
+            priority: Scheduler lane for this request (defaults to the client's).
+            deadline: Absolute 'time.monotonic()' by which the stream must have
+                started; with a scheduler the request is dropped unsent once it passes.
+
+        Yields:
+            New pieces of generated text. Stops early (after logging) on failure.
+
+        """
+        try:
+            payload = self._build_payload(prompt, system_prompt, stream=True, json_schema=json_schema)
+        except ContextOverflowError as e:
+            logger.error("Prompt does not fit the context window: %s", e)
+            return
+        timing = RequestTiming(api="native_stream", model_uri=payload["modelUri"])
+        estimated = self._estimate_tokens(payload)
+        try:
+            # The slot is held until the stream is consumed or closed
+            async with (
+                self._admitted(estimated, priority, deadline) as ticket,
+                aclosing(self._stream(payload, timing, estimated, stats, ticket)) as deltas,
+            ):
+                async for delta in deltas:
+                    yield delta
+        except DeadlineExceededError as e:
+            logger.warning("Native API streaming request dropped: %s", e)
+            timing.status = "deadline_exceeded"
+            timing.finish()
+
+    async def _stream(
+        self,
+        payload: dict[str, Any],
+        timing: RequestTiming,
+        estimated: int,
+        stats: StreamStats | None,
+        ticket: Ticket | None,
+    ) -> AsyncIterator[str]:
+        logger.debug("Sending async native streaming request. Model: %s", config.model_name)
+        stats = stats if stats is not None else StreamStats()
+        started = time.perf_counter()
+        emitted = 0
+
+        timeout = ticket.time_left() if ticket is not None else None
+        credential, payload, headers = self._route(payload)
+        timing.begin_attempt()
+        recorder = TraceRecorder()
+
+        try:
+            async with self.client.stream(
+                "POST",
+                config.native_api_url,
+                json=payload,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                extensions={"trace": recorder.async_trace},
+            ) as response:
+                timing.status = str(response.status_code)
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    delta, usage = self._parse_stream_line(line, emitted)
+                    if usage:
+                        stats.usage = usage
+                    if delta:
+                        if stats.time_to_first_token is None:
+                            stats.time_to_first_token = time.perf_counter() - started
+                        emitted += len(delta)
+                        yield delta
+            # Only a fully read body counts as a success for the credential
+            self._report(credential)
+
+        except httpx.HTTPStatusError as e:
+            self._report(credential, e)
+            timing.fail(e)
+            if ticket is not None:
+                ticket.report_error(e.response.status_code)
+            logger.error("Native API streaming request failed: %s", e)
+            logger.error("Error details: %s", e.response.text)
+        except httpx.HTTPError as e:
+            self._report(credential, e)
+            timing.fail(e)
+            if ticket is not None:
+                ticket.report_error(None)
+            logger.error("Native API streaming request failed: %s", e)
+        finally:
+            stats.total_time = time.perf_counter() - started
+            self._record_usage(estimated, stats.usage, timing)
+            # For streams the interesting "first byte" is the first token
+            timing.connect = recorder.connect
+            timing.ttfb = stats.time_to_first_token
+            timing.finish()
+
+    async def stream_json(
+        self,
+        prompt: str,
+        schema: dict[str, Any],
+        system_prompt: str = "You are a helpful assistant.",
+        select: PathPattern = (None,),
+        strict: bool = True,
+        stats: StreamStats | None = None,
+    ) -> AsyncIterator[tuple[Path, Any]]:
+        """Async counterpart of 'YandexNativeClient.stream_json'."""
+        stream = StructuredStream(schema, select, strict)
+        async for item in stream.aiter(self.stream_text(prompt, system_prompt, stats, json_schema=schema)):
+            yield item
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from src.config import Credential, config, logger
+
+
+@dataclass
+class _Entry:
+    credential: Credential
+    consecutive_failures: int = 0
+    available_at: float = 0.0  # monotonic time when the entry may be used again
+
+
+class CredentialRouter:
+    """
+    Spreads requests over a pool of folder/API key pairs by weight.
+
+    Entries that are throttled (429) or keep failing (5xx, network errors)
+    are taken out for a cooldown that doubles with every consecutive failure;
+    authorization errors (401/403) bench an entry for 'auth_cooldown'. Once
+    the cooldown ends the entry receives traffic again, and a success resets
+    its failure count.
+
+    Thread- and asyncio-safe: all state changes happen under a lock and never await.
+    """
+
+    def __init__(
+        self,
+        credentials: tuple[Credential, ...] | None = None,
+        failure_threshold: int = 3,
+        base_cooldown: float = 5.0,
+        max_cooldown: float = 300.0,
+        auth_cooldown: float = 3600.0,
+    ) -> None:
+        credentials = credentials or config.credential_pool
+        self._entries = {c: _Entry(c) for c in credentials}
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self) -> list[Credential]:
+        return list(self._entries)
+
+    def available(self) -> list[Credential]:
+        """Credentials currently eligible for traffic."""
+        now = time.monotonic()
+        with self._lock:
+            return [c for c, e in self._entries.items() if e.available_at <= now]
+
+    def choose(self) -> Credential:
+        """Pick a healthy credential by weight (or the one recovering soonest if none are)."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [e for e in self._entries.values() if e.available_at <= now]
+            if not healthy:
+                entry = min(self._entries.values(), key=lambda e: e.available_at)
+                logger.warning("All credentials are cooling down; using folder %s.", entry.credential.folder_id)
+                return entry.credential
+
+            weights = [e.credential.weight for e in healthy]
+            return random.choices(healthy, weights=weights)[0].credential
+
+    def report_success(self, credential: Credential) -> None:
+        with self._lock:
+            entry = self._entries[credential]
+            if entry.consecutive_failures:
+                logger.info("Folder %s recovered.", credential.folder_id)
+            entry.consecutive_failures = 0
+
+    def report_failure(
+        self,
+        credential: Credential,
+        status_code: int | None = None,
+        retry_after: float | None = None,
+    ) -> None:
+        """
+        Record a failed request.
+
+        Args:
+            credential: Credential the request was sent with.
+            status_code: HTTP status, or None for timeouts / connection errors.
+            retry_after: Server-provided wait time, if any.
+
+        """
+        # Other client errors (400, 404, ...) say nothing about the credential
+        if status_code is not None and status_code < 500 and status_code not in (401, 403, 429):
+            return
+
+        with self._lock:
+            entry = self._entries[credential]
+            entry.consecutive_failures += 1
+
+            if status_code in (401, 403):
+                cooldown = self.auth_cooldown
+            elif status_code == 429 or entry.consecutive_failures >= self.failure_threshold:
+                exponent = max(0, entry.consecutive_failures - 1)
+                cooldown = min(self.max_cooldown, self.base_cooldown * 2**exponent)
+                if retry_after is not None:
+                    cooldown = max(cooldown, retry_after)
+            else:
+                return
+
+            entry.available_at = time.monotonic() + cooldown
+
+        logger.warning(
+            "Taking folder %s out of rotation for %.0fs (%s).",
+            credential.folder_id,
+            cooldown,
+            status_code or "network error",
+        )
@@ -0,0 +1,89 @@
+import asyncio
+import atexit
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+from src.config import Credential, config, logger
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+# (folder_id, api_key, base_url)
+ClientKey = tuple[str, str, str]
+
+
+class ClientRegistry:
+    """
+    Process-wide pool of shared OpenAI SDK clients.
+
+    One client (and therefore one warm connection pool) is kept per
+    credential and base URL. Async clients are additionally bound to the
+    event loop they were created in, because an 'httpx.AsyncClient' cannot
+    be shared across loops (e.g. consecutive 'asyncio.run' calls).
+
+    Clients handed out here are shared: do not close them or use them in
+    'with' blocks; call 'close()' / 'aclose()' on the registry instead.
+    The default registry closes its sync clients at interpreter exit.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sync: dict[ClientKey, OpenAI] = {}
+        self._async: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[ClientKey, AsyncOpenAI]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @staticmethod
+    def _key(credential: Credential | None) -> ClientKey:
+        if credential is None:
+            return config.folder_id, config.api_key, config.openai_base_url
+        return credential.folder_id, credential.api_key, config.openai_base_url
+
+    def openai(self, credential: Credential | None = None) -> "OpenAI":
+        """Shared synchronous client for the credential (the primary one by default)."""
+        key = self._key(credential)
+        with self._lock:
+            if key not in self._sync:
+                # Imported lazily: the SDK is the slowest import in the package
+                from src.clients.wrapper import get_openai_client
+
+                self._sync[key] = get_openai_client(credential)
+                logger.debug("Created shared OpenAI client for folder %s.", key[0])
+            return self._sync[key]
+
+    def async_openai(self, credential: Credential | None = None) -> "AsyncOpenAI":
+        """
+        Shared asynchronous client for the credential in the running event loop.
+
+        Must be called from a coroutine.
+        """
+        loop = asyncio.get_running_loop()
+        key = self._key(credential)
+        with self._lock:
+            clients = self._async.setdefault(loop, {})
+            if key not in clients:
+                from src.clients.wrapper import get_async_openai_client
+
+                clients[key] = get_async_openai_client(credential)
+                logger.debug("Created shared AsyncOpenAI client for folder %s.", key[0])
+            return clients[key]
+
+    def close(self) -> None:
+        """Closes all shared sync clients."""
+        with self._lock:
+            clients, self._sync = list(self._sync.values()), {}
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Closes the shared async clients of the running event loop (call before the loop ends)."""
+        with self._lock:
+            clients = self._async.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.close()
+
+
+# Default process-wide registry
+registry = ClientRegistry()
+atexit.register(registry.close)
@@ -0,0 +1,524 @@
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from typing import Any, Literal, TypeVar
+
+from src.clients.native import AsyncYandexNativeClient, YandexNativeClient
+from src.clients.registry import registry
+from src.config import config, logger
+from src.metrics import RequestTiming, metrics
+from src.retry import RetryPolicy, classify_error
+
+T = TypeVar("T")
+
+# Successful requests before an endpoint is ranked by its latency (tried first until then)
+WARMUP_SAMPLES = 3
+
+ApiSurface = Literal["native", "openai"]
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """One interchangeable way to serve a completion: an API surface and a model."""
+
+    api: ApiSurface
+    model_name: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.api}/{self.model_name}"
+
+    def model_uri(self, folder_id: str | None = None) -> str:
+        return f"gpt://{folder_id or config.folder_id}/{self.model_name}/latest"
+
+
+class NoHealthyEndpointError(RuntimeError):
+    """Every endpoint's circuit is open (or was already tried for this request)."""
+
+
+class CircuitBreaker:
+    """
+    Stops traffic to an endpoint that keeps failing, then probes it again.
+
+    closed    - requests flow; 'failure_threshold' consecutive failures open it.
+    open      - requests are refused until 'reset_timeout' has passed.
+    half_open - a single probe request is let through: success closes the
+                circuit, failure opens it again with a doubled timeout
+                (capped at 'max_reset_timeout').
+
+    Not thread-safe on its own; 'EndpointRouter' guards it with its lock.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        max_reset_timeout: float = 300.0,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def available(self, now: float) -> bool:
+        """Whether a request could be admitted now (does not change the state)."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return not self._probing
+
+    def allow(self, now: float) -> bool:
+        """Admits a request; in half-open state only one probe at a time."""
+        if not self.available(now):
+            return False
+        if self.state != self.CLOSED:
+            self.state = self.HALF_OPEN
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """The admitted request ended without a verdict on the endpoint's health."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+        self._probing = False
+
+    def record_failure(self, now: float) -> bool:
+        """
+        Counts a failure.
+
+        Returns:
+            True if this failure opened the circuit.
+
+        """
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+        elif self.state == self.OPEN or self.failures < self.failure_threshold:
+            return False
+        self.state = self.OPEN
+        self.opened_at = now
+        self._probing = False
+        return True
+
+
+@dataclass
+class EndpointStats:
+    """Moving latency and error profile of one endpoint (exponentially weighted)."""
+
+    latency: float | None = None  # seconds, successful requests only
+    error_rate: float = 0.0
+    requests: int = 0
+    successes: int = 0
+    in_flight: int = 0
+
+    def observe(self, alpha: float, latency: float, ok: bool) -> None:
+        self.requests += 1
+        self.error_rate += alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if not ok:
+            return
+        self.successes += 1
+        # The first request pays for connection setup (and lazy imports), so
+        # it only seeds the profile until the second one replaces it
+        if self.latency is None or self.successes == 2:
+            self.latency = latency
+            return
+        # Plain mean over the next samples, then an exponential moving average
+        weight = max(alpha, 1.0 / (self.successes - 1))
+        self.latency += weight * (latency - self.latency)
+
+
+class EndpointRouter:
+    """
+    Sends each request to the fastest healthy endpoint, failing over to the next.
+
+    Endpoints are ranked by their moving average latency, inflated by their
+    recent error rate; endpoints with too few samples are tried first, and a small
+    share of requests ('explore') goes to a random healthy endpoint so that
+    the profiles of slower ones stay current. Each endpoint has a circuit
+    breaker, so one that keeps failing is skipped instead of costing a full
+    timeout per request, and is probed again after a cooldown.
+
+    The latency profile only ranks endpoints. Every attempt, probes
+    included, gets the full 'timeout': completion latency grows with the
+    length of the answer, so a long but healthy generation must not be cut
+    off (and counted as a failure) because earlier answers were short.
+
+    Thread- and asyncio-safe: all state changes happen under a lock and never await.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[Endpoint] | None = None,
+        alpha: float = 0.2,
+        error_penalty: float = 4.0,
+        explore: float = 0.05,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        max_reset_timeout: float = 300.0,
+        timeout: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            endpoints: Candidate endpoints (defaults to both API surfaces with 'config.model_name').
+            alpha: Weight of the newest sample in the moving averages.
+            error_penalty: How strongly the error rate inflates an endpoint's latency score.
+            explore: Share of requests sent to a random healthy endpoint.
+            failure_threshold: Consecutive failures that open an endpoint's circuit.
+            reset_timeout: Seconds an open circuit waits before a probe.
+            max_reset_timeout: Cap for the doubling probe interval.
+            timeout: Seconds each attempt may take; running out counts as an endpoint failure.
+
+        """
+        if endpoints is None:
+            endpoints = (Endpoint("native", config.model_name), Endpoint("openai", config.model_name))
+        self.endpoints = tuple(endpoints)
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.explore = explore
+        self.timeout = timeout
+        self._stats = {e: EndpointStats() for e in self.endpoints}
+        self._breakers = {
+            e: CircuitBreaker(failure_threshold, reset_timeout, max_reset_timeout) for e in self.endpoints
+        }
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint: Endpoint) -> tuple[float, int, int]:
+        stats = self._stats[endpoint]
+        if stats.latency is None or stats.successes < WARMUP_SAMPLES:
+            # Warm-up: spread requests over the endpoints that still need samples
+            return 0.0, stats.in_flight, stats.requests
+        return stats.latency * (1.0 + self.error_penalty * stats.error_rate), stats.in_flight, 0
+
+    def ranked(self) -> list[Endpoint]:
+        """Endpoints that would currently accept a request, best first."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if self._breakers[e].available(now)]
+            return sorted(candidates, key=self._score)
+
+    def _acquire(self, exclude: set[Endpoint]) -> tuple[Endpoint, float]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = sorted(
+                (e for e in self.endpoints if e not in exclude and self._breakers[e].available(now)),
+                key=self._score,
+            )
+            if len(candidates) > 1 and random.random() < self.explore:
+                candidates.insert(0, candidates.pop(random.randrange(1, len(candidates))))
+            for endpoint in candidates:
+                breaker = self._breakers[endpoint]
+                if breaker.allow(now):
+                    self._stats[endpoint].in_flight += 1
+                    return endpoint, self.timeout
+        raise NoHealthyEndpointError(f"No healthy endpoint among {[e.name for e in self.endpoints]}")
+
+    def _release(self, endpoint: Endpoint, started: float, error: BaseException | None) -> bool:
+        """
+        Records the outcome of a request.
+
+        Returns:
+            True if the error counts against the endpoint (and another one should be tried).
+
+        """
+        now = time.monotonic()
+        # Timeouts, connection errors, 429 and 5xx say the endpoint is unwell;
+        # other errors (400, 401...) would fail on any endpoint
+        failed = error is not None and (
+            isinstance(error, TimeoutError) or classify_error(error, RetryPolicy()).retryable
+        )
+        with self._lock:
+            stats, breaker = self._stats[endpoint], self._breakers[endpoint]
+            stats.in_flight -= 1
+            if error is None:
+                if breaker.state != CircuitBreaker.CLOSED:
+                    logger.info("Endpoint %s recovered.", endpoint.name)
+                breaker.record_success()
+                stats.observe(self.alpha, now - started, ok=True)
+            elif failed:
+                stats.observe(self.alpha, now - started, ok=False)
+                if breaker.record_failure(now):
+                    metrics.circuit_trips.inc({"endpoint": endpoint.name})
+                    logger.warning(
+                        "Circuit opened for %s for %.1fs after %d failures.",
+                        endpoint.name,
+                        breaker.reset_timeout,
+                        breaker.failures,
+                    )
+            else:
+                breaker.release()
+        return failed
+
+    def call(self, fn: Callable[[Endpoint, float], T], max_attempts: int = 2) -> T:
+        """
+        Runs 'fn(endpoint, timeout)' on the best endpoint, failing over on endpoint errors.
+
+        Args:
+            fn: Sends the request to the given endpoint within 'timeout' seconds.
+            max_attempts: Endpoints to try at most for this request.
+
+        Raises:
+            NoHealthyEndpointError: No endpoint is available.
+
+        """
+        tried: set[Endpoint] = set()
+        last_error: BaseException | None = None
+        while True:
+            try:
+                endpoint, timeout = self._acquire(tried)
+            except NoHealthyEndpointError:
+                # Nothing left to fail over to: surface the endpoint's own error
+                if last_error is not None:
+                    raise last_error from None
+                raise
+            tried.add(endpoint)
+            started = time.monotonic()
+            try:
+                result = fn(endpoint, timeout)
+            except BaseException as e:
+                if not self._release(endpoint, started, e) or len(tried) >= max_attempts:
+                    raise
+                logger.warning("Endpoint %s failed (%s); failing over.", endpoint.name, e)
+                last_error = e
+                continue
+            self._release(endpoint, started, None)
+            return result
+
+    async def acall(self, fn: Callable[[Endpoint, float], Awaitable[T]], max_attempts: int = 2) -> T:
+        """Async counterpart of 'call'."""
+        tried: set[Endpoint] = set()
+        last_error: BaseException | None = None
+        while True:
+            try:
+                endpoint, timeout = self._acquire(tried)
+            except NoHealthyEndpointError:
+                # Nothing left to fail over to: surface the endpoint's own error
+                if last_error is not None:
+                    raise last_error from None
+                raise
+            tried.add(endpoint)
+            started = time.monotonic()
+            try:
+                result = await fn(endpoint, timeout)
+            except BaseException as e:
+                if not self._release(endpoint, started, e) or len(tried) >= max_attempts:
+                    raise
+                logger.warning("Endpoint %s failed (%s); failing over.", endpoint.name, e)
+                last_error = e
+                continue
+            self._release(endpoint, started, None)
+            return result
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Current profile of every endpoint (for logs and dashboards)."""
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.name,
+                    "state": self._breakers[e].state,
+                    "latency": self._stats[e].latency,
+                    "error_rate": round(self._stats[e].error_rate, 3),
+                    "requests": self._stats[e].requests,
+                }
+                for e in self.endpoints
+            ]
+
+
+class _RoutedClientBase:
+    router: EndpointRouter
+    native: YandexNativeClient | AsyncYandexNativeClient
+    max_attempts: int
+
+    @staticmethod
+    def _for_endpoint(payload: dict[str, Any], endpoint: Endpoint) -> dict[str, Any]:
+        return {**payload, "modelUri": endpoint.model_uri()}
+
+    def _cached(self, payload: dict[str, Any]) -> str | None:
+        """A cached answer from any endpoint's model, best endpoint first."""
+        if self.native.cache is None:
+            return None
+        for endpoint in self.router.ranked() or self.router.endpoints:
+            text = self.native._cached_text(self.native._cache_key(self._for_endpoint(payload, endpoint)))
+            if text is not None:
+                return text
+        return None
+
+    @staticmethod
+    def _openai_request(payload: dict[str, Any]) -> dict[str, Any]:
+        """The same request (budgeted messages and 'maxTokens') for the OpenAI-compatible API."""
+        options = payload["completionOptions"]
+        return {
+            "model": payload["modelUri"],
+            "messages": [{"role": m["role"], "content": m.get("text", m.get("content"))} for m in payload["messages"]],
+            "temperature": options["temperature"],
+            "max_tokens": int(options["maxTokens"]),
+        }
+
+    def _openai_usage(self, estimated: int, response: Any) -> None:
+        if self.native.rate_limiter is not None and response.usage:
+            self.native.rate_limiter.record_usage(estimated, response.usage.total_tokens)
+
+
+class RoutedClient(_RoutedClientBase):
+    """
+    Text generation over interchangeable endpoints (native / OpenAI-compatible API, model tiers).
+
+    Retries happen across endpoints via the router, so the underlying
+    clients do not retry on their own. Both API surfaces go through the
+    native client's completion cache, context budget and rate limiter; a
+    failover to another endpoint takes quota again.
+    """
+
+    def __init__(
+        self,
+        router: EndpointRouter | None = None,
+        native: YandexNativeClient | None = None,
+        max_attempts: int = 2,
+    ) -> None:
+        """
+        Args:
+            router: Endpoint router (defaults to both API surfaces with 'config.model_name').
+            native: Native client to use (its cache, rate limiter, credential pool and budget apply).
+            max_attempts: Endpoints tried per request.
+
+        """
+        self.router = router or EndpointRouter()
+        self.native: YandexNativeClient = native or YandexNativeClient()
+        self.max_attempts = max_attempts
+
+    def _send(self, endpoint: Endpoint, timeout: float, payload: dict[str, Any], estimated: int) -> str:
+        payload = self._for_endpoint(payload, endpoint)
+        if endpoint.api == "native":
+            timing = RequestTiming(api="native", model_uri=payload["modelUri"])
+            try:
+                result = self.native._post(payload, timing, timeout)
+                self.native._record_usage(estimated, result.get("result", {}).get("usage"), timing)
+            finally:
+                timing.finish()
+            text = self.native._extract_text(result)
+        else:
+            client = registry.openai().with_options(max_retries=0, timeout=timeout)
+            response = client.chat.completions.create(**self._openai_request(payload))
+            self._openai_usage(estimated, response)
+            text = response.choices[0].message.content or ""
+        self.native._store_text(self.native._cache_key(payload), text)
+        return text
+
+    def generate_text(self, prompt: str, system_prompt: str | None = "You are a helpful assistant.") -> str:
+        """
+        Generates a completion on the best available endpoint.
+
+        Returns:
+            Generated text string or empty string on failure.
+
+        """
+        try:
+            payload = self.native._build_payload(prompt, system_prompt)
+            cached = self._cached(payload)
+            if cached is not None:
+                return cached
+
+            estimated = self.native._estimate_tokens(payload)
+            rate_limiter = self.native.rate_limiter
+            # Quota for the first attempt is taken before routing, so waiting for it
+            # does not count as endpoint latency
+            if rate_limiter is not None:
+                rate_limiter.acquire(estimated)
+            attempts = 0
+
+            def send(endpoint: Endpoint, timeout: float) -> str:
+                nonlocal attempts
+                attempts += 1
+                if attempts > 1 and rate_limiter is not None:
+                    # A failover is another upstream call against the same quota
+                    rate_limiter.acquire(estimated)
+                return self._send(endpoint, timeout, payload, estimated)
+
+            return self.router.call(send, self.max_attempts)
+        except Exception as e:
+            logger.error("Routed request failed: %s", e)
+            return ""
+
+
+class AsyncRoutedClient(_RoutedClientBase):
+    """
+    Async counterpart of 'RoutedClient'; reuse one instance (and its connection pool).
+
+    With a scheduler on the native client, each routed request holds one of
+    its slots (in the client's lane) for all of its attempts.
+    """
+
+    def __init__(
+        self,
+        router: EndpointRouter | None = None,
+        native: AsyncYandexNativeClient | None = None,
+        max_attempts: int = 2,
+    ) -> None:
+        self.router = router or EndpointRouter()
+        self.native: AsyncYandexNativeClient = native or AsyncYandexNativeClient()
+        self.max_attempts = max_attempts
+
+    async def __aenter__(self) -> "AsyncRoutedClient":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.native.aclose()
+
+    async def _send(self, endpoint: Endpoint, timeout: float, payload: dict[str, Any], estimated: int) -> str:
+        payload = self._for_endpoint(payload, endpoint)
+        if endpoint.api == "native":
+            timing = RequestTiming(api="native", model_uri=payload["modelUri"])
+            try:
+                result = await self.native._post(payload, timing, timeout)
+                self.native._record_usage(estimated, result.get("result", {}).get("usage"), timing)
+            finally:
+                timing.finish()
+            text = self.native._extract_text(result)
+        else:
+            client = registry.async_openai().with_options(max_retries=0, timeout=timeout)
+            response = await client.chat.completions.create(**self._openai_request(payload))
+            self._openai_usage(estimated, response)
+            text = response.choices[0].message.content or ""
+        self.native._store_text(self.native._cache_key(payload), text)
+        return text
+
+    async def generate_text(self, prompt: str, system_prompt: str | None = "You are a helpful assistant.") -> str:
+        """Async counterpart of 'RoutedClient.generate_text'."""
+        try:
+            payload = self.native._build_payload(prompt, system_prompt)
+            cached = self._cached(payload)
+            if cached is not None:
+                return cached
+
+            estimated = self.native._estimate_tokens(payload)
+            rate_limiter = self.native.rate_limiter
+            attempts = 0
+
+            async def send(endpoint: Endpoint, timeout: float) -> str:
+                nonlocal attempts
+                attempts += 1
+                if attempts > 1 and rate_limiter is not None:
+                    # A failover is another upstream call against the same quota
+                    await rate_limiter.acquire_async(estimated)
+                return await self._send(endpoint, timeout, payload, estimated)
+
+            # Quota (or a scheduler slot) for the first attempt, taken outside the endpoint timing
+            async with self.native._admitted(estimated, None, None):
+                return await self.router.acall(send, self.max_attempts)
+        except Exception as e:
+            logger.error("Routed request failed: %s", e)
+            return ""
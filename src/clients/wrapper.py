@@ -1,26 +1,321 @@
-from openai import AsyncOpenAI, OpenAI
+import weakref
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
 
-from src.config import config
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI, OpenAIError
+from openai.types.chat import ChatCompletion
 
+from src.clients.cache import CompletionCache
+from src.clients.coalesce import SingleFlight, request_key
+from src.clients.fastjson import loads
+from src.clients.pool import CredentialRouter
+from src.config import Credential, config, logger, with_folder
+from src.metrics import RequestTiming, TraceRecorder
+from src.retry import RetryPolicy, classify_error
+from src.structured import Path, PathPattern, StructuredStream
 
-def get_openai_client() -> OpenAI:
+
+# Timing of the SDK call running in the current thread / task
+_current_call: ContextVar[RequestTiming | None] = ContextVar("current_sdk_call", default=None)
+
+
+@contextmanager
+def _sdk_call(options: Any) -> Iterator[RequestTiming]:
+    """Records one SDK call, all of its internal retries included, as one 'RequestTiming'."""
+    body = getattr(options, "json_data", None)
+    body = body if isinstance(body, dict) else {}
+    api = "openai_stream" if body.get("stream") else "openai"
+    timing = RequestTiming(api=api, model_uri=str(body.get("model", getattr(options, "url", ""))))
+    token = _current_call.set(timing)
+    try:
+        yield timing
+    except BaseException as e:
+        # Includes timeouts and connection errors, which never produce a response
+        timing.fail(e)
+        raise
+    finally:
+        _current_call.reset(token)
+        timing.finish()
+
+
+class _MeteredOpenAI(OpenAI):
+    """'OpenAI' client whose calls are recorded in 'src.metrics.metrics'."""
+
+    def request(self, cast_to: Any, options: Any, *args: Any, **kwargs: Any) -> Any:  # pyright: ignore[reportIncompatibleMethodOverride]
+        with _sdk_call(options):
+            return super().request(cast_to, options, *args, **kwargs)
+
+
+class _MeteredAsyncOpenAI(AsyncOpenAI):
+    """'AsyncOpenAI' client whose calls are recorded in 'src.metrics.metrics'."""
+
+    async def request(self, cast_to: Any, options: Any, *args: Any, **kwargs: Any) -> Any:  # pyright: ignore[reportIncompatibleMethodOverride]
+        with _sdk_call(options):
+            return await super().request(cast_to, options, *args, **kwargs)
+
+
+class _SdkMetricsHooks:
+    """
+    httpx event hooks that add each HTTP attempt of an SDK call to its 'RequestTiming'.
+
+    The SDK retries internally; every attempt counts towards 'attempts' and
+    the last response sets the status, connection timings and usage.
+    Streamed responses count as finished when their headers arrive (the body
+    is consumed by the caller later).
+    """
+
+    def __init__(self) -> None:
+        self._pending: weakref.WeakKeyDictionary[httpx.Request, tuple[RequestTiming, TraceRecorder]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _start(self, request: httpx.Request, recorder: TraceRecorder) -> None:
+        timing = _current_call.get()
+        if timing is None:
+            return
+        timing.begin_attempt()
+        self._pending[request] = (timing, recorder)
+
+    def _finish(self, response: httpx.Response) -> None:
+        entry = self._pending.pop(response.request, None)
+        if entry is None:
+            return
+        timing, recorder = entry
+        timing.status = str(response.status_code)
+        timing.connect = recorder.connect
+        timing.ttfb = recorder.ttfb
+
+        if timing.api == "openai" and response.is_success:
+            try:
+                usage = loads(response.content).get("usage") or {}
+                timing.prompt_tokens = usage.get("prompt_tokens")
+                timing.completion_tokens = usage.get("completion_tokens")
+            except ValueError:
+                logger.debug("Could not read usage from response body.")
+
+    def on_request(self, request: httpx.Request) -> None:
+        recorder = TraceRecorder()
+        request.extensions["trace"] = recorder.sync_trace
+        self._start(request, recorder)
+
+    def on_response(self, response: httpx.Response) -> None:
+        if self._is_buffered(response):
+            response.read()
+        self._finish(response)
+
+    async def on_request_async(self, request: httpx.Request) -> None:
+        recorder = TraceRecorder()
+        request.extensions["trace"] = recorder.async_trace
+        self._start(request, recorder)
+
+    async def on_response_async(self, response: httpx.Response) -> None:
+        if self._is_buffered(response):
+            await response.aread()
+        self._finish(response)
+
+    def _is_buffered(self, response: httpx.Response) -> bool:
+        # Non-streamed bodies are read here so that 'usage' can be recorded
+        entry = self._pending.get(response.request)
+        return entry is not None and entry[0].api == "openai" and response.is_success
+
+
+def get_openai_client(credential: Credential | None = None) -> OpenAI:
     """
     Factory to create a synchronous OpenAI client configured for YandexGPT.
+
+    Uses the primary credential unless another pool entry is given. Every
+    request is recorded in 'src.metrics.metrics'.
     """
-    return OpenAI(
+    hooks = _SdkMetricsHooks()
+    return _MeteredOpenAI(
         base_url=config.openai_base_url,
-        api_key=config.api_key,
+        api_key=credential.api_key if credential else config.api_key,
         # In Yandex OpenAI-compatible API, 'project' maps to X-Folder-Id
-        project=config.folder_id,
+        project=credential.folder_id if credential else config.folder_id,
+        http_client=DefaultHttpxClient(event_hooks={"request": [hooks.on_request], "response": [hooks.on_response]}),
     )
 
 
-def get_async_openai_client() -> AsyncOpenAI:
+def get_async_openai_client(credential: Credential | None = None) -> AsyncOpenAI:
     """
     Factory to create an asynchronous OpenAI client configured for YandexGPT.
+
+    Uses the primary credential unless another pool entry is given. Every
+    request is recorded in 'src.metrics.metrics'.
     """
-    return AsyncOpenAI(
+    hooks = _SdkMetricsHooks()
+    return _MeteredAsyncOpenAI(
         base_url=config.openai_base_url,
-        api_key=config.api_key,
-        project=config.folder_id,
+        api_key=credential.api_key if credential else config.api_key,
+        project=credential.folder_id if credential else config.folder_id,
+        http_client=DefaultAsyncHttpxClient(
+            event_hooks={"request": [hooks.on_request_async], "response": [hooks.on_response_async]},
+        ),
     )
+
+
+class RoutedOpenAIClients:
+    """
+    One sync and one async OpenAI client per credential, used with a 'CredentialRouter'.
+
+    'chat_completion' / 'async_chat_completion' pick a credential for each
+    call, rewrite the model URI to that folder and report the outcome back
+    to the router.
+    """
+
+    def __init__(self, router: CredentialRouter) -> None:
+        self.router = router
+        self._sync: dict[Credential, OpenAI] = {}
+        self._async: dict[Credential, AsyncOpenAI] = {}
+
+    def _report_failure(self, credential: Credential, error: OpenAIError) -> None:
+        decision = classify_error(error, RetryPolicy())
+        self.router.report_failure(credential, decision.status_code, decision.retry_after)
+
+    def chat_completion(self, **kwargs: Any) -> ChatCompletion:
+        """'chat.completions.create(**kwargs)' on the credential chosen by the router."""
+        credential = self.router.choose()
+        if credential not in self._sync:
+            self._sync[credential] = get_openai_client(credential)
+
+        kwargs["model"] = with_folder(kwargs["model"], credential.folder_id)
+        try:
+            response = self._sync[credential].chat.completions.create(**kwargs)
+        except OpenAIError as e:
+            self._report_failure(credential, e)
+            raise
+        self.router.report_success(credential)
+        return response
+
+    async def async_chat_completion(self, **kwargs: Any) -> ChatCompletion:
+        """Async counterpart of 'chat_completion'."""
+        credential = self.router.choose()
+        if credential not in self._async:
+            self._async[credential] = get_async_openai_client(credential)
+
+        kwargs["model"] = with_folder(kwargs["model"], credential.folder_id)
+        try:
+            response = await self._async[credential].chat.completions.create(**kwargs)
+        except OpenAIError as e:
+            self._report_failure(credential, e)
+            raise
+        self.router.report_success(credential)
+        return response
+
+    async def aclose(self) -> None:
+        """Close all clients created so far."""
+        for client in self._sync.values():
+            client.close()
+        for client in self._async.values():
+            await client.close()
+
+
+def _completion_cache_key(cache: CompletionCache, kwargs: dict[str, Any]) -> str | None:
+    if kwargs.get("stream") or not cache.allows(kwargs.get("temperature")):
+        return None
+    # Everything else (tools, tool_choice, response_format, top_p, stop, seed...) is part of the key
+    options = {k: v for k, v in kwargs.items() if k not in ("model", "messages", "temperature", "max_tokens", "stream")}
+    return cache.make_key(
+        kwargs["model"],
+        list(kwargs["messages"]),
+        kwargs.get("temperature"),
+        kwargs.get("max_tokens"),
+        **options,
+    )
+
+
+def cached_chat_completion(client: OpenAI, cache: CompletionCache, **kwargs: Any) -> ChatCompletion:
+    """
+    'client.chat.completions.create(**kwargs)' served from 'cache' when possible.
+
+    Streaming requests and temperatures above the cache limit always go upstream.
+    """
+    key = _completion_cache_key(cache, kwargs)
+    if key is not None and (cached := cache.get(key)) is not None:
+        return ChatCompletion.model_validate_json(cached)
+
+    response = client.chat.completions.create(**kwargs)
+    if key is not None and response.choices:
+        cache.set(key, response.model_dump_json())
+    return response
+
+
+async def coalesced_chat_completion(client: AsyncOpenAI, flight: SingleFlight, **kwargs: Any) -> ChatCompletion:
+    """
+    'client.chat.completions.create(**kwargs)', sharing one upstream call among
+    concurrent identical requests (same model, messages and options).
+
+    Streaming requests are never coalesced.
+    """
+    if kwargs.get("stream"):
+        return await client.chat.completions.create(**kwargs)
+    return await flight.do(request_key(**kwargs), lambda: client.chat.completions.create(**kwargs))
+
+
+async def async_cached_chat_completion(
+    client: AsyncOpenAI,
+    cache: CompletionCache,
+    flight: SingleFlight | None = None,
+    **kwargs: Any,
+) -> ChatCompletion:
+    """
+    Async counterpart of 'cached_chat_completion'.
+
+    With 'flight', concurrent cache misses for the same request share one upstream call.
+    """
+    key = _completion_cache_key(cache, kwargs)
+    if key is not None and (cached := cache.get(key)) is not None:
+        return ChatCompletion.model_validate_json(cached)
+
+    if flight is not None:
+        response = await coalesced_chat_completion(client, flight, **kwargs)
+    else:
+        response = await client.chat.completions.create(**kwargs)
+    if key is not None and response.choices:
+        cache.set(key, response.model_dump_json())
+    return response
+
+
+def _json_schema_format(schema: dict[str, Any]) -> dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": "response", "schema": schema}}
+
+
+def structured_chat_completion(
+    client: OpenAI,
+    schema: dict[str, Any],
+    select: PathPattern = (None,),
+    strict: bool = True,
+    **kwargs: Any,
+) -> Iterator[tuple[Path, Any]]:
+    """
+    Streamed 'client.chat.completions.create(**kwargs)' constrained to 'schema',
+    yielding each selected value (see 'StructuredStream') as soon as it is complete.
+
+    Raises:
+        StructuredOutputError: The output is not valid JSON, violates the schema, or was cut off.
+
+    """
+    stream = StructuredStream(schema, select, strict)
+    # Closing the SDK stream releases the connection when the caller stops early or validation fails
+    with client.chat.completions.create(**kwargs, stream=True, response_format=_json_schema_format(schema)) as chunks:
+        deltas = (chunk.choices[0].delta.content or "" for chunk in chunks if chunk.choices)
+        yield from stream.iter(deltas)
+
+
+async def async_structured_chat_completion(
+    client: AsyncOpenAI,
+    schema: dict[str, Any],
+    select: PathPattern = (None,),
+    strict: bool = True,
+    **kwargs: Any,
+) -> AsyncIterator[tuple[Path, Any]]:
+    """Async counterpart of 'structured_chat_completion'."""
+    stream = StructuredStream(schema, select, strict)
+    chunks = await client.chat.completions.create(**kwargs, stream=True, response_format=_json_schema_format(schema))
+    async with chunks:
+        deltas = (chunk.choices[0].delta.content or "" async for chunk in chunks if chunk.choices)
+        async for item in stream.aiter(deltas):
+            yield item
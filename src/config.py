@@ -1,9 +1,11 @@
+import json
 import logging
 import os
 import sys
+import threading
 from dataclasses import dataclass
-
-from dotenv import load_dotenv
+from pathlib import Path
+from typing import Any, cast
 
 # Configure logging centrally
 logging.basicConfig(
@@ -13,7 +15,90 @@ logging.basicConfig(
 )
 logger = logging.getLogger("yandex_gpt")
 
-load_dotenv()
+
+@dataclass(frozen=True)
+class Credential:
+    """
+    One folder/API key pair in the credential pool.
+
+    'weight' sets the share of traffic relative to other entries
+    (e.g. proportional to the folder's quota).
+    """
+
+    folder_id: str
+    api_key: str
+    weight: float = 1.0
+
+
+def with_folder(uri: str, folder_id: str) -> str:
+    """Rewrite the folder part of a model URI ('gpt://<folder>/<model>/<version>')."""
+    scheme, rest = uri.split("://", 1)
+    _, tail = rest.split("/", 1)
+    return f"{scheme}://{folder_id}/{tail}"
+
+
+class ConfigError(ValueError):
+    """Malformed configuration value."""
+
+
+def _parse_credentials(raw: str) -> tuple[Credential, ...]:
+    """
+    Parse 'YC_CREDENTIALS': entries separated by ';', each 'folder_id:api_key[:weight]'.
+
+    Raises:
+        ConfigError: An entry does not have that form.
+
+    """
+    credentials = []
+    for number, entry in enumerate(filter(None, (item.strip() for item in raw.split(";"))), start=1):
+        parts = [part.strip() for part in entry.split(":")]
+        # Only a short prefix is shown: a malformed entry may be a bare API key
+        name = f"YC_CREDENTIALS entry {number} ('{parts[0][:4]}...')"
+        if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+            msg = f"{name}: expected 'folder_id:api_key[:weight]'"
+            raise ConfigError(msg)
+        try:
+            weight = float(parts[2]) if len(parts) > 2 else 1.0
+        except ValueError:
+            msg = f"{name}: weight must be a number"
+            raise ConfigError(msg) from None
+        credentials.append(Credential(folder_id=parts[0], api_key=parts[1], weight=weight))
+    return tuple(credentials)
+
+
+def _load_credentials_file(path: str) -> tuple[Credential, ...]:
+    """
+    Load a JSON list of {"folder_id", "api_key", "weight"} objects.
+
+    Raises:
+        ConfigError: The file cannot be read, is not valid JSON or has malformed entries.
+
+    """
+    name = f"YC_CREDENTIALS_FILE '{path}'"
+    try:
+        entries = json.loads(Path(path).read_text())
+    except OSError as e:
+        msg = f"{name}: cannot read the file ({e.strerror or e})"
+        raise ConfigError(msg) from None
+    except ValueError as e:
+        msg = f"{name}: invalid JSON ({e})"
+        raise ConfigError(msg) from None
+    if not isinstance(entries, list):
+        msg = f"{name}: expected a JSON list of credential objects"
+        raise ConfigError(msg)
+
+    credentials = []
+    for number, entry in enumerate(entries, start=1):
+        try:
+            credential = Credential(str(entry["folder_id"]), str(entry["api_key"]), float(entry.get("weight", 1.0)))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            msg = f"{name}, entry {number}: expected {{\"folder_id\", \"api_key\"[, \"weight\"]}} with a numeric weight"
+            raise ConfigError(msg) from None
+        if not credential.folder_id or not credential.api_key:
+            msg = f"{name}, entry {number}: 'folder_id' and 'api_key' must not be empty"
+            raise ConfigError(msg)
+        credentials.append(credential)
+    return tuple(credentials)
 
 
 @dataclass(frozen=True)
@@ -29,18 +114,56 @@ class AppConfig:
     max_tokens: int = 2000
 
     native_api_url: str = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+    native_async_api_url: str = "https://llm.api.cloud.yandex.net/foundationModels/v1/completionAsync"
+    operations_api_url: str = "https://operation.api.cloud.yandex.net/operations"
+    tokenize_api_url: str = "https://llm.api.cloud.yandex.net/foundationModels/v1/tokenize"
     openai_base_url: str = "https://ai.api.cloud.yandex.net/v1"
 
+    # Optional pool of extra folders/keys for load balancing (see 'credential_pool')
+    credentials: tuple[Credential, ...] = ()
+
     @classmethod
     def from_env(cls) -> "AppConfig":
         folder_id = os.getenv("YC_FOLDER_ID", "").strip()
         api_key = os.getenv("YC_API_KEY", "").strip()
 
+        credentials: tuple[Credential, ...] = ()
+        try:
+            if credentials_file := os.getenv("YC_CREDENTIALS_FILE", "").strip():
+                credentials = _load_credentials_file(credentials_file)
+            elif raw_credentials := os.getenv("YC_CREDENTIALS", "").strip():
+                credentials = _parse_credentials(raw_credentials)
+        except ConfigError as e:
+            logger.critical("%s", e)
+            sys.exit(1)
+
+        # The first pool entry doubles as the primary credential if none is set
+        if credentials and not (folder_id and api_key):
+            folder_id, api_key = credentials[0].folder_id, credentials[0].api_key
+
         if not folder_id or not api_key:
             logger.critical("Missing YC_FOLDER_ID or YC_API_KEY.")
             sys.exit(1)
 
-        return cls(folder_id=folder_id, api_key=api_key)
+        # Optional endpoint overrides (e.g. to point at a local stand-in server)
+        overrides = {
+            field: value
+            for field, env_name in (
+                ("native_api_url", "YC_NATIVE_API_URL"),
+                ("native_async_api_url", "YC_NATIVE_ASYNC_API_URL"),
+                ("operations_api_url", "YC_OPERATIONS_API_URL"),
+                ("tokenize_api_url", "YC_TOKENIZE_API_URL"),
+                ("openai_base_url", "YC_OPENAI_BASE_URL"),
+            )
+            if (value := os.getenv(env_name, "").strip())
+        }
+
+        return cls(folder_id=folder_id, api_key=api_key, credentials=credentials, **overrides)
+
+    @property
+    def credential_pool(self) -> tuple[Credential, ...]:
+        """All credentials to balance across (just the primary one if no pool is configured)."""
+        return self.credentials or (Credential(folder_id=self.folder_id, api_key=self.api_key),)
 
     @property
     def model_uri(self) -> str:
@@ -58,4 +181,45 @@ class AppConfig:
         return f"emb://{self.folder_id}/text-search-query/latest"
 
 
-config = AppConfig.from_env()
+_config: AppConfig | None = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> AppConfig:
+    """
+    Returns the application configuration, loading '.env' and the environment on first use.
+    """
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                _config = AppConfig.from_env()
+    return _config
+
+
+def reset_config() -> None:
+    """Forgets the resolved configuration so that the next access re-reads the environment."""
+    global _config
+    with _config_lock:
+        _config = None
+
+
+class _LazyConfig:
+    """
+    Stand-in for the 'AppConfig' singleton that resolves it on first attribute access.
+
+    Importing this module is therefore cheap and never exits the process;
+    missing credentials are reported when the configuration is first used.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_config(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_config()) if _config is not None else "<AppConfig (not loaded yet)>"
+
+
+config = cast(AppConfig, _LazyConfig())
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from src.config import logger
+
+
+@dataclass(frozen=True)
+class LimitChange:
+    """One adjustment of the concurrency limit."""
+
+    timestamp: float
+    old_limit: float
+    new_limit: float
+    reason: str
+
+
+class Permit:
+    """
+    Handle for one in-flight request. Call 'report_error' when the request
+    failed, or 'discard' when its outcome says nothing about upstream load;
+    anything else counts as success with the measured latency.
+    """
+
+    def __init__(self, saturated: bool = False) -> None:
+        self.started = time.monotonic()
+        # Whether all slots were taken when this request started
+        self.saturated = saturated
+        self.error_status: int | None = None
+        self.failed = False
+        self.discarded = False
+
+    def report_error(self, status_code: int | None = None) -> None:
+        """
+        Mark the request as failed.
+
+        Args:
+            status_code: HTTP status, or None for timeouts / connection errors.
+
+        """
+        self.failed = True
+        self.error_status = status_code
+
+    def discard(self) -> None:
+        """Leave the request out of the limiter's adaptation (no latency sample, no backoff)."""
+        self.discarded = True
+
+
+class AdaptiveLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) concurrency limiter.
+
+    Drop-in replacement for a fixed 'asyncio.Semaphore': the limit grows by
+    roughly one slot per limit's worth of successful requests while latency
+    stays near its baseline, and is cut by 'backoff' on 429s, 5xx responses,
+    timeouts or latency spikes (at most once per 'cooldown' seconds, so a
+    burst of failures from the same window counts once).
+
+    The current value is exposed as 'limit'; every change is logged and kept
+    in 'history' with its reason.
+    """
+
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 1.0,
+        on_change: Callable[[LimitChange], None] | None = None,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.on_change = on_change
+
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._baseline: float | None = None
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+        self.history: deque[LimitChange] = deque(maxlen=256)
+
+    @property
+    def limit(self) -> int:
+        """Current number of allowed concurrent requests."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def baseline_latency(self) -> float | None:
+        """Smoothed 'normal' latency the limiter compares new samples against."""
+        return self._baseline
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Permit]:
+        """Wait for a free slot, then hold it for the duration of the block."""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            permit = Permit(saturated=self._in_flight >= self.limit)
+
+        try:
+            yield permit
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. a hedged duplicate lost the race); neither a timeout nor a latency sample
+            permit.discard()
+            raise
+        except BaseException:
+            if not permit.failed and not permit.discarded:
+                permit.report_error(None)
+            raise
+        finally:
+            async with self._cond:
+                self._in_flight -= 1
+                # An error reported before the request was discarded still counts
+                if permit.failed or not permit.discarded:
+                    self._on_complete(permit, time.monotonic() - permit.started)
+                self._cond.notify_all()
+
+    def _on_complete(self, permit: Permit, latency: float) -> None:
+        if permit.failed:
+            status = permit.error_status
+            if status is None:
+                self._decrease("timeout or connection error")
+            elif status == 429 or status >= 500:
+                self._decrease(f"HTTP {status}")
+            # Other 4xx are client mistakes, not a sign of overload
+            return
+
+        if self._baseline is not None and latency > self._baseline * self.latency_tolerance:
+            self._decrease(f"latency spike {latency:.2f}s (baseline {self._baseline:.2f}s)")
+        elif permit.saturated:
+            # Grow only when the current limit is actually the bottleneck
+            self._set_limit(self._limit + 1.0 / max(self._limit, 1.0), "success at full concurrency", quiet=True)
+
+        # Slow exponential average; spikes move it only a little
+        self._baseline = latency if self._baseline is None else 0.9 * self._baseline + 0.1 * latency
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._set_limit(self._limit * self.backoff, reason)
+
+    def _set_limit(self, value: float, reason: str, quiet: bool = False) -> None:
+        value = min(max(value, float(self.min_limit)), float(self.max_limit))
+        old = self._limit
+        self._limit = value
+        if int(old) == int(value):
+            return
+
+        change = LimitChange(time.time(), old, value, reason)
+        self.history.append(change)
+        log = logger.debug if quiet else logger.info
+        log("Concurrency limit %d -> %d (%s).", int(old), int(value), reason)
+        if self.on_change:
+            self.on_change(change)
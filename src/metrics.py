@@ -0,0 +1,254 @@
+import bisect
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from src.config import logger
+from src.retry import RetryPolicy, classify_error
+
+# Latency buckets in seconds (upper bounds)
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+# Calls answered without an upstream request of their own; their duration says nothing about the API
+UNSENT_STATUSES = ("cached", "coalesced")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: tuple[str, str] | None = None) -> str:
+    items = [*labels, extra] if extra else list(labels)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: dict[str, str], value: float = 1.0) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines += [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (Prometheus semantics)."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # Per label set: per-bucket counts (+1 for +Inf), sum, count
+        self._values: dict[Labels, tuple[list[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: dict[str, str], value: float) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip([*self.buckets, float("inf")], counts, strict=True):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+@dataclass
+class RequestTiming:
+    """
+    Timing and usage of one logical API call (all retry attempts included).
+
+    Durations are in seconds; None means the phase was not observable
+    (e.g. a pooled connection was reused, so there was no connect phase).
+    """
+
+    api: str
+    model_uri: str
+    status: str = "error"
+    total: float = 0.0
+    queue_wait: float | None = None
+    connect: float | None = None
+    ttfb: float | None = None
+    attempts: int = 0
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def begin_attempt(self) -> None:
+        """Marks the start of a send attempt; the first one ends the queue wait."""
+        self.attempts += 1
+        if self.queue_wait is None:
+            self.queue_wait = time.perf_counter() - self.started
+
+    def fail(self, error: BaseException) -> None:
+        """Sets the status from an exception (HTTP status, or the error class for transport errors)."""
+        decision = classify_error(error, RetryPolicy())
+        self.status = str(decision.status_code) if decision.status_code else type(error).__name__
+
+    def finish(self) -> None:
+        """Stops the clock and records the timing in the default registry."""
+        self.total = time.perf_counter() - self.started
+        metrics.record(self)
+
+
+class MetricsRegistry:
+    """
+    Request metrics, exported in Prometheus text format.
+
+    Extra hooks (e.g. an OpenTelemetry bridge or custom logging) can be
+    registered with 'add_hook' and receive every 'RequestTiming'.
+    """
+
+    def __init__(self) -> None:
+        self.latency = Histogram(
+            "yandex_gpt_request_duration_seconds",
+            "Total request latency incl. retries (cache hits and coalesced calls excluded).",
+        )
+        self.queue_wait = Histogram("yandex_gpt_queue_wait_seconds", "Time spent waiting before sending.")
+        self.connect = Histogram("yandex_gpt_connect_seconds", "TCP/TLS connection setup time.")
+        self.ttfb = Histogram("yandex_gpt_time_to_first_byte_seconds", "Time to first response byte / token.")
+        self.requests = Counter("yandex_gpt_requests_total", "Requests by final status.")
+        self.retries = Counter("yandex_gpt_retries_total", "Retry attempts beyond the first.")
+        self.tokens = Counter("yandex_gpt_tokens_total", "Prompt and completion tokens from 'usage'.")
+        self.circuit_trips = Counter("yandex_gpt_circuit_trips_total", "Times an endpoint's circuit breaker opened.")
+        self.deadline_drops = Counter("yandex_gpt_deadline_drops_total", "Requests dropped unsent past their deadline.")
+        self._hooks: list[Callable[[RequestTiming], None]] = []
+
+    def add_hook(self, hook: Callable[[RequestTiming], None]) -> None:
+        self._hooks.append(hook)
+
+    def record(self, timing: RequestTiming) -> None:
+        labels = {"api": timing.api, "model": timing.model_uri}
+        if timing.status not in UNSENT_STATUSES:
+            self.latency.observe(labels, timing.total)
+        self.requests.inc({**labels, "status": timing.status})
+        if timing.queue_wait is not None:
+            self.queue_wait.observe(labels, timing.queue_wait)
+        if timing.connect is not None:
+            self.connect.observe(labels, timing.connect)
+        if timing.ttfb is not None:
+            self.ttfb.observe(labels, timing.ttfb)
+        if timing.attempts > 1:
+            self.retries.inc(labels, timing.attempts - 1)
+        if timing.prompt_tokens:
+            self.tokens.inc({**labels, "kind": "prompt"}, timing.prompt_tokens)
+        if timing.completion_tokens:
+            self.tokens.inc({**labels, "kind": "completion"}, timing.completion_tokens)
+
+        for hook in self._hooks:
+            try:
+                hook(timing)
+            except Exception:
+                logger.exception("Metrics hook failed")
+
+    def render_prometheus(self) -> str:
+        families: list[Histogram | Counter] = [
+            self.latency,
+            self.queue_wait,
+            self.connect,
+            self.ttfb,
+            self.requests,
+            self.retries,
+            self.tokens,
+            self.circuit_trips,
+            self.deadline_drops,
+        ]
+        return "\n".join(line for family in families for line in family.render()) + "\n"
+
+
+# Process-wide default registry used by the clients
+metrics = MetricsRegistry()
+
+
+class TraceRecorder:
+    """
+    Collects connection-level timings from httpx/httpcore 'trace' events.
+
+    Pass 'recorder.sync_trace' or 'recorder.async_trace' as the request's
+    'trace' extension; 'connect' and 'ttfb' are filled in as events arrive.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.connect: float | None = None
+        self.ttfb: float | None = None
+        self._connect_started: float | None = None
+
+    def _on_event(self, name: str) -> None:
+        now = time.perf_counter()
+        if name == "connection.connect_tcp.started":
+            self._connect_started = now
+        elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.connect = now - self._connect_started
+        elif name.endswith("receive_response_headers.complete"):
+            self.ttfb = now - self.started
+
+    def sync_trace(self, name: str, info: dict[str, Any]) -> None:
+        self._on_event(name)
+
+    async def async_trace(self, name: str, info: dict[str, Any]) -> None:
+        self._on_event(name)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = metrics
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:  # noqa: N802
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(
+    port: int = 9464,
+    registry: MetricsRegistry = metrics,
+    host: str = "127.0.0.1",
+) -> ThreadingHTTPServer:
+    """
+    Serve '/metrics' in Prometheus text format from a background thread.
+
+    Only local clients can connect by default; pass host="0.0.0.0" to let a
+    remote Prometheus scrape the process directly.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving Prometheus metrics on %s:%d.", host, server.server_address[1])
+    return server
@@ -0,0 +1,144 @@
+import asyncio
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from src.config import logger
+from src.tokens import token_counter
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+# Bucket state: request tokens, LLM tokens, last refill timestamp
+_STATE = struct.Struct("ddd")
+_State = tuple[float, float, float]
+
+
+def estimate_tokens(messages: list[dict[str, Any]], max_tokens: int = 0) -> int:
+    """
+    Cheap estimate of a request's token usage (prompt + completion).
+    """
+    return token_counter.count_messages(messages) + max_tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for both requests per second and tokens per minute.
+
+    Every call reserves one request and an estimated number of tokens up
+    front; 'record_usage' later corrects the token bucket with the actual
+    count from the response ('usage.total_tokens'), so overestimates are
+    refunded and underestimates become debt.
+
+    With 'shared=True' the bucket lives in a small file guarded by 'flock',
+    so all worker processes on the host that use the same 'key' (e.g. the
+    folder ID) draw from one quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        tokens_per_minute: float,
+        shared: bool = False,
+        key: str = "default",
+        state_dir: str | Path | None = None,
+    ) -> None:
+        self.requests_per_second = requests_per_second
+        self.tokens_per_second = tokens_per_minute / 60.0
+        # Burst allowance: one second of requests, one minute of tokens
+        self.request_capacity = max(requests_per_second, 1.0)
+        self.token_capacity = tokens_per_minute
+
+        self._lock = threading.Lock()
+        self._state = (self.request_capacity, self.token_capacity, time.time())
+        self._path: Path | None = None
+
+        if shared:
+            if fcntl is None:
+                logger.warning("File locking is unavailable; rate limiter state is per-process.")
+            else:
+                directory = Path(state_dir) if state_dir else Path(tempfile.gettempdir())
+                self._path = directory / f"yandex-gpt-ratelimit-{key}.bucket"
+                self._path.touch(exist_ok=True)
+
+    # --- State handling ---
+
+    def _refill(self, state: _State, now: float) -> _State:
+        requests, tokens, last = state
+        elapsed = max(0.0, now - last)
+        return (
+            min(self.request_capacity, requests + elapsed * self.requests_per_second),
+            min(self.token_capacity, tokens + elapsed * self.tokens_per_second),
+            now,
+        )
+
+    def _update(self, fn: Callable[[_State], tuple[_State, float]]) -> float:
+        """Atomically apply 'fn' to the refilled bucket state. Returns fn's result."""
+        now = time.time()
+        with self._lock:
+            if self._path is None:
+                self._state, result = fn(self._refill(self._state, now))
+                return result
+
+            with open(self._path, "r+b") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    raw = f.read(_STATE.size)
+                    state = _STATE.unpack(raw) if len(raw) == _STATE.size else self._state
+                    new_state, result = fn(self._refill(state, now))
+                    f.seek(0)
+                    f.write(_STATE.pack(*new_state))
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return result
+
+    # --- Public API ---
+
+    def try_acquire(self, tokens: int) -> float:
+        """
+        Reserve one request and 'tokens' tokens if both buckets allow it.
+
+        Returns:
+            0.0 if granted, otherwise the number of seconds to wait before retrying.
+
+        """
+        # A single request larger than the whole bucket could never pass
+        tokens = min(tokens, int(self.token_capacity))
+
+        def take(state: _State) -> tuple[_State, float]:
+            requests, available, now = state
+            if requests >= 1.0 and available >= tokens:
+                return (requests - 1.0, available - tokens, now), 0.0
+            wait_requests = (1.0 - requests) / self.requests_per_second if requests < 1.0 else 0.0
+            wait_tokens = (tokens - available) / self.tokens_per_second if available < tokens else 0.0
+            return state, max(wait_requests, wait_tokens)
+
+        return self._update(take)
+
+    def acquire(self, tokens: int) -> None:
+        """Block until the request may be sent."""
+        while (wait := self.try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int) -> None:
+        """Wait (without blocking the event loop) until the request may be sent."""
+        while (wait := self.try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real usage of a request is known."""
+        delta = estimated - actual
+        if delta == 0:
+            return
+
+        def adjust(state: _State) -> tuple[_State, float]:
+            requests, tokens, now = state
+            return (requests, min(self.token_capacity, tokens + delta), now), 0.0
+
+        self._update(adjust)
@@ -0,0 +1,226 @@
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, TypeVar
+
+import httpx
+import requests
+
+from src.config import logger
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RetryDecision:
+    """Classification of a failed call."""
+
+    retryable: bool
+    status_code: int | None = None
+    retry_after: float | None = None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Which failures to retry and how long to wait between attempts.
+
+    Delays use "full jitter" exponential backoff: a random value between 0 and
+    min(max_delay, base_delay * 2**attempt). A server-provided Retry-After
+    overrides it (capped at max_delay).
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    retry_statuses: frozenset[int] = field(default_factory=lambda: frozenset({429, 500, 502, 503, 504}))
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+def _parse_retry_after(headers: Any) -> float | None:
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc: BaseException, policy: RetryPolicy) -> RetryDecision:
+    """
+    Decide whether an exception from requests, httpx or the OpenAI SDK is transient.
+
+    Timeouts, connection errors and undecodable bodies (e.g. a proxy's error
+    page) are retried, as are the HTTP statuses in 'policy.retry_statuses'.
+    Everything else (e.g. 400/401/404) is final.
+    """
+    # The OpenAI SDK is slow to import and only relevant if it is already loaded
+    openai = sys.modules.get("openai")
+
+    response = None
+    if openai is not None and isinstance(exc, openai.APIStatusError):
+        response = exc.response
+    elif openai is not None and isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError)):
+        return RetryDecision(retryable=True)
+    elif isinstance(exc, httpx.HTTPStatusError):
+        response = exc.response
+    elif isinstance(exc, httpx.TransportError):
+        return RetryDecision(retryable=True)
+    elif isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        response = exc.response
+    elif isinstance(
+        exc,
+        (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.InvalidJSONError),
+    ):
+        return RetryDecision(retryable=True)
+
+    if response is None:
+        return RetryDecision(retryable=False)
+
+    status = response.status_code
+    return RetryDecision(
+        retryable=status in policy.retry_statuses,
+        status_code=status,
+        retry_after=_parse_retry_after(response.headers),
+    )
+
+
+def call_with_retry(fn: Callable[[], T], policy: RetryPolicy | None = None) -> T:
+    """
+    Call 'fn', retrying transient failures. The last error is re-raised.
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        try:
+            return fn()
+        except Exception as e:
+            decision = classify_error(e, policy)
+            if not decision.retryable or attempt == policy.max_attempts - 1:
+                raise
+            delay = policy.delay(attempt, decision.retry_after)
+            logger.warning(
+                "Transient error (%s), retrying in %.2fs: %s",
+                decision.status_code or "network",
+                delay,
+                e,
+            )
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+
+    def __init__(self, window: int = 500) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, pct: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def hedged(fn: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    Run 'fn'; if it has not finished after 'delay' seconds, start a duplicate.
+
+    The first attempt to succeed wins and the other one is cancelled. If one
+    attempt fails, the other is still awaited; only if both fail is an error raised.
+    'fn' is called once per attempt, so it should take its own quota.
+    """
+    primary = asyncio.ensure_future(fn())
+    pending = {primary}
+    error: BaseException | None = None
+    try:
+        # Inside 'try': a caller cancelled during the delay must not leak the primary
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return primary.result()
+
+        logger.debug("No response after %.2fs, sending hedged request.", delay)
+        pending.add(asyncio.ensure_future(fn()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    assert error is not None
+    raise error
+
+
+class ResilientCaller:
+    """
+    Async retry + optional hedging around a request coroutine factory.
+
+    With 'hedge_percentile' set (e.g. 95), a duplicate request is sent once
+    the first one has been outstanding longer than that percentile of recent
+    latencies. Hedging starts after 'min_samples' successful calls.
+    """
+
+    def __init__(
+        self,
+        policy: RetryPolicy | None = None,
+        hedge_percentile: float | None = None,
+        min_samples: int = 20,
+    ) -> None:
+        self.policy = policy or RetryPolicy()
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker()
+
+    def _hedge_delay(self) -> float | None:
+        if self.hedge_percentile is None or len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await 'fn()' with retries (and hedging); the last error is re-raised."""
+        for attempt in range(self.policy.max_attempts):
+            started = time.monotonic()
+            try:
+                delay = self._hedge_delay()
+                result = await (hedged(fn, delay) if delay is not None else fn())
+            except Exception as e:
+                decision = classify_error(e, self.policy)
+                if not decision.retryable or attempt == self.policy.max_attempts - 1:
+                    raise
+                wait = self.policy.delay(attempt, decision.retry_after)
+                logger.warning(
+                    "Transient error (%s), retrying in %.2fs: %s",
+                    decision.status_code or "network",
+                    wait,
+                    e,
+                )
+                await asyncio.sleep(wait)
+            else:
+                self.latencies.record(time.monotonic() - started)
+                return result
+        raise AssertionError("unreachable")
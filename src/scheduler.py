@@ -0,0 +1,323 @@
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Literal
+
+from src.config import logger
+from src.limiter import AdaptiveLimiter, Permit
+from src.metrics import metrics
+from src.ratelimit import RateLimiter
+
+Priority = Literal["interactive", "standard", "bulk"]
+PRIORITIES: tuple[Priority, ...] = ("interactive", "standard", "bulk")
+
+# Share of dispatches each lane gets while all of them have requests waiting
+DEFAULT_WEIGHTS: dict[Priority, float] = {"interactive": 16.0, "standard": 4.0, "bulk": 1.0}
+
+
+class DeadlineExceededError(TimeoutError):
+    """A request's deadline passed before it could be sent."""
+
+
+class Ticket:
+    """
+    One request going through a 'RequestScheduler'.
+
+    Once admitted it holds a concurrency slot. Like a limiter 'Permit', call
+    'report_error' when the request failed so the limiter can back off.
+    """
+
+    def __init__(
+        self,
+        priority: Priority,
+        tokens: int,
+        deadline: float | None,
+        start_tag: float,
+        finish_tag: float,
+        future: asyncio.Future[None],
+    ) -> None:
+        self.priority = priority
+        self.tokens = tokens
+        # Absolute 'time.monotonic()' value, or None
+        self.deadline = deadline
+        # Virtual times used for weighted fair queueing
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.queue_wait: float | None = None
+        self.permit: Permit | None = None
+        self.expiry: asyncio.TimerHandle | None = None
+
+    def time_left(self) -> float | None:
+        """
+        Seconds until the deadline (usable as a request timeout), or None without a deadline.
+
+        Raises:
+            DeadlineExceededError: The deadline has already passed.
+
+        """
+        if self.deadline is None:
+            return None
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            msg = f"{self.priority} request is {-left:.3f}s past its deadline"
+            raise DeadlineExceededError(msg)
+        return left
+
+    def report_error(self, status_code: int | None = None) -> None:
+        """
+        Mark the request as failed.
+
+        Args:
+            status_code: HTTP status, or None for timeouts / connection errors.
+
+        """
+        if self.permit is not None:
+            self.permit.report_error(status_code)
+
+
+class RequestScheduler:
+    """
+    Shared admission queue in front of the clients: priority lanes,
+    per-request deadlines and weighted fair queueing over one concurrency
+    limit and one quota.
+
+    Waiting requests sit in a FIFO lane per priority. Whenever a slot frees
+    up, the next request is picked by weighted fair queueing: each request
+    gets a virtual finish tag 'start + cost / weight' and the smallest tag
+    goes first. Under contention the lanes are served in proportion to
+    their weights (16:4:1 by default); a lane with nothing waiting leaves
+    its share to the others, so bulk work soaks up whatever is spare.
+
+    Non-interactive requests never take the last 'headroom' slots, so an
+    interactive request arriving behind a bulk backlog does not have to
+    wait for an in-flight request to finish. Requests whose deadline passes
+    while they wait are dropped with 'DeadlineExceededError' without being
+    sent and without spending quota. With a 'rate_limiter' the request and
+    token quota is taken in scheduling order too, so a bulk backlog cannot
+    drain the bucket ahead of interactive traffic.
+
+    The scheduler belongs to one event loop; share a single instance
+    between the user-facing code and batch jobs.
+    """
+
+    def __init__(
+        self,
+        concurrency: AdaptiveLimiter | int = 5,
+        rate_limiter: RateLimiter | None = None,
+        weights: dict[Priority, float] | None = None,
+        headroom: int = 1,
+    ) -> None:
+        """
+        Args:
+            concurrency: Fixed number of concurrent requests, or an adaptive
+                limiter whose current limit is used (and fed with the outcomes).
+            rate_limiter: Optional request/token quota limiter.
+            weights: Relative share of each priority lane under contention.
+            headroom: Slots reserved for interactive requests.
+
+        """
+        if isinstance(concurrency, AdaptiveLimiter):
+            self.limiter: AdaptiveLimiter | None = concurrency
+            self.max_concurrency = concurrency.max_limit
+        else:
+            self.limiter = None
+            self.max_concurrency = concurrency
+        self.rate_limiter = rate_limiter
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.headroom = headroom
+
+        self._lanes: dict[Priority, deque[Ticket]] = {p: deque() for p in PRIORITIES}
+        self._last_finish = dict.fromkeys(PRIORITIES, 0.0)
+        self._virtual_time = 0.0
+        self._in_flight = dict.fromkeys(PRIORITIES, 0)
+        self._dispatched = dict.fromkeys(PRIORITIES, 0)
+        self._dropped = dict.fromkeys(PRIORITIES, 0)
+        self._waited = dict.fromkeys(PRIORITIES, 0.0)
+        self._quota_retry: asyncio.TimerHandle | None = None
+
+    @property
+    def capacity(self) -> int:
+        """Current number of allowed concurrent requests."""
+        return self.limiter.limit if self.limiter is not None else self.max_concurrency
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: Priority = "standard",
+        deadline: float | None = None,
+        timeout: float | None = None,
+        tokens: int = 0,
+        cost: float = 1.0,
+    ) -> AsyncIterator[Ticket]:
+        """
+        Wait for this request's turn, then hold a slot for the duration of the block.
+
+        Args:
+            priority: Lane to queue in.
+            deadline: Absolute 'time.monotonic()' after which the request is useless.
+            timeout: Same as 'deadline', relative to now (the earlier of both wins).
+            tokens: Estimated token usage to take from the rate limiter's quota.
+            cost: Relative size of the request for fair queueing.
+
+        Raises:
+            DeadlineExceededError: The deadline passed before the request got a slot.
+
+        """
+        ticket = await self._admit(priority, deadline, timeout, tokens, cost)
+        try:
+            if self.limiter is None:
+                ticket.permit = Permit()
+                yield ticket
+            else:
+                async with self.limiter.acquire() as permit:
+                    # Let the limiter grow whenever requests are waiting for it,
+                    # even if the reserved headroom is what stayed free
+                    permit.saturated = permit.saturated or self.queued > 0
+                    ticket.permit = permit
+                    try:
+                        yield ticket
+                    except DeadlineExceededError:
+                        # Running out of time between retries says nothing about upstream load
+                        permit.discard()
+                        raise
+        finally:
+            self._release(ticket)
+
+    async def _admit(
+        self,
+        priority: Priority,
+        deadline: float | None,
+        timeout: float | None,
+        tokens: int,
+        cost: float,
+    ) -> Ticket:
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if timeout is not None:
+            deadline = min(deadline if deadline is not None else math.inf, now + timeout)
+        if deadline is not None and deadline <= now:
+            self._count_drop(priority)
+            msg = f"{priority} request arrived {now - deadline:.3f}s past its deadline"
+            raise DeadlineExceededError(msg)
+
+        # A lane that was idle starts at the current virtual time instead of using up saved credit
+        start = max(self._virtual_time, self._last_finish[priority])
+        ticket = Ticket(priority, tokens, deadline, start, start + cost / self.weights[priority], loop.create_future())
+        self._last_finish[priority] = ticket.finish_tag
+        self._lanes[priority].append(ticket)
+        if deadline is not None:
+            ticket.expiry = loop.call_later(deadline - now, self._expire, ticket)
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.queue_wait is not None:
+                # Granted just before the caller gave up
+                self._release(ticket)
+            else:
+                self._remove(ticket)
+            raise
+        return ticket
+
+    def _eligible(self, priority: Priority, in_flight: int) -> bool:
+        if in_flight >= self.capacity:
+            return False
+        if priority == "interactive":
+            return True
+        return in_flight < max(1, self.capacity - self.headroom)
+
+    def _next(self) -> Ticket | None:
+        in_flight = self.in_flight
+        heads = [lane[0] for p, lane in self._lanes.items() if lane and self._eligible(p, in_flight)]
+        # Ties go to the higher priority ('min' keeps the first of equal keys)
+        return min(heads, key=lambda t: t.finish_tag, default=None)
+
+    def _dispatch(self) -> None:
+        if self._quota_retry is not None:
+            return
+        while (ticket := self._next()) is not None:
+            if ticket.deadline is not None and ticket.deadline <= time.monotonic():
+                self._drop(ticket)
+                continue
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.try_acquire(ticket.tokens)
+                if wait > 0:
+                    # The head keeps its place; whoever is first when the quota refills goes next
+                    self._quota_retry = asyncio.get_running_loop().call_later(wait, self._retry_quota)
+                    return
+            self._grant(ticket)
+
+    def _retry_quota(self) -> None:
+        self._quota_retry = None
+        self._dispatch()
+
+    def _grant(self, ticket: Ticket) -> None:
+        self._remove(ticket)
+        self._virtual_time = max(self._virtual_time, ticket.start_tag)
+        ticket.queue_wait = time.monotonic() - ticket.enqueued
+        self._in_flight[ticket.priority] += 1
+        self._dispatched[ticket.priority] += 1
+        self._waited[ticket.priority] += ticket.queue_wait
+        ticket.future.set_result(None)
+
+    def _release(self, ticket: Ticket) -> None:
+        self._in_flight[ticket.priority] -= 1
+        self._dispatch()
+
+    def _remove(self, ticket: Ticket) -> None:
+        if ticket.expiry is not None:
+            ticket.expiry.cancel()
+        lane = self._lanes[ticket.priority]
+        if lane and lane[0] is ticket:
+            lane.popleft()
+        elif ticket in lane:
+            lane.remove(ticket)
+
+    def _expire(self, ticket: Ticket) -> None:
+        ticket.expiry = None
+        if ticket.queue_wait is None and not ticket.future.done():
+            self._drop(ticket)
+            # The dropped request may have been the head waiting for quota
+            self._dispatch()
+
+    def _drop(self, ticket: Ticket) -> None:
+        self._remove(ticket)
+        self._count_drop(ticket.priority)
+        waited = time.monotonic() - ticket.enqueued
+        logger.debug("Dropped %s request after %.3fs in queue: deadline passed.", ticket.priority, waited)
+        if not ticket.future.done():
+            msg = f"{ticket.priority} request waited {waited:.3f}s and missed its deadline"
+            ticket.future.set_exception(DeadlineExceededError(msg))
+
+    def _count_drop(self, priority: Priority) -> None:
+        self._dropped[priority] += 1
+        metrics.deadline_drops.inc({"priority": priority})
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Current state of every priority lane (for logs and dashboards)."""
+        return [
+            {
+                "priority": p,
+                "weight": self.weights[p],
+                "queued": len(self._lanes[p]),
+                "in_flight": self._in_flight[p],
+                "dispatched": self._dispatched[p],
+                "dropped": self._dropped[p],
+                "avg_wait": round(self._waited[p] / self._dispatched[p], 4) if self._dispatched[p] else None,
+            }
+            for p in PRIORITIES
+        ]
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from src.config import logger
+
+KEY_SIZE = 16  # bytes of BLAKE2b digest per key
+# Slots allocated at first use; the files then grow geometrically up to the capacity
+_MIN_SLOTS = 1024
+
+
+def make_key(model_uri: str, text: str) -> bytes:
+    """Content address of an embedding: hash of (model URI, normalized text)."""
+    # Whitespace-only differences do not change the cache key
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    digest = hashlib.blake2b(digest_size=KEY_SIZE)
+    digest.update(model_uri.encode())
+    digest.update(b"\0")
+    digest.update(normalized.encode())
+    return digest.digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache.
+
+    Layout of the cache directory:
+        meta.json    - vector dimension and capacity
+        keys.npy     - (slots, 16) uint8 key per slot
+        atime.npy    - (slots,) int64 last-access tick per slot, 0 = free slot
+        vectors.f32  - (slots, dim) float32 memory-mapped vectors
+
+    Slots are allocated as entries arrive (doubling, up to 'max_entries'), so
+    the files stay proportional to what is cached. Only the compact key index
+    is read at startup; vectors are paged in by the OS when accessed. When
+    full, the least recently used entries are evicted.
+    Intended for a single writer process; call 'flush()' (or use 'with') to persist.
+    """
+
+    def __init__(self, path: str | Path, max_entries: int = 100_000) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.capacity = max_entries
+        self.dim: int | None = None
+
+        self._keys = np.zeros((0, KEY_SIZE), dtype=np.uint8)
+        self._atime = np.zeros(0, dtype=np.int64)
+        self._vectors: np.memmap | None = None
+        self._slots: dict[bytes, int] = {}
+        self._clock = 0
+
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        meta_file = self.path / "meta.json"
+        if not meta_file.exists():
+            return
+
+        meta = json.loads(meta_file.read_text())
+        if meta["capacity"] != self.capacity:
+            logger.warning(
+                "Embedding cache at %s has capacity %d (requested %d); keeping stored value.",
+                self.path,
+                meta["capacity"],
+                self.capacity,
+            )
+            self.capacity = meta["capacity"]
+
+        self._keys = np.load(self.path / "keys.npy")
+        self._atime = np.load(self.path / "atime.npy")
+        self._open_vectors(meta["dim"])
+
+        occupied = np.flatnonzero(self._atime)
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in occupied}
+        self._clock = int(self._atime.max(initial=0))
+        logger.info("Loaded embedding cache index: %d entries.", len(self._slots))
+
+    def _open_vectors(self, dim: int) -> None:
+        self.dim = dim
+        slots = len(self._atime)
+        # A zero-length file cannot be memory-mapped
+        self._vectors = None
+        if slots:
+            self._vectors = np.memmap(self.path / "vectors.f32", dtype=np.float32, mode="r+", shape=(slots, dim))
+
+    def _reserve(self, needed: int) -> None:
+        """Grows the slot arrays and the vectors file to at least 'needed' slots."""
+        assert self.dim is not None
+        slots = len(self._atime)
+        if needed <= slots:
+            return
+        new_slots = min(self.capacity, max(needed, 2 * slots, _MIN_SLOTS))
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with (self.path / "vectors.f32").open("ab") as f:
+            f.truncate(new_slots * self.dim * np.dtype(np.float32).itemsize)
+        self._keys = np.concatenate([self._keys, np.zeros((new_slots - slots, KEY_SIZE), dtype=np.uint8)])
+        self._atime = np.concatenate([self._atime, np.zeros(new_slots - slots, dtype=np.int64)])
+        self._open_vectors(self.dim)
+
+    def _save_array(self, name: str, array: np.ndarray) -> None:
+        # Write-then-rename so a crash never leaves a truncated index
+        tmp_file = self.path / f"{name}.tmp.npy"
+        np.save(tmp_file, array)
+        os.replace(tmp_file, self.path / f"{name}.npy")
+
+    def flush(self) -> None:
+        """Persist vectors and the key index (including access times) to disk."""
+        if self.dim is None:
+            return
+        if self._vectors is not None:
+            self._vectors.flush()
+        self._save_array("keys", self._keys)
+        self._save_array("atime", self._atime)
+        (self.path / "meta.json").write_text(json.dumps({"dim": self.dim, "capacity": self.capacity}))
+
+    def __enter__(self) -> "EmbeddingCache":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    # --- Lookup & insert ---
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, keys: list[bytes]) -> tuple[list[int], np.ndarray]:
+        """
+        Look up keys.
+
+        Returns:
+            Tuple of (positions in 'keys' that were found, their vectors as a
+            (n_hits, dim) float32 array copied out of the memory map).
+
+        """
+        positions: list[int] = []
+        slots: list[int] = []
+        for pos, key in enumerate(keys):
+            slot = self._slots.get(key)
+            if slot is not None:
+                positions.append(pos)
+                slots.append(slot)
+
+        if not slots or self._vectors is None:
+            return [], np.empty((0, self.dim or 0), dtype=np.float32)
+
+        self._atime[slots] = self._tick()
+        return positions, np.asarray(self._vectors[slots])
+
+    def put_many(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        """Insert vectors, evicting least recently used entries if the cache is full."""
+        if len(keys) == 0:
+            return
+        if self.dim is None:
+            self._open_vectors(int(vectors.shape[1]))
+        if vectors.shape[1] != self.dim:
+            msg = f"Vector dimension {vectors.shape[1]} does not match cache dimension {self.dim}"
+            raise ValueError(msg)
+
+        # Deduplicate; the last vector for a repeated key wins
+        latest = {key: i for i, key in enumerate(keys)}
+        if len(latest) > self.capacity:
+            latest = dict(list(latest.items())[-self.capacity :])
+
+        # Touch entries being overwritten first so eviction never picks them
+        existing = [self._slots[key] for key in latest if key in self._slots]
+        self._atime[existing] = self._tick()
+
+        new_keys = [key for key in latest if key not in self._slots]
+        self._evict(len(new_keys) - (self.capacity - len(self._slots)))
+        self._reserve(len(self._slots) + len(new_keys))
+
+        free = np.flatnonzero(self._atime == 0)
+        for key, slot in zip(new_keys, free, strict=False):
+            self._slots[key] = int(slot)
+            self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+
+        slots = [self._slots[key] for key in latest]
+        assert self._vectors is not None
+        self._vectors[slots] = vectors[list(latest.values())]
+        self._atime[slots] = self._tick()
+
+    def _evict(self, count: int) -> None:
+        if count <= 0:
+            return
+        occupied = np.flatnonzero(self._atime)
+        victims = occupied[np.argpartition(self._atime[occupied], count - 1)[:count]]
+        for slot in victims:
+            del self._slots[self._keys[slot].tobytes()]
+        self._atime[victims] = 0
+        logger.debug("Evicted %d embeddings from cache.", count)
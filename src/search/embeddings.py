@@ -0,0 +1,240 @@
+import asyncio
+import binascii
+from collections.abc import Sequence
+from typing import Any, Literal
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from src.clients.coalesce import SingleFlight
+from src.clients.wrapper import get_async_openai_client
+from src.config import logger
+from src.retry import ResilientCaller
+from src.search.cache import EmbeddingCache, make_key
+
+# Per-request packing limits. Keep them within the service quotas for the
+# embedding model in use (number of inputs and total text size per call).
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_BATCH_CHARS = 32_000
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Embeddings as returned by the API: base64 of little-endian float32, or a list of floats
+EncodingFormat = Literal["base64", "float"]
+RawEmbedding = str | list[float]
+
+
+def normalize_text(text: str) -> str:
+    """Replace newlines with spaces (recommended practice for embeddings)."""
+    return text.replace("\n", " ")
+
+
+def embedding_dim(embedding: RawEmbedding) -> int:
+    """Vector length of a raw API embedding, without decoding it."""
+    if isinstance(embedding, str):
+        # 4 characters per 3 bytes, minus padding; 4 bytes per float32
+        return (len(embedding) * 3 // 4 - embedding.count("=", -2)) // 4
+    return len(embedding)
+
+
+def decode_embeddings(embeddings: Sequence[RawEmbedding], out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Decode raw API embeddings into rows of a float32 matrix.
+
+    Base64 payloads are decoded into one buffer, viewed as float32 with
+    'np.frombuffer' and copied once into the output; no Python floats are created.
+
+    Args:
+        embeddings: Embeddings in 'index' order.
+        out: Preallocated (len(embeddings), dim) float32 matrix (or a view of
+            one) to fill; allocated if omitted.
+
+    Returns:
+        The filled matrix.
+
+    """
+    if out is None:
+        dim = embedding_dim(embeddings[0]) if embeddings else 0
+        out = np.empty((len(embeddings), dim), dtype=np.float32)
+    if not embeddings:
+        return out
+    if all(isinstance(embedding, str) for embedding in embeddings):
+        raw = b"".join(map(binascii.a2b_base64, embeddings))  # pyright: ignore[reportArgumentType]
+        out[:] = np.frombuffer(raw, dtype="<f4").reshape(len(embeddings), -1)
+    else:
+        for row, embedding in zip(out, embeddings, strict=True):
+            if isinstance(embedding, str):
+                row[:] = np.frombuffer(binascii.a2b_base64(embedding), dtype="<f4")
+            else:
+                row[:] = embedding
+    return out
+
+
+def make_batches(
+    texts: list[str],
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_batch_chars: int = DEFAULT_MAX_BATCH_CHARS,
+) -> list[tuple[int, int]]:
+    """
+    Split texts into contiguous (start, end) ranges that respect per-request limits.
+
+    A single text longer than 'max_batch_chars' still gets its own batch;
+    the service decides whether it fits.
+    """
+    batches: list[tuple[int, int]] = []
+    start = 0
+    chars = 0
+
+    for i, text in enumerate(texts):
+        size = len(text)
+        if i > start and (i - start >= max_batch_size or chars + size > max_batch_chars):
+            batches.append((start, i))
+            start, chars = i, 0
+        chars += size
+
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+class BatchEmbedder:
+    """
+    Embeds many texts by packing them into multi-input requests that run
+    concurrently with bounded parallelism.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model_uri: str,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_chars: int = DEFAULT_MAX_BATCH_CHARS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cache: EmbeddingCache | None = None,
+        resilience: ResilientCaller | None = None,
+        flight: SingleFlight | None = None,
+        encoding_format: EncodingFormat = "base64",
+    ) -> None:
+        self.client = client
+        # Base64 responses are smaller and decode without per-float JSON parsing;
+        # use "float" for endpoints that do not support it
+        self.encoding_format: EncodingFormat = encoding_format
+        self.cache = cache
+        # Optional: identical batches requested concurrently (e.g. the same
+        # search query from several handlers) share one upstream call
+        self.flight = flight
+        # Transient errors are retried per batch instead of failing the whole call
+        self.resilience = resilience or ResilientCaller()
+        self.model_uri = model_uri
+        self.max_batch_size = max_batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrency = max_concurrency
+
+    async def _embed_batch(
+        self,
+        texts: list[str],
+        start: int,
+        sem: asyncio.Semaphore,
+    ) -> tuple[int, list[RawEmbedding]]:
+        async def request() -> list[RawEmbedding]:
+            async with sem:
+                response = await self.resilience.call(
+                    lambda: self.client.embeddings.create(
+                        input=texts,
+                        model=self.model_uri,
+                        encoding_format=self.encoding_format,
+                    ),
+                )
+            # The API may return items out of order; 'index' is authoritative
+            data = sorted(response.data, key=lambda item: item.index)
+            if len(data) != len(texts):
+                msg = f"Expected {len(texts)} embeddings, got {len(data)}"
+                raise ValueError(msg)
+            return [item.embedding for item in data]
+
+        if self.flight is None:
+            return start, await request()
+        return start, await self.flight.do((self.model_uri, *texts), request)
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed texts and return a contiguous float32 matrix of shape (n_texts, dim).
+
+        Rows are in input order. With a cache attached, only texts missing from
+        it are sent to the API. Any failed batch aborts the whole call,
+        so a partially filled matrix is never returned.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        normalized = [normalize_text(t) for t in texts]
+        # Duplicates within the call are embedded once and copied into place
+        unique = list(dict.fromkeys(normalized))
+        if len(unique) < len(normalized):
+            logger.debug("Embedding %d unique of %d texts.", len(unique), len(normalized))
+            positions = {text: i for i, text in enumerate(unique)}
+            return (await self._embed_unique(unique))[[positions[t] for t in normalized]]
+        return await self._embed_unique(normalized)
+
+    async def _embed_unique(self, normalized: list[str]) -> np.ndarray:
+        if self.cache is None:
+            return await self._embed_uncached(normalized)
+
+        keys = [make_key(self.model_uri, t) for t in normalized]
+        hit_positions, hit_vectors = self.cache.get_many(keys)
+        hit_set = set(hit_positions)
+        missing = [i for i in range(len(normalized)) if i not in hit_set]
+        logger.info("Embedding cache: %d hits, %d misses.", len(hit_positions), len(missing))
+
+        fresh = await self._embed_uncached([normalized[i] for i in missing]) if missing else None
+        dim = fresh.shape[1] if fresh is not None else hit_vectors.shape[1]
+
+        result = np.empty((len(normalized), dim), dtype=np.float32)
+        if hit_positions:
+            result[hit_positions] = hit_vectors
+        if fresh is not None:
+            result[missing] = fresh
+            self.cache.put_many([keys[i] for i in missing], fresh)
+        # Hits update access times, which decide what gets evicted in later runs
+        self.cache.flush()
+        return result
+
+    async def _embed_uncached(self, texts: list[str]) -> np.ndarray:
+        batches = make_batches(texts, self.max_batch_size, self.max_batch_chars)
+        sem = asyncio.Semaphore(self.max_concurrency)
+        logger.info("Embedding %d texts in %d batches...", len(texts), len(batches))
+
+        result: np.ndarray | None = None
+        tasks = [
+            asyncio.ensure_future(self._embed_batch(texts[start:end], start, sem))
+            for start, end in batches
+        ]
+
+        try:
+            # Decode each batch into its rows of the output as soon as it lands
+            for done in asyncio.as_completed(tasks):
+                start, embeddings = await done
+                if result is None:
+                    result = np.empty((len(texts), embedding_dim(embeddings[0])), dtype=np.float32)
+                decode_embeddings(embeddings, result[start : start + len(embeddings)])
+        except Exception:
+            logger.exception("Embedding batch failed; cancelling remaining batches.")
+            for task in tasks:
+                task.cancel()
+            raise
+
+        assert result is not None
+        return result
+
+
+def embed_texts(texts: list[str], model_uri: str, **kwargs: Any) -> np.ndarray:
+    """
+    Synchronous helper: embed texts with a temporary async client.
+
+    Keyword arguments are passed to 'BatchEmbedder' (batch limits, concurrency, cache).
+    """
+
+    async def _run() -> np.ndarray:
+        async with get_async_openai_client() as client:
+            return await BatchEmbedder(client, model_uri, **kwargs).embed(texts)
+
+    return asyncio.run(_run())
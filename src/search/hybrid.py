@@ -0,0 +1,166 @@
+from collections.abc import Callable, Sequence
+
+import numpy as np
+
+from src.config import logger
+from src.search.index import VectorIndex
+from src.search.lexical import STOPWORDS, BM25Index, is_code, words
+
+# Standard RRF damping constant: keeps single top ranks from dominating the fusion
+DEFAULT_RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[np.ndarray],
+    k: int = DEFAULT_RRF_K,
+    weights: Sequence[float] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked id lists with Reciprocal Rank Fusion.
+
+    Each document scores sum(weight / (k + rank)) over the lists it appears
+    in (rank starts at 1). Only ranks matter, so BM25 and cosine scores do
+    not need to be on the same scale. Negative ids (ANN padding) are ignored.
+
+    Returns:
+        Tuple of (document ids, fused scores), best first.
+
+    """
+    weights = weights or [1.0] * len(rankings)
+    ids_parts, score_parts = [], []
+    for ranking, weight in zip(rankings, weights, strict=True):
+        ranking = np.asarray(ranking, dtype=np.int64)
+        ranks = np.arange(1, len(ranking) + 1, dtype=np.float64)
+        valid = ranking >= 0
+        ids_parts.append(ranking[valid])
+        score_parts.append(weight / (k + ranks[valid]))
+
+    if not ids_parts or sum(len(part) for part in ids_parts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    unique, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+    order = np.argsort(-fused, kind="stable")
+    return unique[order], fused[order]
+
+
+class HybridRetriever:
+    """
+    Combines a BM25 inverted index with a dense vector index.
+
+    A query is answered in up to three steps:
+      1. BM25 finds documents containing the query terms.
+      2. If the query is an obvious lexical lookup (only codes/identifiers
+         such as 'A100' or 'SKU-1234') and BM25 found matches, those are
+         returned directly, without embedding the query.
+      3. Otherwise the query is embedded and scored densely, over the whole
+         corpus or (with 'prefilter') only over the top BM25 candidates,
+         and both rankings are fused with RRF.
+
+    Both indexes must use the same document ids. A document removed from
+    either index (e.g. 'VectorIndex.remove' after a delete) is left out of
+    both rankings.
+    """
+
+    def __init__(
+        self,
+        lexical: BM25Index,
+        dense: VectorIndex,
+        embed_query: Callable[[str], np.ndarray] | None = None,
+        rrf_k: int = DEFAULT_RRF_K,
+        lexical_weight: float = 1.0,
+        dense_weight: float = 1.0,
+        lexical_shortcut: bool = True,
+    ) -> None:
+        """
+        Args:
+            lexical: BM25 index over the documents.
+            dense: Vector index over the same documents, in the same order.
+            embed_query: Turns a query into a vector; called only when dense scoring is needed.
+            rrf_k: RRF damping constant.
+            lexical_weight: Weight of the BM25 ranking in the fusion.
+            dense_weight: Weight of the dense ranking in the fusion.
+            lexical_shortcut: Answer identifier-only queries from BM25 alone.
+
+        """
+        if len(lexical) != len(dense):
+            msg = f"Index sizes differ: {len(lexical)} lexical vs {len(dense)} dense documents"
+            raise ValueError(msg)
+        self.lexical = lexical
+        self.dense = dense
+        self.embed_query = embed_query
+        self.rrf_k = rrf_k
+        self.weights = (lexical_weight, dense_weight)
+        self.lexical_shortcut = lexical_shortcut
+
+    def is_lexical_lookup(self, query: str) -> bool:
+        """True if every query word is a code/identifier (contains a digit or a separator)."""
+        # Whole tokens: the tokenizer also emits the alphabetic parts of codes ('sku' of 'SKU-1234')
+        tokens = [token for token in words(query) if token not in STOPWORDS]
+        return bool(tokens) and all(is_code(token) for token in tokens)
+
+    def _live(self, ids: np.ndarray) -> np.ndarray:
+        """Mask of the ids that are live in both indexes (negative ANN padding is not)."""
+        live = (ids >= 0) & (ids < min(len(self.lexical), len(self.dense)))
+        live[live] = self.lexical.is_live(ids[live]) & self.dense.is_live(ids[live])
+        return live
+
+    def _dense_ranking(self, query: str, vector: np.ndarray, k: int, depth: int, prefilter: int | None) -> np.ndarray:
+        if prefilter:
+            candidates, _ = self.lexical.search(query, prefilter)
+            candidates = candidates[self._live(candidates)]
+            # Too few lexical candidates: fall back to scanning everything
+            if len(candidates) >= k:
+                scores = self.dense.score_candidates(vector, candidates)
+                order = np.argsort(-scores, kind="stable")[:depth]
+                logger.debug("Dense scoring restricted to %d lexical candidates.", len(candidates))
+                return candidates[order]
+        ids, _ = self.dense.search(vector, k=depth)
+        return ids[0][self._live(ids[0])]
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        query_vector: np.ndarray | None = None,
+        prefilter: int | None = None,
+        depth: int = 50,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k best documents for a text query.
+
+        Args:
+            query: Query text (always used for BM25).
+            k: Number of results.
+            query_vector: Precomputed query embedding (skips 'embed_query').
+            prefilter: Score densely only the top N BM25 candidates instead of the whole corpus.
+            depth: Length of each ranking that goes into the fusion.
+
+        Returns:
+            Tuple of (document ids, scores), best first. Scores are BM25 scores
+            for lexical-only answers and RRF scores otherwise.
+
+        """
+        depth = max(depth, k)
+        lexical_ids, lexical_scores = self.lexical.search(query, depth)
+        live = self._live(lexical_ids)
+        lexical_ids, lexical_scores = lexical_ids[live], lexical_scores[live]
+
+        if (
+            query_vector is None
+            and self.lexical_shortcut
+            and len(lexical_ids) > 0
+            and self.is_lexical_lookup(query)
+        ):
+            logger.debug("Lexical lookup, skipping query embedding: %s", query)
+            return lexical_ids[:k], lexical_scores[:k]
+
+        if query_vector is None:
+            if self.embed_query is None:
+                msg = "Either 'query_vector' or 'embed_query' is required for dense retrieval"
+                raise ValueError(msg)
+            query_vector = self.embed_query(query)
+
+        dense_ids = self._dense_ranking(query, query_vector, k, depth, prefilter)
+        ids, scores = reciprocal_rank_fusion([lexical_ids, dense_ids], self.rrf_k, self.weights)
+        return ids[:k], scores[:k]
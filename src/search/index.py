@@ -0,0 +1,265 @@
+import numpy as np
+
+from src.config import logger
+
+# Vectors are assigned to IVF lists in chunks of this many rows to bound memory
+_ASSIGN_CHUNK = 65_536
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of 'matrix' with unit-length rows (zero rows stay zero)."""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k best columns of each row with partial selection.
+
+    Returns:
+        Tuple of (indices, scores), both shaped (n_rows, k), best first.
+
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    # O(n) selection of the top k, then sort only those k
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over document embeddings.
+
+    Document vectors are normalized once at build time, so a query (or a batch
+    of queries) is scored with a single matrix product. With 'ann=True' an IVF
+    (inverted file) index is built: documents are clustered with spherical
+    k-means and only the 'n_probe' closest clusters are scanned per query.
+    Raising 'n_probe' trades speed for recall ('n_probe == n_lists' is exact).
+
+    The index is mutable: 'add' appends vectors (assigning them to the
+    nearest existing IVF list), 'remove' marks ids as deleted so searches
+    skip them, and 'compact' reclaims deleted rows. Ids are row positions and
+    stay stable until 'compact'. After many additions the IVF clustering may
+    drift from the data; rebuilding from scratch restores recall.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ann: bool = False,
+        n_lists: int | None = None,
+        n_probe: int = 8,
+        kmeans_iters: int = 10,
+        seed: int = 0,
+    ) -> None:
+        # Rows beyond '_size' are spare capacity for 'add'
+        self._data = normalize_rows(vectors)
+        self._size = len(self._data)
+        self._alive = np.ones(self._size, dtype=bool)
+        self._removed = 0
+        self.n_probe = n_probe
+        self.centroids: np.ndarray | None = None
+        self.lists: list[np.ndarray] = []
+
+        if ann and len(self.vectors) > 0:
+            n_lists = n_lists or max(1, int(np.sqrt(len(self.vectors))))
+            self._build_ivf(min(n_lists, len(self.vectors)), kmeans_iters, seed)
+
+    def __len__(self) -> int:
+        """Number of ids in use, including removed ones (ids are row positions)."""
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    @property
+    def live_count(self) -> int:
+        return self._size - self._removed
+
+    def is_live(self, ids: np.ndarray) -> np.ndarray:
+        return self._alive[: self._size][ids]
+
+    # --- Updates ---
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Append vectors without rebuilding the index.
+
+        Returns:
+            The ids assigned to them.
+
+        """
+        new = normalize_rows(vectors)
+        if self._size and new.shape[1] != self._data.shape[1]:
+            msg = f"Vector dimension {new.shape[1]} does not match the index ({self._data.shape[1]})"
+            raise ValueError(msg)
+        end = self._size + len(new)
+        if end > len(self._data) or self._size == 0:
+            # Grow geometrically so that repeated small additions stay amortized O(1) per row
+            capacity = max(end, 2 * len(self._data), 64)
+            data = np.zeros((capacity, new.shape[1]), dtype=np.float32)
+            data[: self._size] = self.vectors
+            self._data = data
+            alive = np.zeros(capacity, dtype=bool)
+            alive[: self._size] = self._alive[: self._size]
+            self._alive = alive
+
+        ids = np.arange(self._size, end, dtype=np.int64)
+        self._data[self._size : end] = new
+        self._alive[self._size : end] = True
+        self._size = end
+
+        if self.centroids is not None and len(ids) > 0:
+            labels = self._assign(new, self.centroids)
+            for label in np.unique(labels):
+                self.lists[label] = np.concatenate([self.lists[label], ids[labels == label]])
+        return ids
+
+    def remove(self, ids: np.ndarray | list[int]) -> int:
+        """
+        Mark ids as deleted; searches skip them from now on.
+
+        Returns:
+            The number of ids that were live before the call.
+
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < self._size)]
+        removed = int(np.count_nonzero(self._alive[ids]))
+        self._alive[ids] = False
+        self._removed += removed
+        return removed
+
+    def compact(self) -> np.ndarray:
+        """
+        Drop removed rows and renumber the remaining ones.
+
+        Returns:
+            Mapping from old id to new id (-1 for removed ids), of length len(self) before the call.
+
+        """
+        alive = self._alive[: self._size]
+        mapping = np.full(self._size, -1, dtype=np.int64)
+        mapping[alive] = np.arange(int(alive.sum()))
+        self._data = self.vectors[alive].copy()
+        self._size = len(self._data)
+        self._alive = np.ones(self._size, dtype=bool)
+        self._removed = 0
+        self.lists = [mapping[ids][mapping[ids] >= 0] for ids in self.lists]
+        logger.info("Compacted vector index to %d vectors.", self._size)
+        return mapping
+
+    # --- IVF construction ---
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _ASSIGN_CHUNK):
+            chunk = vectors[start : start + _ASSIGN_CHUNK]
+            labels[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+    def _build_ivf(self, n_lists: int, iters: int, seed: int) -> None:
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample; 256 points per list is plenty for coarse clustering
+        sample_size = min(len(self.vectors), n_lists * 256)
+        sample = self.vectors[rng.choice(len(self.vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(iters):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            # Re-seed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        labels = self._assign(self.vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        self.centroids = centroids
+        self.lists = [order[bounds[i] : bounds[i + 1]] for i in range(n_lists)]
+        logger.info("Built IVF index: %d vectors in %d lists.", len(self.vectors), n_lists)
+
+    # --- Search ---
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 5,
+        n_probe: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar documents for each query.
+
+        Args:
+            queries: One query vector (dim,) or a batch (n_queries, dim).
+            k: Number of results per query.
+            n_probe: IVF lists to scan (ANN mode only); defaults to the index setting.
+
+        Returns:
+            Tuple of (document indices, cosine scores), each shaped (n_queries, k)
+            (fewer columns if fewer than k documents are live).
+            In ANN mode rows may hold fewer than k hits; they are padded with -1 / -inf.
+
+        """
+        queries = normalize_rows(queries)
+        if self.centroids is None:
+            return self._search_flat(queries, k)
+        return self._search_ivf(queries, k, n_probe or self.n_probe)
+
+    def _search_flat(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = queries @ self.vectors.T
+        if not self._removed:
+            return top_k(scores, k)
+        scores[:, ~self._alive[: self._size]] = -np.inf
+        ids, best = top_k(scores, min(k, self.live_count))
+        return ids, best
+
+    def score_candidates(self, query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """
+        Cosine scores of one query against a subset of documents (e.g. lexical candidates).
+
+        Args:
+            query: Query vector (dim,).
+            candidates: Document indices to score.
+
+        Returns:
+            Scores aligned with 'candidates' (-inf for removed documents).
+
+        """
+        scores = self.vectors[candidates] @ normalize_rows(query)[0]
+        if self._removed:
+            scores[~self.is_live(candidates)] = -np.inf
+        return scores
+
+    def _search_ivf(self, queries: np.ndarray, k: int, n_probe: int) -> tuple[np.ndarray, np.ndarray]:
+        assert self.centroids is not None
+        n_probe = min(n_probe, len(self.lists))
+        probe_ids, _ = top_k(queries @ self.centroids.T, n_probe)
+
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for row, (query, probes) in enumerate(zip(queries, probe_ids, strict=True)):
+            candidates = np.concatenate([self.lists[p] for p in probes])
+            if self._removed:
+                candidates = candidates[self.is_live(candidates)]
+            if len(candidates) == 0:
+                continue
+            local_ids, local_scores = top_k((self.vectors[candidates] @ query)[np.newaxis, :], k)
+            found = local_ids.shape[1]
+            ids[row, :found] = candidates[local_ids[0]]
+            scores[row, :found] = local_scores[0]
+
+        return ids, scores
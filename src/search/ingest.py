@@ -0,0 +1,480 @@
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from src.config import config, logger
+from src.search.cache import make_key
+from src.search.index import VectorIndex
+from src.tokens import TokenCounter, token_counter
+
+DEFAULT_CHUNK_TOKENS = 400
+DEFAULT_CHUNK_OVERLAP = 50
+DOCUMENT_SUFFIXES = (".txt", ".md", ".rst", ".jsonl")
+
+# Documents changed per index update; bounds memory and the size of embedding batches
+_DOCS_PER_STEP = 64
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# Whitespace-separated pieces, each keeping the whitespace that follows it
+_PIECE = re.compile(r"\S+\s*")
+_SENTENCE_END = re.compile(r"[.!?…:;]['\")»]*\s*$")
+
+EmbedFunction = Callable[[list[str]], np.ndarray]
+
+
+@dataclass(frozen=True)
+class Document:
+    """A source document; 'doc_id' must be stable across runs (e.g. a relative path)."""
+
+    doc_id: str
+    text: str
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A stored chunk of a document and its id in the vector index."""
+
+    id: int
+    doc_id: str
+    position: int
+    text: str
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    chunk: Chunk
+    score: float
+
+
+@dataclass
+class IngestStats:
+    """What one 'ingest' call changed."""
+
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    chunks_embedded: int = 0
+    chunks_reused: int = 0
+
+
+def iter_documents(*paths: str | Path, suffixes: Iterable[str] = DOCUMENT_SUFFIXES) -> Iterator[Document]:
+    """
+    Stream documents from files and directories (searched recursively).
+
+    Text files become one document each, with the path relative to the
+    given directory (or the file path itself) as id. '.jsonl' files hold one
+    document per line: {"id": ..., "text": ...}.
+
+    Args:
+        paths: Files or directories.
+        suffixes: File extensions to read when walking directories.
+
+    """
+    suffixes = tuple(suffixes)
+    for root in map(Path, paths):
+        files = sorted(p for p in root.rglob("*") if p.is_file() and p.suffix in suffixes) if root.is_dir() else [root]
+        for file in files:
+            doc_id = file.relative_to(root).as_posix() if root.is_dir() else file.as_posix()
+            if file.suffix == ".jsonl":
+                with file.open(encoding="utf-8") as lines:
+                    for line in lines:
+                        if line.strip():
+                            record = json.loads(line)
+                            yield Document(doc_id=str(record["id"]), text=record["text"])
+            else:
+                yield Document(doc_id=doc_id, text=file.read_text(encoding="utf-8", errors="replace"))
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+    counter: TokenCounter | None = None,
+) -> list[str]:
+    """
+    Split text into overlapping chunks of at most 'max_tokens' (estimated) tokens.
+
+    Chunks end at a sentence or paragraph boundary when one falls in the
+    second half of the window, and each chunk repeats up to 'overlap' tokens
+    from the end of the previous one so context is not cut mid-thought.
+    A single word longer than 'max_tokens' becomes its own chunk.
+    """
+    counter = counter or token_counter
+    pieces = _PIECE.findall(text)
+    costs = [counter.count(piece.strip()) for piece in pieces]
+    boundaries = [bool(_SENTENCE_END.search(piece)) or "\n\n" in piece for piece in pieces]
+
+    chunks: list[str] = []
+    start = 0
+    while start < len(pieces):
+        end, tokens = start, 0
+        while end < len(pieces) and (end == start or tokens + costs[end] <= max_tokens):
+            tokens += costs[end]
+            end += 1
+        if end < len(pieces):
+            half = start + (end - start) // 2
+            end = next((cut for cut in range(end, half, -1) if boundaries[cut - 1]), end)
+        chunks.append("".join(pieces[start:end]).strip())
+        if end >= len(pieces):
+            break
+
+        # Step back up to 'overlap' tokens, always moving forward at least one piece
+        back, tokens = end, 0
+        while back > start + 1 and tokens + costs[back - 1] <= overlap:
+            back -= 1
+            tokens += costs[back]
+        start = back
+    return chunks
+
+
+class IngestionPipeline:
+    """
+    Keeps a chunked vector index in sync with a changing document collection.
+
+    State lives in a directory:
+        manifest.db      - SQLite: document hashes, chunk -> document mappings
+                           and the committed vector file generation and row count
+        vectors-<N>.f32  - float32 vectors of the index, row = chunk id
+
+    Each update appends its vectors to the current file before the manifest
+    commits the rows, so rows past the committed count (from an update that
+    did not commit) are simply cut off on load. Compaction writes the next
+    generation's file and switches to it in the same transaction that
+    renumbers the chunks; a crash on either side leaves a consistent pair.
+
+    On each 'ingest' only new or changed documents are chunked, and only
+    chunks whose content hash is not already indexed are embedded; the rest
+    reuse their stored vectors. Replaced and deleted chunks are removed from
+    the index in place and the space is reclaimed once removed rows
+    outnumber live ones. Intended for a single writer process.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        embed: EmbedFunction | None = None,
+        model_uri: str | None = None,
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        compact_ratio: float = 0.5,
+    ) -> None:
+        """
+        Args:
+            path: State directory (created if missing).
+            embed: Embeds a list of texts into an (n, dim) matrix
+                (defaults to 'embed_texts' with 'model_uri').
+            model_uri: Document embedding model (defaults to 'config.embedding_doc_uri').
+            chunk_tokens: Maximum chunk size in tokens.
+            chunk_overlap: Tokens repeated between consecutive chunks.
+            compact_ratio: Compact the index when this share of its rows are removed.
+
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.model_uri = model_uri or config.embedding_doc_uri
+        if embed is None:
+            from src.search.embeddings import embed_texts
+
+            embed = functools.partial(embed_texts, model_uri=self.model_uri)
+        self.embed = embed
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.compact_ratio = compact_ratio
+
+        self._conn = sqlite3.connect(str(self.path / "manifest.db"), isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc_id);
+            CREATE INDEX IF NOT EXISTS chunks_hash ON chunks (hash);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """,
+        )
+        self._generation = 0
+        self.index = self._load_index()
+
+    def _vectors_file(self, generation: int) -> Path:
+        return self.path / f"vectors-{generation}.f32"
+
+    def _meta(self) -> dict[str, int]:
+        return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _load_index(self) -> VectorIndex | None:
+        meta = self._meta()
+        self._generation = meta.get("generation", 0)
+        vectors_file = self._vectors_file(self._generation)
+        # Other generations are left over from a compaction that crashed before or after its commit
+        for stale in self.path.glob("vectors-*.f32"):
+            if stale != vectors_file or "dim" not in meta:
+                stale.unlink()
+        if "dim" not in meta:
+            return None
+        rows, dim = meta["rows"], meta["dim"]
+        # Rows past the committed count were appended by an update that did not commit
+        with open(vectors_file, "r+b") as f:
+            f.truncate(rows * dim * 4)
+            vectors = np.fromfile(f, dtype=np.float32).reshape(rows, dim)
+        index = VectorIndex(vectors)
+        # Rows without a chunk were removed (or written by an update that did not commit)
+        live = np.asarray([row[0] for row in self._conn.execute("SELECT id FROM chunks")], dtype=np.int64)
+        dead = np.ones(len(index), dtype=bool)
+        dead[live[live < len(index)]] = False
+        index.remove(np.flatnonzero(dead))
+        logger.info("Loaded ingestion index: %d chunks.", index.live_count)
+        return index
+
+    def _write_vectors(self, vectors: np.ndarray, mode: str) -> None:
+        # Synced so the rows are on disk before a manifest commit refers to them
+        with open(self._vectors_file(self._generation), mode) as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _commit_rows(self, conn: sqlite3.Connection) -> None:
+        assert self.index is not None
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("generation", self._generation), ("rows", len(self.index)), ("dim", self.index.vectors.shape[1])],
+        )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        self._conn.execute("BEGIN")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    @contextlib.contextmanager
+    def _index_transaction(self) -> Iterator[sqlite3.Connection]:
+        """A transaction that changes the index; if it does not commit, the index is reloaded from disk."""
+        try:
+            with self._transaction() as conn:
+                yield conn
+        except BaseException:
+            self.index = self._load_index()
+            raise
+
+    def _select_in(self, sql: str, values: list[Any]) -> list[tuple[Any, ...]]:
+        """Runs 'sql' (with a '{}' placeholder list) for 'values' in batches."""
+        rows: list[tuple[Any, ...]] = []
+        for start in range(0, len(values), _SQL_BATCH):
+            batch = values[start : start + _SQL_BATCH]
+            rows.extend(self._conn.execute(sql.format(",".join("?" * len(batch))), batch).fetchall())
+        return rows
+
+    def document_hash(self, text: str) -> str:
+        """Hash of a document's text and the settings that shape its chunks."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.model_uri}\0{self.chunk_tokens}\0{self.chunk_overlap}\0".encode())
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    # --- Updates ---
+
+    def ingest(self, documents: Iterable[Document], delete_missing: bool = False) -> IngestStats:
+        """
+        Add new documents and re-index changed ones.
+
+        Args:
+            documents: The documents to sync, e.g. from 'iter_documents'; streamed in steps.
+            delete_missing: Also delete indexed documents that did not appear in 'documents'
+                (use only when passing the full collection).
+
+        Returns:
+            Counts of what changed.
+
+        """
+        stats = IngestStats()
+        seen: set[str] = set()
+        documents = iter(documents)
+        while batch := list(islice(documents, _DOCS_PER_STEP)):
+            seen.update(doc.doc_id for doc in batch)
+            self._ingest_step(batch, stats)
+
+        if delete_missing:
+            stored = [row[0] for row in self._conn.execute("SELECT doc_id FROM documents")]
+            stats.deleted = self.delete([doc_id for doc_id in stored if doc_id not in seen])
+
+        logger.info(
+            "Ingested: %d added, %d updated, %d unchanged, %d deleted; %d chunks embedded, %d reused.",
+            stats.added,
+            stats.updated,
+            stats.unchanged,
+            stats.deleted,
+            stats.chunks_embedded,
+            stats.chunks_reused,
+        )
+        return stats
+
+    def _ingest_step(self, batch: list[Document], stats: IngestStats) -> None:
+        # Later copies of a document id within one step win
+        by_id = {doc.doc_id: doc for doc in batch}
+        known = dict(self._select_in("SELECT doc_id, hash FROM documents WHERE doc_id IN ({})", list(by_id)))
+
+        changed: dict[str, str] = {}
+        chunks: list[tuple[str, int, str, str]] = []
+        for doc_id, doc in by_id.items():
+            doc_hash = self.document_hash(doc.text)
+            if known.get(doc_id) == doc_hash:
+                stats.unchanged += 1
+                continue
+            changed[doc_id] = doc_hash
+            for position, text in enumerate(chunk_text(doc.text, self.chunk_tokens, self.chunk_overlap)):
+                chunks.append((doc_id, position, make_key(self.model_uri, text).hex(), text))
+        if not changed:
+            return
+
+        old_ids = [row[0] for row in self._select_in("SELECT id FROM chunks WHERE doc_id IN ({})", list(changed))]
+        new_ids = np.empty(0, dtype=np.int64)
+        if chunks:
+            vectors = self._vectors_for(chunks, stats)
+            if self.index is None:
+                self.index = VectorIndex(np.empty((0, vectors.shape[1]), dtype=np.float32))
+            new_ids = self.index.add(vectors)
+            # New rows are on disk before the manifest points at them; old rows stay until compaction
+            self._write_vectors(self.index.vectors[new_ids], "ab")
+        if self.index is not None:
+            self.index.remove(old_ids)
+
+        with self._index_transaction() as conn:
+            conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(doc_id,) for doc_id in changed])
+            conn.executemany(
+                "INSERT INTO chunks (id, doc_id, position, hash, text) VALUES (?, ?, ?, ?, ?)",
+                [(int(chunk_id), *chunk) for chunk_id, chunk in zip(new_ids, chunks, strict=True)],
+            )
+            conn.executemany("INSERT OR REPLACE INTO documents (doc_id, hash) VALUES (?, ?)", changed.items())
+            if self.index is not None:
+                self._commit_rows(conn)
+
+        stats.updated += sum(doc_id in known for doc_id in changed)
+        stats.added += sum(doc_id not in known for doc_id in changed)
+        if self.index is not None:
+            self._maybe_compact()
+
+    def _vectors_for(self, chunks: list[tuple[str, int, str, str]], stats: IngestStats) -> np.ndarray:
+        """Vectors for the chunks: stored ones for known hashes, embedded ones for the rest."""
+        hashes = list({chunk[2] for chunk in chunks})
+        stored = dict(self._select_in("SELECT hash, MIN(id) FROM chunks WHERE hash IN ({}) GROUP BY hash", hashes))
+        missing = {chunk[2]: chunk[3] for chunk in chunks if chunk[2] not in stored}
+
+        found: dict[str, np.ndarray] = {}
+        if stored:
+            assert self.index is not None
+            found = dict(zip(stored, self.index.vectors[list(stored.values())], strict=True))
+        if missing:
+            embedded = np.asarray(self.embed(list(missing.values())), dtype=np.float32)
+            found.update(zip(missing, embedded, strict=True))
+
+        stats.chunks_embedded += len(missing)
+        stats.chunks_reused += len(chunks) - len(missing)
+        return np.stack([found[chunk[2]] for chunk in chunks])
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        """
+        Remove documents and their chunks from the index.
+
+        Returns:
+            The number of documents that were indexed.
+
+        """
+        doc_ids = list(doc_ids)
+        chunk_ids = [row[0] for row in self._select_in("SELECT id FROM chunks WHERE doc_id IN ({})", doc_ids)]
+        with self._transaction() as conn:
+            deleted = sum(
+                conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount for doc_id in doc_ids
+            )
+            conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+        if self.index is not None and chunk_ids:
+            self.index.remove(chunk_ids)
+            self._maybe_compact()
+        return deleted
+
+    def _maybe_compact(self) -> None:
+        assert self.index is not None
+        if len(self.index) - self.index.live_count > self.compact_ratio * len(self.index):
+            self.compact()
+
+    def compact(self) -> None:
+        """Reclaim the rows of removed chunks, renumbering chunk ids."""
+        if self.index is None:
+            return
+        mapping = self.index.compact()
+        # Ascending old ids map to ascending new ids <= old, so updates never collide
+        moves = [(int(new), int(old)) for old, new in enumerate(mapping) if new >= 0 and new != old]
+        old_file = self._vectors_file(self._generation)
+        # The manifest keeps pointing at the old file until the renumbering commits
+        self._generation += 1
+        self._write_vectors(self.index.vectors, "wb")
+        with self._index_transaction() as conn:
+            conn.executemany("UPDATE chunks SET id = ? WHERE id = ?", moves)
+            self._commit_rows(conn)
+        old_file.unlink()
+
+    # --- Lookup ---
+
+    def __len__(self) -> int:
+        """Number of indexed chunks."""
+        return self.index.live_count if self.index is not None else 0
+
+    def document_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def chunks(self, ids: Iterable[int]) -> list[Chunk]:
+        """Chunks by index id, in the given order (unknown ids are skipped)."""
+        ids = [int(chunk_id) for chunk_id in ids]
+        rows = self._select_in("SELECT id, doc_id, position, text FROM chunks WHERE id IN ({})", ids)
+        by_id = {row[0]: Chunk(*row) for row in rows}
+        return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+    def document_chunks(self, doc_id: str) -> list[Chunk]:
+        rows = self._conn.execute(
+            "SELECT id, doc_id, position, text FROM chunks WHERE doc_id = ? ORDER BY position",
+            (doc_id,),
+        )
+        return [Chunk(*row) for row in rows]
+
+    def search(self, query_vector: np.ndarray, k: int = 5) -> list[SearchHit]:
+        """The k chunks closest to a query embedding, best first."""
+        if self.index is None:
+            return []
+        ids, scores = self.index.search(query_vector, k)
+        valid = ids[0] >= 0
+        chunks = {chunk.id: chunk for chunk in self.chunks(ids[0][valid])}
+        return [
+            SearchHit(chunk=chunks[int(i)], score=float(s))
+            for i, s in zip(ids[0][valid], scores[0][valid], strict=True)
+            if int(i) in chunks
+        ]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "IngestionPipeline":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
@@ -0,0 +1,266 @@
+import functools
+import math
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Callable, Iterable
+
+import numpy as np
+
+from src.config import logger
+from src.search.index import top_k
+
+try:
+    import snowballstemmer  # pyright: ignore[reportMissingImports]
+
+    _STEMMERS: dict[str, Callable[[str], str]] = {
+        "ru": snowballstemmer.stemmer("russian").stemWord,
+        "en": snowballstemmer.stemmer("english").stemWord,
+    }
+except ImportError:  # pragma: no cover - depends on installed extras
+    _STEMMERS = {}
+
+# Words (letters/digits), optionally joined by '-', '.', '/' or '_' into codes like 'RTX-4090' or 'v1.2'
+_TOKEN = re.compile(r"\w+(?:[-./_]\w+)*")
+_SEPARATOR = re.compile(r"[-./_]")
+_CYRILLIC = re.compile(r"[\u0400-\u04ff]")
+
+# Longest first; used only when 'snowballstemmer' is not installed
+_RU_SUFFIXES = sorted(
+    set(
+        "ами ями ого его ому ему ыми ими ой ей ий ый ая яя ое ее ые ие ую юю ам ям ах ях ом ем "
+        "ов ев ию ия ья ье ью ть ти ешь ет ете ут ют ит им ите ат ят ла ло ли ал ял ил ыл "
+        "а я о е ы и у ю ь й".split(),
+    ),
+    key=len,
+    reverse=True,
+)
+_EN_SUFFIXES = ("ingly", "edly", "ing", "ies", "ied", "es", "ed", "ly", "s")
+
+STOPWORDS = frozenset(
+    (
+        "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+        "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было "
+        "вот от меня еще нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас нибудь "
+        "для мы их чем была сам без будет кто этот того потому этого какой там где есть при это"
+    ).split(),
+)
+
+
+def _light_stem(word: str) -> str:
+    suffixes = _RU_SUFFIXES if _CYRILLIC.match(word) else _EN_SUFFIXES
+    for suffix in suffixes:
+        # Keep at least three characters of the stem
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def stem(word: str) -> str:
+    """Reduce a lowercase Russian or English word to its stem (Snowball if installed)."""
+    if _STEMMERS:
+        return _STEMMERS["ru" if _CYRILLIC.match(word) else "en"](word)
+    return _light_stem(word)
+
+
+def words(text: str) -> list[str]:
+    """
+    Lowercase words and whole codes of a text, before stemming or splitting.
+
+    'ё' is folded into 'е'; codes such as 'RTX-4090' or 'v1.2' stay one token.
+    """
+    return _TOKEN.findall(unicodedata.normalize("NFC", text).lower().replace("ё", "е"))
+
+
+def is_code(token: str) -> bool:
+    """True for identifiers such as 'A100', 'SKU-1234' or 'v1.2' (anything that is not a plain word)."""
+    return not token.isalpha()
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split text into lowercase, stemmed terms for lexical matching.
+
+    Codes that mix letters and digits or contain separators ('A100',
+    'RTX-4090', 'v1.2') are kept whole and also split into their parts, so
+    both the exact code and its pieces match. 'ё' is folded into 'е'.
+    """
+    terms: list[str] = []
+    for token in words(text):
+        terms.extend(_terms(token))
+    return terms
+
+
+@functools.lru_cache(maxsize=65536)
+def _terms(token: str) -> tuple[str, ...]:
+    # Cached: vocabularies are small compared to corpus token counts
+    if not is_code(token):
+        return () if token in STOPWORDS else (stem(token),)
+    parts = [part for part in _SEPARATOR.split(token) if part]
+    return (token, *parts) if len(parts) > 1 else (token,)
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Postings are stored per term as parallel arrays of document ids and term
+    frequencies, so a query only touches the documents that contain its
+    terms. Documents can be appended with 'add'; ids are positions in the
+    order documents were added. 'remove' drops documents from results and
+    from the corpus statistics; their postings stay until the index is rebuilt.
+    """
+
+    def __init__(
+        self,
+        documents: Iterable[str] = (),
+        k1: float = 1.5,
+        b: float = 0.75,
+        tokenizer: Callable[[str], list[str]] = tokenize,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self._postings: dict[str, tuple[list[int], list[int]]] = {}
+        # Arrays built from '_postings' on first use after a change
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_lengths: list[int] = []
+        self._lengths_array: np.ndarray | None = None
+        self._total_length = 0
+        self._removed: set[int] = set()
+        self._alive_array: np.ndarray | None = None
+        self.add(documents)
+
+    def __len__(self) -> int:
+        """Number of ids in use, including removed ones (ids are positions)."""
+        return len(self._doc_lengths)
+
+    @property
+    def live_count(self) -> int:
+        return len(self._doc_lengths) - len(self._removed)
+
+    def is_live(self, ids: np.ndarray) -> np.ndarray:
+        return self._alive()[ids]
+
+    def _alive(self) -> np.ndarray:
+        if self._alive_array is None:
+            alive = np.ones(len(self._doc_lengths), dtype=bool)
+            alive[list(self._removed)] = False
+            self._alive_array = alive
+        return self._alive_array
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def add(self, documents: Iterable[str]) -> list[int]:
+        """
+        Index more documents.
+
+        Returns:
+            The ids assigned to them.
+
+        """
+        ids = []
+        for text in documents:
+            doc_id = len(self._doc_lengths)
+            counts = Counter(self.tokenizer(text))
+            for term, tf in counts.items():
+                doc_ids, tfs = self._postings.setdefault(term, ([], []))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+            length = sum(counts.values())
+            self._doc_lengths.append(length)
+            self._lengths_array = None
+            self._alive_array = None
+            self._total_length += length
+            ids.append(doc_id)
+        if ids:
+            self._arrays.clear()
+            logger.debug("Indexed %d documents (%d terms total).", len(ids), len(self._postings))
+        return ids
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Mark documents as deleted; searches skip them from now on.
+
+        Returns:
+            The number of ids that were live before the call.
+
+        """
+        removed = 0
+        for doc_id in ids:
+            doc_id = int(doc_id)
+            if 0 <= doc_id < len(self._doc_lengths) and doc_id not in self._removed:
+                self._removed.add(doc_id)
+                self._total_length -= self._doc_lengths[doc_id]
+                removed += 1
+        if removed:
+            self._alive_array = None
+        return removed
+
+    def _posting(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        if term not in self._postings:
+            return None
+        if term not in self._arrays:
+            doc_ids, tfs = self._postings[term]
+            self._arrays[term] = (np.asarray(doc_ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+        return self._arrays[term]
+
+    def scores(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 scores of all documents that contain at least one query term.
+
+        Returns:
+            Tuple of (document ids, scores), ordered by id.
+
+        """
+        empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        n_docs = self.live_count
+        terms = Counter(self.tokenizer(query))
+        if not terms or n_docs == 0:
+            return empty
+
+        if self._lengths_array is None:
+            self._lengths_array = np.asarray(self._doc_lengths, dtype=np.float32)
+        doc_lengths = self._lengths_array
+        alive = self._alive() if self._removed else None
+        avg_length = self._total_length / n_docs or 1.0
+        id_parts: list[np.ndarray] = []
+        score_parts: list[np.ndarray] = []
+
+        for term, query_tf in terms.items():
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            doc_ids, tfs = posting
+            if alive is not None:
+                keep = alive[doc_ids]
+                doc_ids, tfs = doc_ids[keep], tfs[keep]
+                if len(doc_ids) == 0:
+                    continue
+            idf = math.log(1.0 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * doc_lengths[doc_ids] / avg_length)
+            id_parts.append(doc_ids)
+            score_parts.append(query_tf * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not id_parts:
+            return empty
+        # Sum per document over the matched postings only (no corpus-sized buffers)
+        ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(score_parts), minlength=len(ids))
+        return ids, totals.astype(np.float32)
+
+    def search(self, query: str, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The k best-matching documents for a text query.
+
+        Returns:
+            Tuple of (document ids, BM25 scores), best first; fewer than k if fewer documents match.
+
+        """
+        ids, scores = self.scores(query)
+        if len(ids) == 0:
+            return ids, scores
+        order, best = top_k(scores[np.newaxis, :], k)
+        return ids[order[0]], best[0]
@@ -0,0 +1,170 @@
+import json
+import os
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+
+from src.config import logger
+from src.search.index import normalize_rows, top_k
+
+StorageType = Literal["float32", "float16", "int8"]
+
+# Rows scored per step when scanning the store, to bound temporary memory
+_SCAN_CHUNK = 65_536
+
+
+def _replace(target: Path, write: Callable[[Any], object]) -> None:
+    """Writes a file through 'write(file)' under a temporary name, then renames it over 'target'."""
+    tmp = target.with_name(f".{target.name}.tmp")
+    with tmp.open("wb") as f:
+        write(f)
+    os.replace(tmp, target)
+
+
+class EmbeddingStore:
+    """
+    Read-only, memory-mapped store of unit-normalized document embeddings.
+
+    Vectors are kept as float32, float16 or int8 (with one float32 scale per
+    vector) and are scored directly in that form. The files are opened
+    read-only with 'np.memmap', so worker processes on one host share the same
+    page-cache pages instead of each loading a copy.
+
+    Optionally the full-precision vectors are stored alongside ('keep_exact')
+    and used to re-rank the top candidates of a compressed scan.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        self.count: int = meta["count"]
+        self.dim: int = meta["dim"]
+        self.storage: StorageType = meta["storage"]
+
+        self.vectors = np.memmap(
+            self.path / f"vectors.{self.storage}",
+            dtype=self.storage,
+            mode="r",
+            shape=(self.count, self.dim),
+        )
+        self.scales: np.ndarray | None = None
+        if self.storage == "int8":
+            self.scales = np.load(self.path / "scales.npy", mmap_mode="r")
+
+        self.exact: np.ndarray | None = None
+        if meta.get("has_exact"):
+            self.exact = np.memmap(
+                self.path / "exact.float32",
+                dtype=np.float32,
+                mode="r",
+                shape=(self.count, self.dim),
+            )
+
+    def __len__(self) -> int:
+        return self.count
+
+    @classmethod
+    def write(
+        cls,
+        path: str | Path,
+        vectors: np.ndarray,
+        storage: StorageType = "float16",
+        keep_exact: bool = False,
+    ) -> "EmbeddingStore":
+        """
+        Normalize, quantize and write vectors to 'path', then open the store.
+
+        Each file is written under a temporary name and renamed into place,
+        'meta.json' last, so processes that have the previous files mapped
+        keep reading them intact.
+
+        Args:
+            path: Directory for the store files (created if missing).
+            vectors: (n, dim) embedding matrix.
+            storage: On-disk element type used for scanning.
+            keep_exact: Also write float32 vectors for re-ranking.
+
+        Raises:
+            ValueError: 'vectors' is empty or not a matrix.
+
+        """
+        if np.ndim(vectors) != 2 or len(vectors) == 0:
+            msg = f"Expected a non-empty (n, dim) matrix, got shape {np.shape(vectors)}"
+            raise ValueError(msg)
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        unit = normalize_rows(vectors)
+
+        if storage == "int8":
+            scales = np.abs(unit).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(unit / scales[:, np.newaxis]).astype(np.int8)
+            _replace(path / "scales.npy", lambda f: np.save(f, scales.astype(np.float32)))
+        else:
+            quantized = unit.astype(storage)
+
+        _replace(path / f"vectors.{storage}", quantized.tofile)
+        if keep_exact and storage != "float32":
+            _replace(path / "exact.float32", unit.tofile)
+
+        meta = {
+            "count": len(unit),
+            "dim": unit.shape[1],
+            "storage": storage,
+            "has_exact": keep_exact and storage != "float32",
+        }
+        _replace(path / "meta.json", lambda f: f.write(json.dumps(meta).encode()))
+        logger.info("Wrote %d vectors to %s as %s.", len(unit), path, storage)
+        return cls(path)
+
+    def _score(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        chunk = np.asarray(self.vectors[start:end], dtype=np.float32)
+        scores = queries @ chunk.T
+        if self.scales is not None:
+            scores *= self.scales[start:end]
+        return scores
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 5,
+        rerank: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k most similar documents for each query.
+
+        Args:
+            queries: One query vector (dim,) or a batch (n_queries, dim).
+            k: Number of results per query.
+            rerank: If set (and exact vectors were stored), keep this many
+                candidates from the compressed scan and re-score them exactly.
+
+        Returns:
+            Tuple of (document indices, cosine scores), each shaped (n_queries, k).
+
+        """
+        queries = normalize_rows(queries)
+        use_exact = rerank is not None and self.exact is not None
+        pool = max(k, rerank or 0) if use_exact else k
+
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        # Scan in chunks and keep a running top-'pool' per query
+        for start in range(0, self.count, _SCAN_CHUNK):
+            end = min(start + _SCAN_CHUNK, self.count)
+            ids, scores = top_k(self._score(queries, start, end), pool)
+            merged_ids = np.concatenate([best_ids, ids + start], axis=1)
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            order, best_scores = top_k(merged_scores, pool)
+            best_ids = np.take_along_axis(merged_ids, order, axis=1)
+
+        if not use_exact:
+            return best_ids, best_scores
+
+        assert self.exact is not None
+        exact_scores = np.einsum("qd,qcd->qc", queries, self.exact[best_ids])
+        order, scores = top_k(exact_scores, k)
+        return np.take_along_axis(best_ids, order, axis=1), scores
@@ -0,0 +1,441 @@
+import json
+import re
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator, Sequence
+from typing import Any, cast
+
+from src.config import logger
+
+# Location of a value in the document: object keys and array indexes from the root
+Path = tuple[str | int, ...]
+# Path pattern for 'StructuredStream(select=...)'; None matches any key or index
+PathPattern = Sequence[str | int | None]
+
+_NON_WHITESPACE = re.compile(r"[^ \t\n\r]")
+# String contents up to the closing quote (or a trailing lone backslash)
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_NUMBER_CHARS = re.compile(r"[-+.\deE]*")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+# Parser states: what the innermost open container expects next
+_VALUE, _VALUE_OR_END, _KEY, _KEY_OR_END, _COLON, _COMMA_OR_END = range(6)
+
+_JSON_TYPES: dict[str, tuple[type, ...]] = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+class StructuredOutputError(ValueError):
+    """The streamed output is not valid JSON or does not match the schema."""
+
+
+class _Frame:
+    __slots__ = ("container", "key", "state")
+
+    def __init__(self, container: dict[str, Any] | list[Any]) -> None:
+        self.container = container
+        self.key: str | None = None
+        self.state = _KEY_OR_END if isinstance(container, dict) else _VALUE_OR_END
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON document fed in arbitrary pieces (e.g. streamed completion deltas).
+
+    'feed' returns every value that was completed by the new piece, innermost
+    first, together with its path: a field as soon as its value closes, an
+    array element as soon as it closes, and finally the root. Only the
+    unfinished tail of the input is buffered.
+
+    With 'lenient=True' text before the first '{' or '[' and after the root
+    value (such as Markdown code fences around the JSON) is ignored.
+    """
+
+    def __init__(self, lenient: bool = True) -> None:
+        self.lenient = lenient
+        self.done = False
+        self.value: Any = None
+        self._buffer = ""
+        self._offset = 0  # input characters consumed before '_buffer'
+        self._frames: list[_Frame] = []
+        self._started = False
+        # Unfinished string: absolute offset of its opening quote and how far it was scanned
+        self._string_start = -1
+        self._string_scanned = 0
+        # Pieces of the unfinished string not yet added to '_buffer', and whether they end inside an escape
+        self._pending: list[str] = []
+        self._pending_escaped = False
+
+    def _error(self, message: str, pos: int) -> StructuredOutputError:
+        return StructuredOutputError(f"{message} at offset {self._offset + pos}")
+
+    def _path(self) -> Path:
+        """Path of the value currently being completed."""
+        return tuple(
+            cast(str, frame.key) if isinstance(frame.container, dict) else len(frame.container)
+            for frame in self._frames
+        )
+
+    def _complete(self, value: Any, events: list[tuple[Path, Any]]) -> None:
+        events.append((self._path(), value))
+        if not self._frames:
+            self.done, self.value = True, value
+            return
+        parent = self._frames[-1]
+        if isinstance(parent.container, dict):
+            parent.container[cast(str, parent.key)] = value
+        else:
+            parent.container.append(value)
+        parent.state = _COMMA_OR_END
+
+    def _string(self, buffer: str, pos: int) -> tuple[str, int] | None:
+        """
+        Reads a string starting at 'pos'.
+
+        An unfinished string is only scanned past the part seen by earlier
+        calls, so long values arriving in small pieces cost linear time.
+
+        Returns:
+            Tuple of (value, end position), or None if more input is needed.
+
+        """
+        start = self._offset + pos
+        resume = self._string_scanned - self._offset if start == self._string_start else pos + 1
+        end = _STRING_BODY.match(buffer, resume).end()  # pyright: ignore[reportOptionalMemberAccess]
+        if end == len(buffer) or buffer[end] != '"':
+            # Resume at 'end': never inside an escape sequence
+            self._string_start, self._string_scanned = start, self._offset + end
+            self._pending_escaped = end < len(buffer)
+            return None
+        self._string_start = -1
+        return json.loads(buffer[pos : end + 1]), end + 1
+
+    def _scalar(self, buffer: str, pos: int, final: bool) -> tuple[Any, int] | None:
+        """
+        Reads a string, number or literal at 'pos'.
+
+        Returns:
+            Tuple of (value, end position), or None if more input is needed.
+
+        """
+        char = buffer[pos]
+        if char == '"':
+            return self._string(buffer, pos)
+        if char == "-" or char.isdigit():
+            # A number at the end of the input may still continue ('1' -> '1.5e3')
+            partial = _NUMBER_CHARS.match(buffer, pos)
+            if not final and partial is not None and partial.end() == len(buffer):
+                return None
+            match = _NUMBER.match(buffer, pos)
+            if match is None:
+                raise self._error("Invalid number", pos)
+            return json.loads(match.group()), match.end()
+        for literal, value in _LITERALS.items():
+            if buffer.startswith(literal, pos):
+                return value, pos + len(literal)
+            if not final and literal.startswith(buffer[pos:]):
+                return None
+        raise self._error(f"Unexpected character {char!r}", pos)
+
+    def _parse(self, final: bool) -> list[tuple[Path, Any]]:
+        events: list[tuple[Path, Any]] = []
+        buffer, pos = self._buffer, 0
+        while True:
+            token = _NON_WHITESPACE.search(buffer, pos)
+            if token is None:
+                pos = len(buffer)
+                break
+            pos = token.start()
+            if self.done:
+                if not self.lenient:
+                    raise self._error("Unexpected data after the JSON value", pos)
+                pos = len(buffer)
+                break
+            if not self._started and self.lenient:
+                starts = [i for i in (buffer.find("{", pos), buffer.find("[", pos)) if i >= 0]
+                if not starts:
+                    pos = len(buffer)
+                    break
+                pos = min(starts)
+            self._started = True
+
+            char = buffer[pos]
+            state = self._frames[-1].state if self._frames else _VALUE
+            if state in (_VALUE, _VALUE_OR_END):
+                if char == "]" and state == _VALUE_OR_END:
+                    pos += 1
+                    self._complete(self._frames.pop().container, events)
+                elif char in "{[":
+                    pos += 1
+                    self._frames.append(_Frame({} if char == "{" else []))
+                else:
+                    scalar = self._scalar(buffer, pos, final)
+                    if scalar is None:
+                        break
+                    value, pos = scalar
+                    self._complete(value, events)
+            elif state in (_KEY, _KEY_OR_END):
+                if char == "}" and state == _KEY_OR_END:
+                    pos += 1
+                    self._complete(self._frames.pop().container, events)
+                    continue
+                if char != '"':
+                    raise self._error("Expected an object key", pos)
+                key = self._string(buffer, pos)
+                if key is None:
+                    break
+                self._frames[-1].key, pos = key
+                self._frames[-1].state = _COLON
+            elif state == _COLON:
+                if char != ":":
+                    raise self._error("Expected ':'", pos)
+                pos += 1
+                self._frames[-1].state = _VALUE
+            else:
+                frame = self._frames[-1]
+                is_object = isinstance(frame.container, dict)
+                if char == ",":
+                    frame.state = _KEY if is_object else _VALUE
+                elif char == ("}" if is_object else "]"):
+                    self._frames.pop()
+                    self._complete(frame.container, events)
+                else:
+                    raise self._error("Expected ',' or the end of the container", pos)
+                pos += 1
+
+        self._buffer = buffer[pos:]
+        self._offset += pos
+        return events
+
+    def feed(self, chunk: str) -> list[tuple[Path, Any]]:
+        """
+        Adds the next piece of input.
+
+        Returns:
+            (path, value) of every value completed by this piece, innermost first.
+
+        Raises:
+            StructuredOutputError: The input is not valid JSON.
+
+        """
+        if self._string_start >= 0 and not self._closes_string(chunk):
+            # Joining every piece into the buffer would copy a long string once per piece
+            self._pending.append(chunk)
+            return []
+        self._join_pending(chunk)
+        return self._parse(final=False)
+
+    def _closes_string(self, chunk: str) -> bool:
+        """Whether 'chunk' contains the closing quote of the unfinished string."""
+        start = 1 if self._pending_escaped and chunk else 0
+        end = _STRING_BODY.match(chunk, start).end()  # pyright: ignore[reportOptionalMemberAccess]
+        if end < len(chunk) and chunk[end] == '"':
+            return True
+        if chunk:
+            self._pending_escaped = end < len(chunk)
+        return False
+
+    def _join_pending(self, chunk: str = "") -> None:
+        self._buffer = "".join([self._buffer, *self._pending, chunk])
+        self._pending.clear()
+
+    def close(self) -> list[tuple[Path, Any]]:
+        """
+        Ends the input (completing a trailing top-level number).
+
+        Raises:
+            StructuredOutputError: The document is incomplete.
+
+        """
+        self._join_pending()
+        events = self._parse(final=True)
+        if not self.done:
+            raise StructuredOutputError(f"Incomplete JSON: input ended at offset {self._offset}")
+        return events
+
+
+def subschema(schema: dict[str, Any], path: Path) -> dict[str, Any]:
+    """Schema of the value at 'path' ({} if the schema does not constrain it)."""
+    for step in path:
+        if isinstance(step, int):
+            items = schema.get("items", {})
+            schema = (items[step] if step < len(items) else {}) if isinstance(items, list) else items
+        else:
+            properties = schema.get("properties", {})
+            if step in properties:
+                schema = properties[step]
+            else:
+                extra = schema.get("additionalProperties", {})
+                schema = extra if isinstance(extra, dict) else {}
+    return schema
+
+
+def _matches_type(value: Any, type_name: str) -> bool:
+    # bool is an int subclass in Python, but not a JSON number
+    if isinstance(value, bool) and type_name in ("integer", "number"):
+        return False
+    return isinstance(value, _JSON_TYPES.get(type_name, object))
+
+
+def validate(value: Any, schema: dict[str, Any], path: Path = (), deep: bool = True) -> list[str]:
+    """
+    Checks a value against a JSON Schema (the commonly used subset).
+
+    Supported: type, enum, const, properties, required, additionalProperties,
+    items, anyOf, min/maxLength, minimum/maximum, min/maxItems.
+
+    Args:
+        value: Decoded JSON value.
+        schema: JSON Schema of the value.
+        path: Path of the value, used in messages.
+        deep: Also check nested values (False checks only this level, for
+            values whose children were already validated as they completed).
+
+    Returns:
+        Error messages; empty if the value is valid.
+
+    """
+    where = "/".join(map(str, path)) or "<root>"
+    if "anyOf" in schema:
+        if not any(not validate(value, option, path) for option in schema["anyOf"]):
+            return [f"{where}: does not match any allowed schema"]
+
+    expected = schema.get("type")
+    if expected is not None:
+        types = [expected] if isinstance(expected, str) else expected
+        if not any(_matches_type(value, t) for t in types):
+            return [f"{where}: expected {' or '.join(types)}, got {type(value).__name__}"]
+
+    errors: list[str] = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{where}: {value!r} is not one of {schema['enum']}")
+    if "const" in schema and value != schema["const"]:
+        errors.append(f"{where}: expected {schema['const']!r}")
+
+    if isinstance(value, str):
+        if len(value) < schema.get("minLength", 0):
+            errors.append(f"{where}: shorter than {schema['minLength']} characters")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append(f"{where}: longer than {schema['maxLength']} characters")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{where}: less than {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{where}: greater than {schema['maximum']}")
+    elif isinstance(value, dict):
+        missing = [key for key in schema.get("required", []) if key not in value]
+        if missing:
+            errors.append(f"{where}: missing required {', '.join(missing)}")
+        if schema.get("additionalProperties") is False:
+            extra = [key for key in value if key not in schema.get("properties", {})]
+            if extra:
+                errors.append(f"{where}: unexpected {', '.join(extra)}")
+        if deep:
+            for key, item in value.items():
+                errors.extend(validate(item, subschema(schema, (key,)), (*path, key)))
+    elif isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{where}: fewer than {schema['minItems']} items")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{where}: more than {schema['maxItems']} items")
+        if deep:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, subschema(schema, (i,)), (*path, i)))
+    return errors
+
+
+def _selected(pattern: PathPattern, path: Path) -> bool:
+    return len(pattern) == len(path) and all(p is None or p == step for p, step in zip(pattern, path, strict=True))
+
+
+class StructuredStream:
+    """
+    Turns a streamed JSON completion into values that are usable as soon as they close.
+
+    Values whose path matches 'select' are emitted while the rest of the
+    document is still being generated, e.g. each record of a long extraction:
+
+        stream = StructuredStream(schema, select=("records", None))
+        for path, record in stream.iter(client.stream_json(...)):
+            handle(record)
+
+    With 'strict=True' every completed value is checked against the schema
+    (only its own level, children were checked when they closed), so the
+    first violation raises 'StructuredOutputError' immediately. Otherwise
+    selected values that fail validation are logged and skipped.
+    """
+
+    def __init__(
+        self,
+        schema: dict[str, Any] | None = None,
+        select: PathPattern = (None,),
+        strict: bool = True,
+    ) -> None:
+        """
+        Args:
+            schema: JSON Schema of the whole document (None skips validation).
+            select: Path pattern of the values to emit; None matches any key or
+                index. The default emits the top-level fields or array elements.
+            strict: Raise on the first schema violation instead of skipping invalid values.
+
+        """
+        self.schema = schema
+        self.select = tuple(select)
+        self.strict = strict
+        self.parser = IncrementalJSONParser()
+
+    @property
+    def value(self) -> Any:
+        """The complete document (once the stream has ended)."""
+        return self.parser.value
+
+    def _filter(self, events: list[tuple[Path, Any]]) -> list[tuple[Path, Any]]:
+        selected = []
+        for path, value in events:
+            if self.schema is not None and self.strict:
+                errors = validate(value, subschema(self.schema, path), path, deep=False)
+                if errors:
+                    raise StructuredOutputError("; ".join(errors))
+            if not _selected(self.select, path):
+                continue
+            if self.schema is not None and not self.strict:
+                errors = validate(value, subschema(self.schema, path), path)
+                if errors:
+                    logger.warning("Skipping invalid structured output: %s", "; ".join(errors))
+                    continue
+            selected.append((path, value))
+        return selected
+
+    def feed(self, delta: str) -> list[tuple[Path, Any]]:
+        """(path, value) of the selected values completed by 'delta'."""
+        return self._filter(self.parser.feed(delta))
+
+    def close(self) -> list[tuple[Path, Any]]:
+        """
+        Ends the stream.
+
+        Raises:
+            StructuredOutputError: The output was cut off or is invalid.
+
+        """
+        return self._filter(self.parser.close())
+
+    def iter(self, deltas: Iterable[str]) -> Iterator[tuple[Path, Any]]:
+        """Feeds text deltas and yields selected values as they complete."""
+        for delta in deltas:
+            yield from self.feed(delta)
+        yield from self.close()
+
+    async def aiter(self, deltas: AsyncIterable[str]) -> AsyncIterator[tuple[Path, Any]]:
+        """Async counterpart of 'iter'."""
+        async for delta in deltas:
+            for item in self.feed(delta):
+                yield item
+        for item in self.close():
+            yield item
@@ -0,0 +1,392 @@
+"""
+Local stand-in for the Yandex Foundation Models API.
+
+Lets the clients be exercised without network access or quota. Run it with
+'python -m src.testing.mock_server' and point the clients at it through the
+YC_*_URL environment variables printed on startup, or start it in-process
+with 'MockYandexServer().start()'.
+
+Served endpoints:
+    POST /foundationModels/v1/completion       native completion (incl. streaming)
+    POST /foundationModels/v1/completionAsync  deferred completion
+    GET  /operations/<id>                      deferred operation status
+    POST /foundationModels/v1/tokenize         token count of a text
+    POST /v1/chat/completions                  OpenAI-compatible chat (incl. SSE streaming)
+    POST /v1/embeddings                        OpenAI-compatible embeddings
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Literal
+
+
+@dataclass
+class MockBehavior:
+    """
+    Simulated server characteristics. Can be changed while the server runs.
+
+    Latency is drawn per request from the chosen distribution around
+    'latency_mean' seconds ('latency_spread' is the uniform half-width or the
+    log-normal sigma). 'error_rate' and 'throttle_rate' are probabilities of
+    answering 500 and 429 (with Retry-After) respectively.
+    """
+
+    latency_mean: float = 0.05
+    latency_spread: float = 0.0
+    distribution: Literal["constant", "uniform", "lognormal"] = "constant"
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    stream_chunks: int = 5
+    operation_delay: float = 0.5
+    embedding_dim: int = 256
+
+    def sample_latency(self) -> float:
+        if self.distribution == "uniform":
+            low, high = self.latency_mean - self.latency_spread, self.latency_mean + self.latency_spread
+            return max(0.0, random.uniform(low, high))
+        if self.distribution == "lognormal" and self.latency_mean > 0:
+            # Parameterized so the median equals latency_mean
+            return random.lognormvariate(0.0, self.latency_spread) * self.latency_mean
+        return self.latency_mean
+
+
+def _reply_text(messages: list[dict[str, Any]]) -> str:
+    # Deterministic echo so callers can match answers to prompts
+    prompt = messages[-1].get("text") or messages[-1].get("content") or ""
+    return f"Echo: {prompt}"
+
+
+def _token_count(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _native_result(text: str, final: bool = True) -> dict[str, Any]:
+    tokens = _token_count(text)
+    status = "ALTERNATIVE_STATUS_FINAL" if final else "ALTERNATIVE_STATUS_PARTIAL"
+    return {
+        "alternatives": [{"message": {"role": "assistant", "text": text}, "status": status}],
+        "usage": {"inputTextTokens": str(tokens), "completionTokens": str(tokens), "totalTokens": str(2 * tokens)},
+        "modelVersion": "mock",
+    }
+
+
+def _chat_response(model: str, text: str) -> dict[str, Any]:
+    tokens = _token_count(text)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}},
+        ],
+        "usage": {"prompt_tokens": tokens, "completion_tokens": tokens, "total_tokens": 2 * tokens},
+    }
+
+
+def _fake_embedding(text: str, dim: int) -> list[float]:
+    # Stable pseudo-random vector per text
+    rng = random.Random(hashlib.blake2b(text.encode(), digest_size=8).digest())
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+def _split(text: str, chunks: int) -> list[str]:
+    step = max(1, -(-len(text) // max(chunks, 1)))
+    return [text[i : i + step] for i in range(0, len(text), step)] or [""]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_MockHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass  # Keep test output quiet
+
+    # --- Low-level helpers ---
+
+    def _send_json(self, status: int, body: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_json(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _inject_failure(self) -> bool:
+        """Apply simulated latency/errors. Returns True if an error was sent."""
+        behavior = self.server.behavior
+        roll = random.random()
+        if roll < behavior.throttle_rate:
+            self._send_json(429, {"error": "Too many requests"}, {"Retry-After": str(behavior.retry_after)})
+            return True
+        if roll < behavior.throttle_rate + behavior.error_rate:
+            self._send_json(500, {"error": "Internal error"})
+            return True
+        return False
+
+    # --- Routing ---
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = self._read_json()
+        behavior = self.server.behavior
+        latency = behavior.sample_latency()
+        streaming = body.get("stream") or body.get("completionOptions", {}).get("stream")
+
+        # Streaming spreads the latency over the chunks instead
+        if not streaming:
+            time.sleep(latency)
+        if self._inject_failure():
+            return
+
+        if self.path.endswith("/completion"):
+            self._native_completion(body, latency if streaming else 0.0)
+        elif self.path.endswith("/tokenize"):
+            tokens = [{"id": str(i), "text": "", "special": False} for i in range(_token_count(body["text"]))]
+            self._send_json(200, {"tokens": tokens, "modelVersion": "mock"})
+        elif self.path.endswith("/completionAsync"):
+            self._send_json(200, self.server.create_operation(_reply_text(body["messages"])))
+        elif self.path.endswith("/chat/completions"):
+            self._chat_completion(body, latency if streaming else 0.0)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.startswith("/operations/"):
+            operation = self.server.get_operation(self.path.rsplit("/", 1)[-1])
+            if operation is None:
+                self._send_json(404, {"code": 5, "message": "Operation not found"})
+            else:
+                self._send_json(200, operation)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    # --- Endpoints ---
+
+    def _native_completion(self, body: dict[str, Any], stream_latency: float) -> None:
+        text = _reply_text(body["messages"])
+        if not body.get("completionOptions", {}).get("stream"):
+            self._send_json(200, {"result": _native_result(text)})
+            return
+
+        # Native streaming: newline-delimited JSON, each chunk carries the text so far
+        parts = _split(text, self.server.behavior.stream_chunks)
+        self._start_chunked("application/json")
+        sent = ""
+        for i, part in enumerate(parts):
+            time.sleep(stream_latency / len(parts))
+            sent += part
+            chunk = {"result": _native_result(sent, final=i == len(parts) - 1)}
+            self._write_chunk(json.dumps(chunk).encode() + b"\n")
+        self._end_chunked()
+
+    def _chat_completion(self, body: dict[str, Any], stream_latency: float) -> None:
+        text = _reply_text(body["messages"])
+        model = body.get("model", "mock")
+        if not body.get("stream"):
+            self._send_json(200, _chat_response(model, text))
+            return
+
+        # OpenAI-style server-sent events with content deltas
+        parts = _split(text, self.server.behavior.stream_chunks)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        self._start_chunked("text/event-stream")
+        for i, part in enumerate(parts):
+            time.sleep(stream_latency / len(parts))
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": part} if i == 0 else {"content": part},
+                        "finish_reason": "stop" if i == len(parts) - 1 else None,
+                    },
+                ],
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunked()
+
+    def _embeddings(self, body: dict[str, Any]) -> None:
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = self.server.behavior.embedding_dim
+        data = []
+        for i, text in enumerate(inputs):
+            vector = _fake_embedding(str(text), dim)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(struct.pack(f"<{dim}f", *vector)).decode()
+            else:
+                embedding = vector
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(_token_count(str(t)) for t in inputs)
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "mock"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: tuple[str, int], behavior: MockBehavior) -> None:
+        super().__init__(address, _Handler)
+        self.behavior = behavior
+        self._operations: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def create_operation(self, text: str) -> dict[str, Any]:
+        op_id = uuid.uuid4().hex
+        with self._lock:
+            self._operations[op_id] = (time.monotonic() + self.behavior.operation_delay, text)
+        return {"id": op_id, "done": False, "description": "Async GPT Completion"}
+
+    def get_operation(self, op_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            item = self._operations.get(op_id)
+        if item is None:
+            return None
+        ready_at, text = item
+        if time.monotonic() < ready_at:
+            return {"id": op_id, "done": False}
+        return {"id": op_id, "done": True, "response": _native_result(text)}
+
+
+class MockYandexServer:
+    """
+    In-process mock server running on a background thread.
+
+    Args:
+        host: Interface to bind.
+        port: Port to bind (0 picks a free one).
+        operation_delay: Seconds before a deferred operation reports done
+            (shortcut for 'behavior.operation_delay').
+        behavior: Latency/error profile; defaults to a fast, error-free server.
+
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        operation_delay: float | None = None,
+        behavior: MockBehavior | None = None,
+    ) -> None:
+        behavior = behavior or MockBehavior()
+        if operation_delay is not None:
+            behavior.operation_delay = operation_delay
+        self._server = _MockHTTPServer((host, port), behavior)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def behavior(self) -> MockBehavior:
+        return self._server.behavior
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict[str, str]:
+        """Environment variables that point 'AppConfig.from_env' at this server."""
+        return {
+            "YC_NATIVE_API_URL": f"{self.url}/foundationModels/v1/completion",
+            "YC_NATIVE_ASYNC_API_URL": f"{self.url}/foundationModels/v1/completionAsync",
+            "YC_OPERATIONS_API_URL": f"{self.url}/operations",
+            "YC_TOKENIZE_API_URL": f"{self.url}/foundationModels/v1/tokenize",
+            "YC_OPENAI_BASE_URL": f"{self.url}/v1",
+        }
+
+    def start(self) -> "MockYandexServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve on the calling thread (blocks until interrupted)."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockYandexServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the YandexGPT API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean (or median) latency in seconds.")
+    parser.add_argument("--latency-spread", type=float, default=0.0)
+    parser.add_argument("--distribution", choices=["constant", "uniform", "lognormal"], default="constant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 500 response.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of a 429 response.")
+    parser.add_argument("--operation-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    behavior = MockBehavior(
+        latency_mean=args.latency,
+        latency_spread=args.latency_spread,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        operation_delay=args.operation_delay,
+    )
+    server = MockYandexServer(args.host, args.port, behavior=behavior)
+    for name, value in server.env().items():
+        print(f"{name}={value}", flush=True)
+    # Blank line marks the end of the environment block
+    print(flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import asyncio
+import functools
+import json
+import re
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from src.config import config, logger
+
+# Average characters per token for plain words; the YandexGPT tokenizer
+# splits Cyrillic words into slightly shorter pieces than Latin ones
+LATIN_CHARS_PER_TOKEN = 4.0
+CYRILLIC_CHARS_PER_TOKEN = 3.0
+# Role markers and separators added around every message
+MESSAGE_OVERHEAD = 4
+
+# Words, digit runs, and single other (punctuation) characters
+_PIECES = re.compile(r"[^\W\d_]+|\d+|\S")
+_CYRILLIC = re.compile(r"[\u0400-\u04ff]")
+
+# Messages use 'content' (OpenAI-compatible API) or 'text' (native API)
+Message = dict[str, Any]
+Summarizer = Callable[[list[Message]], str | Awaitable[str]]
+
+
+@functools.lru_cache(maxsize=8192)
+def _raw_estimate(text: str) -> float:
+    """Uncalibrated token estimate for one text (cached, since history is re-counted every turn)."""
+    tokens = 0.0
+    for piece in _PIECES.findall(text):
+        if piece.isdigit():
+            tokens += -(-len(piece) // 3)
+        elif piece.isalpha():
+            per_token = CYRILLIC_CHARS_PER_TOKEN if _CYRILLIC.match(piece) else LATIN_CHARS_PER_TOKEN
+            tokens += max(1.0, len(piece) / per_token)
+        else:
+            tokens += 1
+    return tokens
+
+
+def message_text(message: Message) -> str:
+    """All text of a message that the model sees: content plus any tool call arguments."""
+    content = message.get("content") or message.get("text") or ""
+    if isinstance(content, list):
+        # Content parts of the OpenAI format ({"type": "text", "text": ...})
+        content = " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    tool_calls = message.get("tool_calls") or message.get("toolCallList")
+    return f"{content} {json.dumps(tool_calls, default=str)}" if tool_calls else str(content)
+
+
+class TokenCounter:
+    """
+    Fast local token estimator, optionally calibrated against the real tokenizer.
+
+    'calibrate' compares estimates with exact counts (e.g. from
+    'YandexNativeClient.count_tokens') and scales later estimates accordingly.
+    """
+
+    def __init__(self, scale: float = 1.0) -> None:
+        self.scale = scale
+
+    def count(self, text: str) -> int:
+        return round(_raw_estimate(text) * self.scale) if text else 0
+
+    def count_messages(self, messages: Iterable[Message]) -> int:
+        return sum(self.count(message_text(m)) + MESSAGE_OVERHEAD for m in messages)
+
+    def calibrate(self, samples: Iterable[str], tokenize: Callable[[str], int]) -> float:
+        """
+        Fits the scale factor to exact token counts.
+
+        Args:
+            samples: Representative texts (a few dozen is enough).
+            tokenize: Returns the exact token count of a text.
+
+        Returns:
+            The new scale factor.
+
+        """
+        estimated = exact = 0.0
+        for text in samples:
+            estimated += _raw_estimate(text)
+            exact += tokenize(text)
+        if estimated > 0 and exact > 0:
+            self.scale = exact / estimated
+            logger.info("Token estimator calibrated: scale %.3f.", self.scale)
+        return self.scale
+
+
+# Process-wide default estimator
+token_counter = TokenCounter()
+
+
+class ContextOverflowError(ValueError):
+    """The messages that must be kept do not fit the context window."""
+
+
+@dataclass
+class FittedRequest:
+    """Messages trimmed to the budget and the completion size that still fits."""
+
+    messages: list[Message]
+    max_tokens: int
+    prompt_tokens: int
+    dropped: list[Message] = field(default_factory=list)
+    summarized: bool = False
+
+
+class ContextBudget:
+    """
+    Keeps chat requests within the model's context window.
+
+    System messages at the start and the latest turn (the last user message
+    and anything after it) are always kept. Older turns are dropped oldest
+    first until the prompt leaves room for at least 'min_completion_tokens';
+    with a 'summarizer' they are replaced by a single summary message instead.
+    'max_tokens' of the request is then set from what remains, capped at
+    'max_completion_tokens'.
+    """
+
+    def __init__(
+        self,
+        context_window: int = 32_000,
+        max_completion_tokens: int | None = None,
+        min_completion_tokens: int = 256,
+        counter: TokenCounter | None = None,
+        summarizer: Summarizer | None = None,
+    ) -> None:
+        """
+        Args:
+            context_window: Total tokens (prompt + completion) the model accepts.
+            max_completion_tokens: Upper bound for 'max_tokens' (defaults to 'config.max_tokens').
+            min_completion_tokens: Completion room that trimming must leave.
+            counter: Token estimator (defaults to the shared 'token_counter').
+            summarizer: Optional callable (sync or async) that condenses dropped
+                messages into a short text, e.g. with a cheaper model.
+
+        """
+        self.context_window = context_window
+        self.max_completion_tokens = max_completion_tokens
+        self.min_completion_tokens = min_completion_tokens
+        self.counter = counter or token_counter
+        self.summarizer = summarizer
+
+    @property
+    def prompt_budget(self) -> int:
+        return self.context_window - self.min_completion_tokens
+
+    @staticmethod
+    def _split(messages: list[Message]) -> tuple[list[Message], list[list[Message]], list[Message]]:
+        """
+        Splits the history into leading system messages, droppable turns and the latest turn.
+
+        A turn starts at a user message, so assistant tool calls stay together
+        with their tool results.
+        """
+        start = 0
+        while start < len(messages) and messages[start].get("role") == "system":
+            start += 1
+        last_user = max(
+            (i for i in range(start, len(messages)) if messages[i].get("role") == "user"),
+            default=len(messages) - 1,
+        )
+        last_user = max(last_user, start)
+
+        turns: list[list[Message]] = []
+        for message in messages[start:last_user]:
+            if message.get("role") == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return messages[:start], turns, messages[last_user:]
+
+    def _trim(self, messages: list[Message]) -> tuple[list[Message], list[Message], int]:
+        """
+        Drops the oldest turns until the prompt fits.
+
+        Returns:
+            Tuple of (kept messages, dropped messages, kept tokens).
+
+        """
+        head, turns, tail = self._split(messages)
+        fixed = self.counter.count_messages(head) + self.counter.count_messages(tail)
+        turn_tokens = [self.counter.count_messages(turn) for turn in turns]
+        total = fixed + sum(turn_tokens)
+
+        first_kept = 0
+        while total > self.prompt_budget and first_kept < len(turns):
+            total -= turn_tokens[first_kept]
+            first_kept += 1
+
+        dropped = [m for turn in turns[:first_kept] for m in turn]
+        kept = [m for turn in turns[first_kept:] for m in turn]
+        return head + kept + tail, dropped, total
+
+    def _summary_message(self, messages: list[Message], summary: str) -> Message:
+        key = "text" if "text" in messages[-1] else "content"
+        return {"role": "system", key: f"Summary of the earlier conversation: {summary}"}
+
+    def _finish(self, messages: list[Message], dropped: list[Message], prompt_tokens: int) -> FittedRequest:
+        if prompt_tokens > self.prompt_budget:
+            raise ContextOverflowError(
+                f"Prompt needs ~{prompt_tokens} tokens but only {self.prompt_budget} fit "
+                f"(context window {self.context_window}, {self.min_completion_tokens} reserved for the answer).",
+            )
+        cap = self.max_completion_tokens if self.max_completion_tokens is not None else config.max_tokens
+        max_tokens = min(cap, self.context_window - prompt_tokens)
+        if dropped:
+            logger.info("Dropped %d old messages to fit the context budget.", len(dropped))
+        return FittedRequest(messages=messages, max_tokens=max_tokens, prompt_tokens=prompt_tokens, dropped=dropped)
+
+    def _with_summary(
+        self,
+        kept: list[Message],
+        dropped: list[Message],
+        tokens: int,
+        summary: str,
+    ) -> FittedRequest | None:
+        """
+        Inserts the summary of the dropped turns after the system prompt.
+
+        The summary only takes the room the dropped turns freed, so no further
+        turns are dropped for it; a longer one is cut to fit. None if not even
+        a short summary fits.
+        """
+        room = self.prompt_budget - tokens
+        summary_message = self._summary_message(kept, summary)
+        summary_tokens = self.counter.count_messages([summary_message])
+        while summary and summary_tokens > room:
+            # Strictly shorter each time, so this ends even where the estimate is not linear
+            cut = summary[: len(summary) * room // (summary_tokens + 1)]
+            summary = cut.rsplit(" ", 1)[0] if " " in cut else cut
+            summary_message = self._summary_message(kept, summary)
+            summary_tokens = self.counter.count_messages([summary_message])
+        if not summary:
+            return None
+        head_len = len(self._split(kept)[0])
+        fitted = self._finish(kept[:head_len] + [summary_message] + kept[head_len:], dropped, tokens + summary_tokens)
+        fitted.summarized = True
+        return fitted
+
+    def fit(self, messages: list[Message]) -> FittedRequest:
+        """
+        Trims (or summarizes) 'messages' to the budget.
+
+        Raises:
+            ContextOverflowError: Even the messages that must be kept are too long.
+
+        """
+        kept, dropped, tokens = self._trim(messages)
+        if dropped and self.summarizer is not None:
+            summary = self.summarizer(dropped)
+            if asyncio.iscoroutine(summary):
+                summary.close()
+                raise TypeError("Use 'afit' with an async summarizer.")
+            fitted = self._with_summary(kept, dropped, tokens, str(summary))
+            if fitted is not None:
+                return fitted
+        return self._finish(kept, dropped, tokens)
+
+    async def afit(self, messages: list[Message]) -> FittedRequest:
+        """Async counterpart of 'fit' (the summarizer may be sync or async)."""
+        kept, dropped, tokens = self._trim(messages)
+        if dropped and self.summarizer is not None:
+            summary = self.summarizer(dropped)
+            if asyncio.iscoroutine(summary):
+                summary = await summary
+            fitted = self._with_summary(kept, dropped, tokens, str(summary))
+            if fitted is not None:
+                return fitted
+        return self._finish(kept, dropped, tokens)
@@ -0,0 +1,284 @@
+import asyncio
+import enum
+import functools
+import inspect
+import json
+import re
+import types
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Literal, Union, get_args, get_origin, get_type_hints
+
+from src.clients.cache import MemoryTier
+from src.config import logger
+
+_JSON_TYPES: dict[type, str] = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _json_schema(annotation: Any) -> dict[str, Any]:
+    """Maps a Python type annotation to a JSON Schema fragment (unknown types map to {})."""
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin in (Union, types.UnionType):
+        # 'X | None' only affects 'required'; other unions are left unconstrained
+        non_null = [arg for arg in args if arg is not type(None)]
+        return _json_schema(non_null[0]) if len(non_null) == 1 else {}
+    if origin is Literal:
+        return {"type": _JSON_TYPES.get(type(args[0]), "string"), "enum": list(args)}
+    if origin in (list, tuple, set, frozenset):
+        return {"type": "array", "items": _json_schema(args[0]) if args else {}}
+    if origin is dict or annotation is dict:
+        return {"type": "object"}
+    if annotation in (list, tuple, set, frozenset):
+        return {"type": "array"}
+    if inspect.isclass(annotation) and issubclass(annotation, enum.Enum):
+        return {"type": "string", "enum": [member.value for member in annotation]}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    return {}
+
+
+def _parse_docstring(doc: str | None) -> tuple[str, dict[str, str]]:
+    """
+    Splits a Google-style docstring into its summary and per-argument descriptions.
+
+    Returns:
+        Tuple of (summary paragraph, {argument name: description}).
+
+    """
+    if not doc:
+        return "", {}
+    doc = inspect.cleandoc(doc)
+    summary = doc.split("\n\n", 1)[0].replace("\n", " ").strip()
+
+    params: dict[str, str] = {}
+    match = re.search(r"^Args:\s*\n((?:[ \t]+.*\n?)+)", doc, re.MULTILINE)
+    if match:
+        current = None
+        for line in match.group(1).splitlines():
+            entry = re.match(r"\s+(\w+)(?:\s*\(.*?\))?:\s*(.*)", line)
+            if entry and (current is None or len(line) - len(line.lstrip()) <= 4):
+                current = entry.group(1)
+                params[current] = entry.group(2).strip()
+            elif current is not None:
+                params[current] = f"{params[current]} {line.strip()}".strip()
+    return summary, params
+
+
+@dataclass
+class Tool:
+    """A registered tool: the callable, its generated schema and execution settings."""
+
+    name: str
+    func: Callable[..., Any]
+    schema: dict[str, Any]
+    timeout: float | None = None
+    cache: MemoryTier | None = None
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.func)
+
+
+def _format_result(result: Any) -> str:
+    """Tool results go back to the model as strings; other values are sent as JSON."""
+    return result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+
+
+def _error_result(message: str) -> str:
+    return json.dumps({"error": message}, ensure_ascii=False)
+
+
+class ToolRegistry:
+    """
+    Tools callable by the model, with schemas generated from function signatures.
+
+    Register functions with the 'tool' decorator, pass 'registry.schemas' as
+    'tools=' to the completion, then run the returned 'tool_calls' with
+    'run_tool_calls' (async) or 'call_tools' (sync). Independent calls of one
+    turn run concurrently, each bounded by its tool's timeout; failures and
+    timeouts are reported to the model as '{"error": ...}' results.
+
+    Timeouts stop waiting, but cannot interrupt a sync tool already running
+    in a worker thread.
+    """
+
+    def __init__(self, default_timeout: float | None = 30.0, max_workers: int = 8) -> None:
+        """
+        Args:
+            default_timeout: Per-call timeout in seconds for tools without their own (None = no limit).
+            max_workers: Threads used to run sync tools concurrently.
+
+        """
+        self.default_timeout = default_timeout
+        self._tools: dict[str, Tool] = {}
+        self._schemas: list[dict[str, Any]] | None = None
+        # Own pool rather than the loop's default one, so that a timed-out tool
+        # does not hold up 'asyncio.run' shutdown in 'call_tools'
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def tool(
+        self,
+        func: Callable[..., Any] | None = None,
+        *,
+        name: str | None = None,
+        description: str | None = None,
+        timeout: float | None = None,
+        cache_ttl: float | None = None,
+        cache_size: int = 256,
+    ) -> Any:
+        """
+        Registers a function as a tool (usable as '@registry.tool' or '@registry.tool(...)').
+
+        Parameter types come from annotations, descriptions from the docstring's
+        'Args:' section, and parameters without defaults are required.
+
+        Args:
+            func: The function (sync or async) when used without arguments.
+            name: Tool name (defaults to the function name).
+            description: Tool description (defaults to the docstring summary).
+            timeout: Per-call timeout in seconds (defaults to the registry's).
+            cache_ttl: Cache results per argument set for this many seconds
+                (only for tools whose result depends on the arguments alone).
+            cache_size: Maximum cached argument sets for this tool.
+
+        Returns:
+            The function itself, unchanged.
+
+        """
+
+        def register(fn: Callable[..., Any]) -> Callable[..., Any]:
+            tool_name = name or fn.__name__
+            self._tools[tool_name] = Tool(
+                name=tool_name,
+                func=fn,
+                schema=self._build_schema(fn, tool_name, description),
+                timeout=timeout if timeout is not None else self.default_timeout,
+                cache=MemoryTier(max_entries=cache_size, ttl=cache_ttl) if cache_ttl else None,
+            )
+            self._schemas = None
+            return fn
+
+        return register(func) if func is not None else register
+
+    @staticmethod
+    def _build_schema(fn: Callable[..., Any], name: str, description: str | None) -> dict[str, Any]:
+        summary, arg_docs = _parse_docstring(fn.__doc__)
+        hints = get_type_hints(fn)
+        properties: dict[str, Any] = {}
+        required: list[str] = []
+
+        for param in inspect.signature(fn).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            prop = _json_schema(hints.get(param.name, Any))
+            if param.name in arg_docs:
+                prop["description"] = arg_docs[param.name]
+            properties[param.name] = prop
+            if param.default is param.empty:
+                required.append(param.name)
+
+        return {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description or summary,
+                "parameters": {"type": "object", "properties": properties, "required": required},
+            },
+        }
+
+    @property
+    def schemas(self) -> list[dict[str, Any]]:
+        """Tool definitions for the 'tools' parameter of a chat completion."""
+        if self._schemas is None:
+            self._schemas = [tool.schema for tool in self._tools.values()]
+        return self._schemas
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def _prepare(self, name: str, arguments: str) -> tuple[Tool, dict[str, Any], str | None]:
+        """
+        Looks up the tool and decodes its arguments.
+
+        Returns:
+            Tuple of (tool, decoded arguments, cache key if the tool caches results).
+
+        Raises:
+            KeyError: The model asked for an unknown tool.
+            ValueError: The arguments are not a JSON object.
+
+        """
+        tool = self._tools[name]
+        args = json.loads(arguments or "{}")
+        if not isinstance(args, dict):
+            raise ValueError("Tool arguments must be a JSON object.")
+        cache_key = json.dumps(args, sort_keys=True, ensure_ascii=False) if tool.cache is not None else None
+        return tool, args, cache_key
+
+    async def execute(self, name: str, arguments: str) -> str:
+        """
+        Runs one tool call and returns its result as a string for the model.
+
+        Sync tools run in a worker thread so that calls of one turn overlap.
+        """
+        try:
+            tool, args, cache_key = self._prepare(name, arguments)
+        except KeyError:
+            logger.warning("Model requested unknown tool '%s'.", name)
+            return _error_result(f"Unknown tool: {name}")
+        except ValueError as e:
+            return _error_result(f"Invalid arguments: {e}")
+
+        if tool.cache is not None and cache_key is not None and (cached := tool.cache.get(cache_key)) is not None:
+            logger.debug("Tool '%s' served from cache.", name)
+            return cached
+
+        logger.info("--> Tool called: %s(%s)", name, arguments)
+        try:
+            if tool.is_async:
+                call = tool.func(**args)
+            else:
+                call = asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(tool.func, **args))
+            result = _format_result(await asyncio.wait_for(call, tool.timeout))
+        except (TimeoutError, asyncio.TimeoutError):  # distinct classes before Python 3.11
+            logger.warning("Tool '%s' timed out after %s s.", name, tool.timeout)
+            return _error_result(f"Tool '{name}' timed out.")
+        except Exception as e:
+            logger.exception("Tool '%s' failed.", name)
+            return _error_result(f"{type(e).__name__}: {e}")
+
+        if tool.cache is not None and cache_key is not None:
+            tool.cache.set(cache_key, result)
+        return result
+
+    async def run_tool_calls(self, tool_calls: list[Any]) -> list[dict[str, Any]]:
+        """
+        Runs all tool calls of one assistant message concurrently.
+
+        Args:
+            tool_calls: 'message.tool_calls' from a chat completion.
+
+        Returns:
+            'role: tool' messages in the order of 'tool_calls', ready to append to the history.
+
+        """
+        results = await asyncio.gather(
+            *(self.execute(call.function.name, call.function.arguments) for call in tool_calls),
+        )
+        return [
+            {"role": "tool", "tool_call_id": call.id, "name": call.function.name, "content": content}
+            for call, content in zip(tool_calls, results, strict=True)
+        ]
+
+    def call_tools(self, tool_calls: list[Any]) -> list[dict[str, Any]]:
+        """
+        Sync counterpart of 'run_tool_calls' for code without a running event loop.
+        """
+        return asyncio.run(self.run_tool_calls(tool_calls))
+
+    def close(self) -> None:
+        """Shuts down the worker threads (without waiting for timed-out tools)."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
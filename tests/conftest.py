@@ -0,0 +1,22 @@
+from collections.abc import Iterator
+
+import pytest
+
+from src.config import reset_config
+from src.testing.mock_server import MockBehavior, MockYandexServer
+
+
+@pytest.fixture
+def mock_server(monkeypatch: pytest.MonkeyPatch) -> Iterator[MockYandexServer]:
+    """A fast, error-free mock API with the configuration pointed at it."""
+    server = MockYandexServer(behavior=MockBehavior(latency_mean=0.0, operation_delay=0.1)).start()
+    monkeypatch.setenv("YC_FOLDER_ID", "test-folder")
+    monkeypatch.setenv("YC_API_KEY", "test-key")
+    for name in ("YC_CREDENTIALS", "YC_CREDENTIALS_FILE"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in server.env().items():
+        monkeypatch.setenv(name, value)
+    reset_config()
+    yield server
+    server.stop()
+    reset_config()
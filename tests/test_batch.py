@@ -0,0 +1,56 @@
+import asyncio
+import json
+from pathlib import Path
+
+from src.batch import BatchRunner, BatchStats
+from src.clients.native import AsyncYandexNativeClient
+from src.testing.mock_server import MockYandexServer
+
+
+def _write_input(path: Path, count: int) -> None:
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"row-{i}", "prompt": f"prompt {i}"}) + "\n")
+
+
+def _read_output(path: Path) -> list[dict]:
+    with path.open(encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _run(input_path: Path, output_path: Path, ordered: bool = False) -> BatchStats:
+    async def run() -> BatchStats:
+        async with AsyncYandexNativeClient(http2=False) as client:
+            runner = BatchRunner(client.generate_text, workers=4, ordered=ordered)
+            return await runner.run(input_path, output_path)
+
+    return asyncio.run(run())
+
+
+def test_run_writes_every_row(mock_server: MockYandexServer, tmp_path: Path) -> None:
+    _write_input(tmp_path / "in.jsonl", 20)
+
+    stats = _run(tmp_path / "in.jsonl", tmp_path / "out.jsonl", ordered=True)
+
+    records = _read_output(tmp_path / "out.jsonl")
+    assert (stats.read, stats.succeeded, stats.failed) == (20, 20, 0)
+    assert [r["id"] for r in records] == [f"row-{i}" for i in range(20)]
+    assert all(r["ok"] and r["result"] == f"Echo: {r['prompt']}" for r in records)
+
+
+def test_resume_after_crash(mock_server: MockYandexServer, tmp_path: Path) -> None:
+    _write_input(tmp_path / "in.jsonl", 10)
+    output = tmp_path / "out.jsonl"
+    # An interrupted run: three rows done, one failed, and a record torn mid-write
+    done = [{"id": f"row-{i}", "prompt": f"prompt {i}", "result": f"Echo: prompt {i}", "ok": True} for i in range(3)]
+    failed = {"id": "row-3", "prompt": "prompt 3", "result": "", "ok": False}
+    with output.open("w", encoding="utf-8") as f:
+        f.writelines(json.dumps(record) + "\n" for record in [*done, failed])
+        f.write('{"id": "row-4", "pro')
+
+    stats = _run(tmp_path / "in.jsonl", output)
+
+    records = _read_output(output)
+    assert (stats.read, stats.skipped, stats.succeeded) == (10, 3, 7)
+    assert sorted(r["id"] for r in records) == sorted(f"row-{i}" for i in range(10))
+    assert all(r["ok"] for r in records)
@@ -0,0 +1,78 @@
+import asyncio
+from pathlib import Path
+
+from src.clients.deferred import DeferredCompletionClient, DeferredResult, OperationStore, PollingScheduler
+from src.retry import ResilientCaller, RetryPolicy
+from src.testing.mock_server import MockYandexServer
+
+
+def _client() -> DeferredCompletionClient:
+    return DeferredCompletionClient(resilience=ResilientCaller(RetryPolicy(max_attempts=1)))
+
+
+async def _collect(client: DeferredCompletionClient, store: OperationStore) -> dict[str, DeferredResult]:
+    scheduler = PollingScheduler(client, store, min_interval=0.05, max_interval=0.2)
+    return {result.key: result async for result in scheduler.results()}
+
+
+def test_submit_and_poll(mock_server: MockYandexServer, tmp_path: Path) -> None:
+    store = OperationStore(tmp_path / "ops.db")
+    prompts = ((str(i), f"prompt {i}") for i in range(25))
+
+    async def run() -> tuple[int, dict[str, DeferredResult]]:
+        async with _client() as client:
+            submitted = await client.submit_many(prompts, store, max_concurrency=4, first_poll_delay=0.0)
+            return submitted, await _collect(client, store)
+
+    submitted, results = asyncio.run(run())
+    store.close()
+
+    assert submitted == 25
+    assert sorted(results, key=int) == [str(i) for i in range(25)]
+    assert all(r.ok and r.text == f"Echo: prompt {r.key}" for r in results.values())
+
+
+def test_resume_skips_submitted_and_keeps_polling(mock_server: MockYandexServer, tmp_path: Path) -> None:
+    path = tmp_path / "ops.db"
+    items = [(str(i), f"prompt {i}") for i in range(5)]
+
+    async def submit_then_crash() -> int:
+        store = OperationStore(path)
+        try:
+            async with _client() as client:
+                return await client.submit_many(items[:3], store, first_poll_delay=0.0)
+        finally:
+            store.close()
+
+    async def rerun() -> tuple[int, dict[str, DeferredResult]]:
+        store = OperationStore(path)
+        try:
+            async with _client() as client:
+                submitted = await client.submit_many(items, store, first_poll_delay=0.0)
+                return submitted, await _collect(client, store)
+        finally:
+            store.close()
+
+    assert asyncio.run(submit_then_crash()) == 3
+    submitted, results = asyncio.run(rerun())
+
+    # Only the two missing keys are submitted again; the first three are polled from the stored IDs
+    assert submitted == 2
+    assert {key: r.text for key, r in results.items()} == {key: f"Echo: {prompt}" for key, prompt in items}
+
+
+def test_unknown_operation_fails_only_its_key(mock_server: MockYandexServer, tmp_path: Path) -> None:
+    store = OperationStore(tmp_path / "ops.db")
+    store.add("lost", "no-such-operation", 0.0)
+
+    async def run() -> dict[str, DeferredResult]:
+        async with _client() as client:
+            await client.submit_many([("ok", "hello")], store, first_poll_delay=0.0)
+            return await _collect(client, store)
+
+    results = asyncio.run(run())
+    store.close()
+
+    assert results["ok"].text == "Echo: hello"
+    assert not results["lost"].ok
+    assert "404" in (results["lost"].error or "")
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+import requests
+
+from src.clients.native import YandexNativeClient
+from src.clients.routing import CircuitBreaker, Endpoint, EndpointRouter, NoHealthyEndpointError, RoutedClient
+from src.testing.mock_server import MockYandexServer
+
+ENDPOINTS = (Endpoint("native", "yandexgpt"), Endpoint("native", "yandexgpt-lite"))
+
+
+def _states(router: EndpointRouter) -> list[str]:
+    return [endpoint["state"] for endpoint in router.snapshot()]
+
+
+def test_breaker_opens_probes_and_closes(mock_server: MockYandexServer) -> None:
+    router = EndpointRouter(ENDPOINTS, explore=0.0, failure_threshold=2, reset_timeout=0.2)
+    client = RoutedClient(router, YandexNativeClient())
+
+    mock_server.behavior.error_rate = 1.0
+    # Each request fails over to the other endpoint, so two requests open both circuits
+    assert client.generate_text("a") == ""
+    assert client.generate_text("b") == ""
+    assert _states(router) == ["open", "open"]
+    with pytest.raises(NoHealthyEndpointError):
+        router.call(lambda endpoint, timeout: "unused")
+
+    # After the cooldown one probe goes through and closes its circuit
+    mock_server.behavior.error_rate = 0.0
+    time.sleep(0.25)
+    assert client.generate_text("c") == "Echo: c"
+    assert sorted(_states(router)) == ["closed", "open"]
+
+
+def test_failed_probe_doubles_the_cooldown(mock_server: MockYandexServer) -> None:
+    router = EndpointRouter(ENDPOINTS[:1], failure_threshold=1, reset_timeout=0.1, max_reset_timeout=0.3)
+    client = RoutedClient(router, YandexNativeClient())
+    breaker = router._breakers[ENDPOINTS[0]]
+
+    mock_server.behavior.error_rate = 1.0
+    assert client.generate_text("a") == ""
+    assert breaker.state == CircuitBreaker.OPEN
+
+    timeouts = []
+    for _ in range(3):
+        time.sleep(breaker.reset_timeout + 0.05)
+        assert client.generate_text("probe") == ""
+        timeouts.append(breaker.reset_timeout)
+    assert timeouts == [0.2, 0.3, 0.3]
+
+    # A successful probe closes the circuit and resets the cooldown
+    mock_server.behavior.error_rate = 0.0
+    time.sleep(breaker.reset_timeout + 0.05)
+    assert client.generate_text("probe") == "Echo: probe"
+    assert (breaker.state, breaker.reset_timeout) == (CircuitBreaker.CLOSED, 0.1)
+
+
+def test_client_errors_do_not_trip_the_breaker(mock_server: MockYandexServer) -> None:
+    router = EndpointRouter(ENDPOINTS, failure_threshold=1)
+    client = RoutedClient(router, YandexNativeClient())
+
+    def bad_request(endpoint: Endpoint, timeout: float) -> str:
+        # The mock answers unknown paths with 404, as every endpoint would
+        response = client.native.session.post(f"{mock_server.url}/unknown", json={}, timeout=timeout)
+        response.raise_for_status()
+        return response.text
+
+    with pytest.raises(requests.exceptions.HTTPError, match="404"):
+        router.call(bad_request)
+    assert _states(router) == ["closed", "closed"]
+
+
+def test_half_open_admits_a_single_probe() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0)
+    breaker.record_failure(now=0.0)
+
+    assert not breaker.allow(now=0.5)
+    assert breaker.allow(now=1.0)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow(now=1.0)
+    breaker.release()
+    assert breaker.allow(now=1.0)
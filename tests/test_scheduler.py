@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from src.clients.native import AsyncYandexNativeClient
+from src.limiter import AdaptiveLimiter
+from src.scheduler import DeadlineExceededError, Priority, RequestScheduler
+from src.testing.mock_server import MockYandexServer
+
+
+def _lane(scheduler: RequestScheduler, priority: Priority) -> dict:
+    return next(lane for lane in scheduler.snapshot() if lane["priority"] == priority)
+
+
+def test_interactive_overtakes_bulk_backlog(mock_server: MockYandexServer) -> None:
+    mock_server.behavior.latency_mean = 0.05
+    finished: list[str] = []
+
+    async def run() -> None:
+        scheduler = RequestScheduler(concurrency=1, headroom=0)
+        async with AsyncYandexNativeClient(http2=False, scheduler=scheduler) as client:
+
+            async def request(name: str, priority: Priority) -> None:
+                assert await client.generate_text(name, priority=priority) == f"Echo: {name}"
+                finished.append(name)
+
+            backlog = [asyncio.create_task(request(f"bulk {i}", "bulk")) for i in range(4)]
+            await asyncio.sleep(0.01)
+            await asyncio.gather(request("interactive", "interactive"), *backlog)
+
+    asyncio.run(run())
+
+    # Only the bulk request already in flight finishes first
+    assert finished.index("interactive") == 1
+    assert finished[2:] == ["bulk 1", "bulk 2", "bulk 3"]
+
+
+def test_expired_request_is_dropped_unsent(mock_server: MockYandexServer) -> None:
+    mock_server.behavior.latency_mean = 0.3
+    scheduler = RequestScheduler(concurrency=1)
+
+    async def run() -> list[str]:
+        async with AsyncYandexNativeClient(http2=False, scheduler=scheduler) as client:
+            first = asyncio.create_task(client.generate_text("slow", priority="interactive"))
+            await asyncio.sleep(0.01)
+            late = client.generate_text("late", priority="interactive", deadline=time.monotonic() + 0.05)
+            return list(await asyncio.gather(first, late))
+
+    assert asyncio.run(run()) == ["Echo: slow", ""]
+    lane = _lane(scheduler, "interactive")
+    assert (lane["dispatched"], lane["dropped"]) == (1, 1)
+
+
+def test_past_deadline_is_rejected_on_arrival() -> None:
+    scheduler = RequestScheduler(concurrency=1)
+
+    async def run() -> None:
+        async with scheduler.slot("bulk", deadline=time.monotonic() - 1.0):
+            pass
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(run())
+    assert _lane(scheduler, "bulk")["dropped"] == 1
+
+
+def test_deadline_expiry_does_not_back_off_the_limiter() -> None:
+    limiter = AdaptiveLimiter(initial=4, cooldown=0.0)
+    scheduler = RequestScheduler(limiter)
+
+    async def expire() -> None:
+        async with scheduler.slot(timeout=0.01) as ticket:
+            await asyncio.sleep(0.02)
+            ticket.time_left()
+
+    async def fail() -> None:
+        async with scheduler.slot() as ticket:
+            ticket.report_error(503)
+
+    async def run() -> None:
+        with pytest.raises(DeadlineExceededError):
+            await expire()
+        assert limiter.limit == 4
+        assert limiter.baseline_latency is None
+
+        await fail()
+        assert limiter.limit == 2
+
+    asyncio.run(run())
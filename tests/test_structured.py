@@ -0,0 +1,98 @@
+import json
+import random
+import time
+
+import pytest
+
+from src.clients.native import YandexNativeClient
+from src.structured import IncrementalJSONParser, StructuredOutputError
+from src.testing.mock_server import MockYandexServer
+
+DOCUMENT = {
+    "title": 'quote " and backslash \\ and é \n',
+    "records": [{"n": 1, "ok": True}, {"n": -2.5e3, "ok": False}, {"n": 0, "tags": []}],
+    "empty": {},
+    "none": None,
+}
+
+
+def _feed_in_pieces(text: str, sizes: list[int]) -> tuple[IncrementalJSONParser, list]:
+    parser = IncrementalJSONParser()
+    events, pos = [], 0
+    for size in sizes:
+        events += parser.feed(text[pos : pos + size])
+        pos += size
+    events += parser.feed(text[pos:])
+    events += parser.close()
+    return parser, events
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_any_chunking_gives_the_same_document(seed: int) -> None:
+    text = json.dumps(DOCUMENT, indent=seed % 3 or None, ensure_ascii=seed % 2 == 0)
+    rng = random.Random(seed)
+
+    parser, events = _feed_in_pieces(text, [rng.randint(0, 6) for _ in range(len(text))])
+
+    assert parser.done
+    assert parser.value == DOCUMENT
+    assert events[-1] == ((), DOCUMENT)
+
+
+def test_values_are_emitted_innermost_first() -> None:
+    parser = IncrementalJSONParser()
+
+    assert parser.feed('{"a": [1, {"b": "x"}') == [(("a", 0), 1), (("a", 1, "b"), "x"), (("a", 1), {"b": "x"})]
+    assert parser.feed("], ") == [(("a",), [1, {"b": "x"}])]
+    # A number at the end of the input may still continue
+    assert parser.feed('"c": 12') == []
+    assert parser.feed("3}") == [(("c",), 123), ((), {"a": [1, {"b": "x"}], "c": 123})]
+
+
+def test_lenient_mode_skips_surrounding_text() -> None:
+    parser = IncrementalJSONParser()
+    parser.feed('Here you go:\n```json\n{"a": 1}\n```')
+    parser.close()
+
+    assert parser.value == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ['{"a" 1}', '{"a": 1,}', "[1 2]", '{"a": tru}', "[01]"])
+def test_invalid_json_raises(text: str) -> None:
+    parser = IncrementalJSONParser(lenient=False)
+    with pytest.raises(StructuredOutputError):
+        parser.feed(text)
+        parser.close()
+
+
+def test_truncated_document_raises_on_close() -> None:
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": "unfinished')
+
+    with pytest.raises(StructuredOutputError, match="Incomplete JSON"):
+        parser.close()
+
+
+def test_long_string_in_small_pieces_is_linear() -> None:
+    text = json.dumps({"value": "x" * 1_000_000, "after": 1})
+    started = time.perf_counter()
+
+    parser, _ = _feed_in_pieces(text, [20] * (len(text) // 20))
+
+    assert parser.value == {"value": "x" * 1_000_000, "after": 1}
+    # Re-copying the buffer for every piece takes seconds here
+    assert time.perf_counter() - started < 1.0
+
+
+def test_stream_json_from_the_api(mock_server: MockYandexServer) -> None:
+    mock_server.behavior.stream_chunks = 12
+    schema = {
+        "type": "object",
+        "properties": {"records": {"type": "array", "items": {"type": "object", "required": ["n"]}}},
+    }
+    # The mock echoes the prompt after "Echo: ", which the lenient parser skips
+    prompt = json.dumps({"records": [{"n": 1}, {"n": 2}, {"n": 3}], "total": 3})
+
+    values = list(YandexNativeClient().stream_json(prompt, schema, select=("records", None)))
+
+    assert values == [(("records", i), {"n": i + 1}) for i in range(3)]